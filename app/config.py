@@ -1,14 +1,15 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Optional
 
 class Settings(BaseSettings):
     """
     Manages application configuration using environment variables.
     """
     # OpenAI Compatible API Settings
-    AI_PROVIDER: str = Field(default="openai", description="The AI provider to use ('openai' or 'vertexai').")
-    OPENAI_API_KEY: str = Field(..., env="OPENAI_API_KEY")
-    OPENAI_BASE_URL: str = Field(..., env="OPENAI_BASE_URL")
+    AI_PROVIDER: str = Field(default="openai", description="The AI provider to use: 'openai', or 'mock' to answer with generated responses without calling a model (see the MOCK_AI_* settings).")
+    OPENAI_API_KEY: Optional[str] = Field(default=None, description="Required when AI_PROVIDER is 'openai'.")
+    OPENAI_BASE_URL: Optional[str] = Field(default=None, description="Required when AI_PROVIDER is 'openai'.")
 
     # Model & Generation Parameters
     MODEL_NAME: str = "gemini-2.5-flash"
@@ -17,19 +18,128 @@ class Settings(BaseSettings):
     REASONING_EFFORT: str = "disable"
     MAX_COMPLETION_TOKENS: int = 32768
 
+    # HTTP Connection Pool Settings (shared by all requests in a worker process)
+    HTTP2_ENABLED: bool = Field(default=True, description="Multiplex AI calls over HTTP/2 connections.")
+    HTTP_MAX_CONNECTIONS: int = Field(default=100, description="Maximum number of concurrent connections to the AI endpoint.")
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20, description="Maximum number of idle connections kept alive in the pool.")
+    HTTP_KEEPALIVE_EXPIRY: float = Field(default=30.0, description="Seconds an idle connection is kept alive.")
+    HTTP_CONNECT_TIMEOUT: float = Field(default=10.0, description="Seconds to wait when establishing a connection.")
+    HTTP_READ_TIMEOUT: float = Field(default=600.0, description="Seconds to wait for the model response.")
+    HTTP_WRITE_TIMEOUT: float = Field(default=60.0, description="Seconds to wait when sending the request body.")
+    HTTP_POOL_TIMEOUT: float = Field(default=30.0, description="Seconds to wait for a free connection from the pool.")
+    STREAM_REQUEST_BODY: bool = Field(default=False, description="Stream pages from preprocessing straight into the AI request body (chunked upload) instead of materializing the whole folder in memory.")
+
+    # Classification Mode Settings
+    CLASSIFICATION_MODE: str = Field(default="single", description="'single' (all pages in one call), 'map_reduce' (per-batch page summaries, then a text-only clustering call), or 'auto'.")
+    MAP_REDUCE_PAGE_THRESHOLD: int = Field(default=40, description="In 'auto' mode, folders with more pages than this use map-reduce classification.")
+    MAP_BATCH_SIZE: int = Field(default=8, description="Pages per page-summary (map) call.")
+    MAP_CONCURRENCY: int = Field(default=4, description="Maximum concurrent page-summary (map) calls per folder.")
+
+    # AI Admission Control Settings (shared by all AI calls in a worker process)
+    AI_ADMISSION_CONTROL_ENABLED: bool = Field(default=True, description="Admit AI calls through a shared concurrency and rate limiter, with rate-limit-aware retries.")
+    AI_MAX_CONCURRENT_CALLS: int = Field(default=16, description="Maximum AI calls in flight at once.")
+    AI_REQUESTS_PER_MINUTE: Optional[int] = Field(default=None, description="Requests-per-minute budget of the model deployment. Empty or 0 disables the limit.")
+    AI_TOKENS_PER_MINUTE: Optional[int] = Field(default=None, description="Tokens-per-minute budget of the model deployment. Empty or 0 disables the limit.")
+    AI_MAX_QUEUE_WAIT_SECONDS: float = Field(default=300.0, description="Calls that would wait longer than this for admission fail fast with 503.")
+    AI_MAX_RETRIES: int = Field(default=3, description="Retries for rate-limited (429), 5xx and connection failures.")
+    AI_RETRY_BASE_DELAY_SECONDS: float = Field(default=1.0, description="Base delay of the jittered exponential backoff.")
+    AI_RETRY_MAX_DELAY_SECONDS: float = Field(default=60.0, description="Upper bound of a single backoff delay.")
+    AI_IMAGE_TILE_SIZE: int = Field(default=768, description="Side in pixels of the tiles a page image is billed by, for token estimates.")
+    AI_TOKENS_PER_IMAGE_TILE: int = Field(default=258, description="Estimated prompt tokens per image tile.")
+    AI_ESTIMATED_PAGE_TOKENS: int = Field(default=3096, description="Estimated prompt tokens per page when the page image is not known up front (streamed request bodies).")
+    AI_ESTIMATED_OUTPUT_TOKENS: int = Field(default=2000, description="Completion tokens reserved per call.")
+
+    # Hedged Request Settings
+    HEDGING_ENABLED: bool = Field(default=False, description="Send a duplicate of AI calls that are slower than usual and use whichever answers first.")
+    HEDGE_PERCENTILE: float = Field(default=95.0, description="A call is hedged once it has run longer than this percentile of recent call latencies.")
+    HEDGE_MIN_DELAY_SECONDS: float = Field(default=5.0, description="Never hedge a call earlier than this.")
+    HEDGE_MIN_SAMPLES: int = Field(default=20, description="Latency samples needed for a call type before its calls are hedged.")
+    HEDGE_LATENCY_WINDOW: int = Field(default=200, description="Number of recent call latencies the percentile is computed over.")
+    HEDGE_MAX_EXTRA_TOKEN_RATIO: float = Field(default=0.1, description="Stop hedging while duplicate calls account for more than this share of all tokens spent.")
+    HEDGE_MODEL_NAME: Optional[str] = Field(default=None, description="Model the hedged request is sent to. Defaults to MODEL_NAME.")
+    HEDGE_BASE_URL: Optional[str] = Field(default=None, description="Endpoint the hedged request is sent to. Defaults to OPENAI_BASE_URL.")
+    HEDGE_API_KEY: Optional[str] = Field(default=None, description="API key for HEDGE_BASE_URL. Defaults to OPENAI_API_KEY.")
+
+    # Mock AI Settings (AI_PROVIDER=mock and the stub server in app.mock_server)
+    MOCK_AI_LATENCY_DISTRIBUTION: str = Field(default="lognormal", description="Distribution of simulated call latencies: 'constant', 'uniform' or 'lognormal' (long-tailed, like real model calls).")
+    MOCK_AI_LATENCY_SECONDS: float = Field(default=2.0, description="Simulated call latency: the constant value, the middle of the uniform range, or the lognormal median.")
+    MOCK_AI_LATENCY_SPREAD: float = Field(default=0.5, description="For 'uniform', seconds the latency varies either side of MOCK_AI_LATENCY_SECONDS; for 'lognormal', the standard deviation of the log latency.")
+    MOCK_AI_LATENCY_PER_PAGE_SECONDS: float = Field(default=0.05, description="Simulated extra latency per page in a call.")
+    MOCK_AI_ERROR_RATE: float = Field(default=0.0, description="Share of simulated calls failing with a 500 error.")
+    MOCK_AI_RATE_LIMIT_RATE: float = Field(default=0.0, description="Share of simulated calls rejected with a 429.")
+    MOCK_AI_RETRY_AFTER_SECONDS: Optional[float] = Field(default=1.0, description="Retry-After sent with simulated 429s; None sends none.")
+    MOCK_AI_SEED: Optional[int] = Field(default=None, description="Seed for the simulated latencies and failures, for repeatable runs.")
+
     # Document Preprocessing Settings
     TARGET_DPI: int = 200
     DEFAULT_DPI: int = 72
     SMALL_ANGLE_THRESHOLD: float = 2.0
-    DEFAULT_IMAGE_FORMAT: str = "png"
+    DEFAULT_IMAGE_FORMAT: str = Field(default="png", description="Page image format sent to the model: 'png', 'jpeg' or 'webp'.")
+    IMAGE_QUALITY: int = Field(default=85, description="JPEG/WebP quality (1-100).")
+    IMAGE_PNG_COMPRESSION: int = Field(default=6, description="PNG compression level (0-9). Lower is faster to encode but larger.")
+    IMAGE_GRAYSCALE_PASSTHROUGH: bool = Field(default=False, description="Encode enhanced (grayscale) pages as single-channel images instead of expanding them to RGB.")
+    IMAGE_MAX_PIXELS: Optional[int] = Field(default=None, description="Downscale pages with more pixels than this before encoding. Empty or 0 disables the budget.")
     SHARPEN_CONTRAST_ALPHA: float = 1.25
     SHARPEN_CONTRAST_BETA: float = 0.0
+    RASTERIZE_GRAYSCALE: bool = Field(default=True, description="Render pages that go through enhancement straight to grayscale pixmaps instead of RGB. Colour content is converted by MuPDF, so pixels can differ slightly from the RGB path.")
+    PREPROCESSING_EXECUTION_MODE: str = Field(default="sequential", description="How pages are preprocessed ('sequential', 'process_pool', or 'pipeline': staged threads with bounded queues, overlapping preprocessing with AI calls).")
+    PREPROCESSING_MAX_WORKERS: Optional[int] = Field(default=None, description="Worker processes for the 'process_pool' mode. Defaults to the CPU count.")
+    PIPELINE_QUEUE_SIZE: int = Field(default=4, description="Pages that can wait in front of each stage of the 'pipeline' mode.")
+    PIPELINE_ENHANCE_WORKERS: Optional[int] = Field(default=None, description="Threads enhancing and encoding pages in the 'pipeline' mode. Defaults to the CPU count.")
+    INGESTION_MMAP_ENABLED: bool = Field(default=False, description="Open PDFs and hash files through read-only memory maps (fewest read syscalls). Files must not be truncated while they are processed, or the process is killed by SIGBUS.")
+    DIGITAL_PAGE_MODE: str = Field(default="image", description="How PDF pages with a text layer are sent: 'image' (full resolution, enhanced), 'text' (extracted text only), or 'low_res_image'.")
+    DIGITAL_PAGE_MIN_TEXT_CHARS: int = Field(default=50, description="Minimum extracted characters for a page to take the 'text' or 'low_res_image' path.")
+    DIGITAL_PAGE_LOW_RES_DPI: int = Field(default=100, description="Render DPI for digital pages in 'low_res_image' mode.")
+    ENHANCEMENT_PROFILE: str = Field(default="full", description="Enhancement stages run per page: 'full', 'adaptive' (only what a quality pre-check says is needed), 'minimal' (sharpen/contrast), or 'none'.")
+    ENHANCEMENT_NOISE_THRESHOLD: float = Field(default=4.0, description="In 'adaptive' mode, pages with an estimated noise sigma above this are denoised.")
+    ENHANCEMENT_NOISE_CROP_SIZE: int = Field(default=512, description="Side of the full-resolution centre crop used for the noise estimate.")
+    SKEW_ESTIMATOR: str = Field(default="projection", description="Deskew angle estimator: 'projection' (projection profiles on a downscaled page) or 'min_area_rect' (legacy, full resolution).")
+    SKEW_ESTIMATION_MAX_SIDE: int = Field(default=1200, description="The projection skew estimator halves the page until its longest side fits this.")
+    SKEW_ESTIMATION_MAX_POINTS: int = Field(default=20000, description="Foreground points sampled by the projection skew estimator.")
+    SKEW_SEARCH_RANGE: float = Field(default=15.0, description="Largest skew angle, in degrees, the projection estimator searches for.")
+
+    # Preprocessed Page Cache Settings
+    PAGE_CACHE_ENABLED: bool = Field(default=False, description="Cache preprocessed page images on disk, keyed by file content and enhancement settings.")
+    PAGE_CACHE_DIR: str = Field(default="cache/pages", description="Directory holding the page cache.")
+    PAGE_CACHE_MAX_BYTES: int = Field(default=2147483648, description="Max page cache size in bytes before LRU eviction (2GB).")
+
+    # Classification Result Cache Settings
+    RESULT_CACHE_ENABLED: bool = Field(default=False, description="Reuse stored classification results for identical model inputs.")
+    RESULT_CACHE_PATH: str = Field(default="cache/results.sqlite3", description="Path to the SQLite result cache.")
+    RESULT_CACHE_TTL_SECONDS: Optional[int] = Field(default=86400, description="Seconds a cached result stays valid. Empty or 0 disables expiry.")
+
+    # Duplicate Page Settings
+    PAGE_DEDUP_ENABLED: bool = Field(default=False, description="Send only one page of each group of duplicate pages to the model and list the others right after it in the result. Not applied to pages streamed into a single call (STREAM_REQUEST_BODY).")
+    PAGE_DEDUP_HASH_SIZE: int = Field(default=16, description="Number of DCT frequencies per side in the perceptual page hash; hashes have this many bits squared.")
+    PAGE_DEDUP_MAX_DISTANCE: int = Field(default=16, description="Maximum number of differing hash bits for two pages to be compared as candidate duplicates.")
+    PAGE_DEDUP_MATCH: str = Field(default="exact", description="How candidates are confirmed: 'exact' requires the same text layer, or for pages without one the same encoded image; 'perceptual' accepts the hash match alone, which also catches rescans but can merge pages of one template that differ only in details such as amounts.")
+
+    # Batch Endpoint Settings
+    BATCH_MAX_FOLDERS: int = Field(default=500, description="Maximum folders accepted in one batch request.")
+    BATCH_FOLDER_CONCURRENCY: int = Field(default=4, description="Folders of a batch processed at the same time.")
+    BATCH_AI_CONCURRENCY: int = Field(default=8, description="Concurrent AI calls shared by all batch requests in a worker process.")
+    BATCH_PREPROCESSING_EXECUTION_MODE: str = Field(default="process_pool", description="Preprocessing mode for batch folders; 'process_pool' shares the CPU pool across folders.")
+
+    # Job API Settings
+    JOB_STORE_PATH: str = Field(default="cache/jobs.sqlite3", description="Path to the SQLite job store.")
+    JOB_CONCURRENCY: int = Field(default=2, description="Jobs processed concurrently per worker process.")
+    JOB_QUEUE_MAX_SIZE: int = Field(default=100, description="Maximum jobs waiting in the queue before submissions are rejected with 503.")
+    JOB_PROGRESS_INTERVAL_SECONDS: float = Field(default=1.0, description="How often a running job's progress is persisted.")
+    JOB_STALE_AFTER_SECONDS: float = Field(default=300.0, description="Running jobs without a progress update for this long are marked as failed, on startup and by the periodic sweep. Jobs running when the service stops cleanly are requeued instead.")
+    JOB_STALE_SWEEP_INTERVAL_SECONDS: float = Field(default=60.0, description="How often the job queue checks for stale running jobs.")
+    JOB_RETENTION_SECONDS: Optional[int] = Field(default=604800, description="Seconds finished jobs are kept (7 days). Empty or 0 keeps them forever.")
+
+    # Startup Settings
+    WARMUP_ENABLED: bool = Field(default=True, description="At startup, load the preprocessing libraries, preprocess a sample page and start the process pool (if used) in the background; /ready reports ready once this has finished.")
 
     # Logging Configuration
     LOG_LEVEL: str = Field(default="INFO", description="Logging level (e.g., DEBUG, INFO, WARNING, ERROR).")
     LOG_FILE_PATH: str = Field(default="logs/document_processor.log", description="Path to the log file.")
     LOG_ROTATION_MAX_BYTES: int = Field(default=10485760, description="Max log file size in bytes before rotation (10MB).")
     LOG_ROTATION_BACKUP_COUNT: int = Field(default=5, description="Number of backup log files to keep.")
+    LOG_QUEUE_ENABLED: bool = Field(default=True, description="Write logs from a background thread fed by a bounded queue, so logging never blocks request handling.")
+    LOG_QUEUE_MAX_SIZE: int = Field(default=10000, description="Maximum log records waiting to be written.")
+    LOG_QUEUE_OVERFLOW_POLICY: str = Field(default="drop_debug", description="When the log queue is full: 'drop_debug' (drop and count DEBUG records; everything else waits), 'drop_info' (also drop INFO records, including the metric lines) or 'block'.")
 
     class Config:
         env_file = ".env"
@@ -1,24 +1,95 @@
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Dict, Optional
 
-from python_json_logger import jsonlogger
+from pythonjsonlogger.json import JsonFormatter
+from . import metrics
 from .config import settings
 
+# Overflow policy -> the level from which records wait for space in a full queue instead of being dropped.
+LOG_QUEUE_OVERFLOW_POLICIES = {"drop_debug": logging.INFO, "drop_info": logging.WARNING, "block": logging.NOTSET}
+
+_queue_listener: Optional[QueueListener] = None
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to a bounded queue that a QueueListener drains on a background thread,
+    so request handlers never wait on disk or console I/O (or on log rotation).
+    When the queue is full, the 'drop_debug' policy drops DEBUG records and counts them,
+    while everything else waits for space; 'drop_info' also drops INFO records (including
+    the request and AI call metric lines); 'block' always waits.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow_policy: str = "drop_debug"):
+        super().__init__(log_queue)
+        if overflow_policy not in LOG_QUEUE_OVERFLOW_POLICIES:
+            raise ValueError(f"Unsupported log queue overflow policy: {overflow_policy}. Expected one of {tuple(LOG_QUEUE_OVERFLOW_POLICIES)}.")
+        self.overflow_policy = overflow_policy
+        self._wait_from_level = LOG_QUEUE_OVERFLOW_POLICIES[overflow_policy]
+        self.dropped_records = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record needs no pickling-safe copy;
+        # message interpolation and formatting are left to the listener thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno >= self._wait_from_level:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped_records += 1
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_max_size": self.queue.maxsize,
+            "dropped_records": self.dropped_records
+        }
+
+class BoundedQueueListener(QueueListener):
+    """QueueListener whose stop sentinel waits for space instead of failing on a full queue."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background logging thread, if running."""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        for handler in _queue_listener.handlers:
+            handler.close()
+        _queue_listener = None
+        metrics.set_stats_source("logging", None)
+
 def setup_logging():
     """
     Configures the root logger for the application.
     - Logs to a rotating file in JSON format.
     - Logs to the console for local development.
+    - With LOG_QUEUE_ENABLED, both handlers run on a background thread fed by a bounded queue.
     """
+    global _queue_listener
+    stop_logging()
+
     # Ensure log directory exists
     log_dir = Path(settings.LOG_FILE_PATH).parent
     log_dir.mkdir(parents=True, exist_ok=True)
 
     # Use the logger provided by python-json-logger
-    formatter = jsonlogger.JsonFormatter(
-        '%(timestamp)s %(levelname)s %(name)s %(message)s'
+    formatter = JsonFormatter(
+        '%(timestamp)s %(levelname)s %(name)s %(message)s',
+        timestamp=True
     )
 
     # Create file handler with rotation
@@ -43,11 +114,21 @@ def setup_logging():
     if root_logger.hasHandlers():
         root_logger.handlers.clear()
 
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    if settings.LOG_QUEUE_ENABLED:
+        queue_handler = BoundedQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_MAX_SIZE), settings.LOG_QUEUE_OVERFLOW_POLICY.lower())
+        _queue_listener = BoundedQueueListener(queue_handler.queue, file_handler, console_handler, respect_handler_level=True)
+        _queue_listener.start()
+        root_logger.addHandler(queue_handler)
+        metrics.set_stats_source("logging", queue_handler.stats)
+    else:
+        root_logger.addHandler(file_handler)
+        root_logger.addHandler(console_handler)
 
     # Prevent uvicorn's access logs from propagating to the root logger
     # to avoid duplicate log entries when running with uvicorn
     logging.getLogger("uvicorn.access").propagate = False
-    
-    logging.info("Logging configured successfully.")
\ No newline at end of file
+
+    logging.info("Logging configured successfully.")
+
+# Drain whatever is still queued when the process exits
+atexit.register(stop_logging)
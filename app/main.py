@@ -1,24 +1,123 @@
 from fastapi import FastAPI, Depends, HTTPException, Request as FastAPIRequest
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
 import logging
 import uuid
 import time
 import os
+from contextlib import asynccontextmanager
 
+from . import metrics
 from .config import settings
-from .schemas import ProcessFolderRequest, ClassifiedDocumentsResponse
+from .schemas import ProcessFolderRequest, ProcessFolderBatchRequest, ClassifiedDocumentsResponse, JobStatusResponse, JobSubmissionResponse
 from .services.workflow_service import WorkflowService
-from .services.ai_provider_interface import AIProviderInterface
-from .services.openai_provider import OpenAIProvider
+from .services.batch_service import BatchService
+from .services.ai_provider_interface import AIProviderInterface, AIProviderOverloadedError, AIProviderRateLimitError
+from .services.admission_control import AdmissionController
+from .services.rate_limited_provider import RateLimitedAIProvider
+from .services.hedged_provider import HedgedAIProvider
+from .services.result_cache import get_result_cache
+from .services.job_store import SQLiteJobStore
+from .services.job_queue import JobQueue, JobQueueFullError
 from .logging_config import setup_logging
+from .warmup import WarmupState, warm_up
 
 # Setup logging once on application startup
 setup_logging()
 logger = logging.getLogger(__name__)
 
+def create_ai_provider() -> AIProviderInterface:
+    provider_name = settings.AI_PROVIDER.lower()
+    if provider_name not in ("openai", "mock"):
+        raise ValueError(f"Unsupported AI_PROVIDER configured: {settings.AI_PROVIDER}")
+
+    controller = None
+    if settings.AI_ADMISSION_CONTROL_ENABLED:
+        controller = AdmissionController(
+            max_concurrency=settings.AI_MAX_CONCURRENT_CALLS,
+            requests_per_minute=settings.AI_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.AI_TOKENS_PER_MINUTE,
+            max_wait_seconds=settings.AI_MAX_QUEUE_WAIT_SECONDS
+        )
+
+    # Retries are handled by the admission-control wrapper, so the SDK must not retry on its own
+    max_retries = 0 if controller is not None else 2
+
+    def build_provider(base_url: str = None, model_name: str = None, api_key: str = None) -> AIProviderInterface:
+        # Providers are imported here so that importing the app doesn't load the OpenAI SDK.
+        # The mock provider goes through the same wrappers, so load tests exercise admission control and hedging.
+        if provider_name == "mock":
+            from .services.mock_provider import MockAIProvider
+            provider = MockAIProvider(model_name=model_name)
+        else:
+            from .services.openai_provider import OpenAIProvider
+            provider = OpenAIProvider(max_retries=max_retries, base_url=base_url, model_name=model_name, api_key=api_key)
+        return RateLimitedAIProvider(provider, controller) if controller is not None else provider
+
+    provider = build_provider()
+    if not settings.HEDGING_ENABLED:
+        return provider
+
+    hedge_provider = provider
+    if settings.HEDGE_BASE_URL or settings.HEDGE_MODEL_NAME:
+        hedge_provider = build_provider(
+            base_url=settings.HEDGE_BASE_URL,
+            model_name=settings.HEDGE_MODEL_NAME,
+            api_key=settings.HEDGE_API_KEY
+        )
+    return HedgedAIProvider(provider, hedge_provider)
+
+def ai_provider_stats_sources(ai_provider: AIProviderInterface) -> dict:
+    """Live stats of the provider's wrappers (admission control, hedging), keyed by name."""
+    sources = {}
+    if isinstance(ai_provider, HedgedAIProvider):
+        sources["ai_hedging"] = ai_provider.stats
+        ai_provider = ai_provider.primary
+    if isinstance(ai_provider, RateLimitedAIProvider):
+        sources["ai_admission"] = ai_provider.controller.stats
+    return sources
+
+def retry_after_header(retry_after) -> dict:
+    return {"Retry-After": str(max(1, round(retry_after)))} if retry_after is not None else {}
+
+# --- Application Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One provider per worker process, so its connection pool is shared by all requests
+    app.state.ai_provider = create_ai_provider()
+    # Caps concurrent AI calls across every batch request handled by this worker process
+    app.state.batch_ai_call_limiter = asyncio.Semaphore(settings.BATCH_AI_CONCURRENCY)
+    app.state.job_store = SQLiteJobStore(settings.JOB_STORE_PATH, settings.JOB_RETENTION_SECONDS)
+    app.state.job_queue = JobQueue(app.state.job_store, app.state.ai_provider)
+    await app.state.job_queue.start()
+    stats_sources = ai_provider_stats_sources(app.state.ai_provider)
+    for source, get_stats in stats_sources.items():
+        metrics.set_stats_source(source, get_stats)
+    # Warm up in the background, so the worker answers health checks right away; /ready gates traffic until it's done.
+    app.state.warmup = WarmupState()
+    warmup_task = None
+    if settings.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up, app.state.warmup))
+    else:
+        app.state.warmup.finish()
+    logger.info("Application startup complete.")
+    yield
+    for source in stats_sources:
+        metrics.set_stats_source(source, None)
+    if warmup_task is not None:
+        # Let a running warm-up finish first, so it can't start the process pool after it is shut down.
+        await warmup_task
+    await app.state.job_queue.stop()
+    await app.state.ai_provider.aclose()
+    from .services.document_processor import shutdown_process_pool
+    shutdown_process_pool()
+    logger.info("Application shutdown complete.")
+
 app = FastAPI(
     title="Document Processing Microservice",
     description="A service to cluster, classify, and sequence documents from a folder.",
-    version="1.2.0"
+    version="1.2.0",
+    lifespan=lifespan
 )
 
 # --- Middleware for Request ID and Latency Logging ---
@@ -38,9 +137,20 @@ async def log_requests_middleware(request: FastAPIRequest, call_next):
     }
     logger.info("request_started", extra=log_extra)
 
-    response = await call_next(request)
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.HTTP_REQUESTS_IN_FLIGHT.dec()
 
     process_time_ms = (time.perf_counter() - start_time) * 1000
+    # Label by route template, not the raw path, so job ids don't create new series
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_DURATION.labels(
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status_code=response.status_code
+    ).observe(process_time_ms / 1000)
     log_extra['total_latency_ms'] = round(process_time_ms, 2)
     log_extra['status_code'] = response.status_code
     
@@ -49,10 +159,11 @@ async def log_requests_middleware(request: FastAPIRequest, call_next):
     return response
 
 # --- Dependency Injection ---
-def get_ai_provider() -> AIProviderInterface:
-    if settings.AI_PROVIDER.lower() == "openai":
-        return OpenAIProvider()
-    raise ValueError(f"Unsupported AI_PROVIDER configured: {settings.AI_PROVIDER}")
+def get_ai_provider(request: FastAPIRequest) -> AIProviderInterface:
+    return request.app.state.ai_provider
+
+def get_job_queue(request: FastAPIRequest) -> JobQueue:
+    return request.app.state.job_queue
 
 # --- API Endpoints ---
 @app.post("/v1/documents/process-folder", response_model=ClassifiedDocumentsResponse, tags=["Document Processing"])
@@ -71,16 +182,126 @@ async def process_document_folder(
     
     try:
         workflow = WorkflowService(ai_provider)
-        result = workflow.process_folder(request, request_id)
+        result = await workflow.aprocess_folder(request, request_id)
         return result
     except FileNotFoundError as e:
         logger.error(f"File or folder not found during processing", extra=log_extra, exc_info=True)
         raise HTTPException(status_code=404, detail=f"The specified path was not found: {e}")
+    except AIProviderRateLimitError as e:
+        logger.warning("The model endpoint rate limited the request after all retries.", extra=log_extra)
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e.retry_after))
+    except AIProviderOverloadedError as e:
+        logger.warning("The AI call was not admitted in time.", extra=log_extra)
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e.retry_after))
     except Exception:
         logger.critical("An unhandled exception occurred during document processing.", extra=log_extra, exc_info=True)
         raise HTTPException(status_code=500, detail=f"An internal server error occurred. Please check logs for Request ID: {request_id}")
 
+@app.post("/v1/documents/process-folders", tags=["Document Processing"])
+async def process_document_folders(
+    request: ProcessFolderBatchRequest,
+    fastapi_req: FastAPIRequest,
+    ai_provider: AIProviderInterface = Depends(get_ai_provider)
+):
+    """
+    Processes many folders in one call and streams one NDJSON line per folder
+    (a BatchFolderResult) as soon as that folder completes.
+    """
+    request_id = fastapi_req.state.request_id
+    if len(request.folders) > settings.BATCH_MAX_FOLDERS:
+        raise HTTPException(status_code=422, detail=f"A batch may contain at most {settings.BATCH_MAX_FOLDERS} folders.")
+
+    batch_service = BatchService(ai_provider, fastapi_req.app.state.batch_ai_call_limiter)
+
+    async def stream_results():
+        async for folder_result in batch_service.aprocess_folders(request.folders, request_id):
+            yield folder_result.model_dump_json() + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/v1/jobs", response_model=JobSubmissionResponse, status_code=202, tags=["Jobs"])
+async def submit_job(
+    request: ProcessFolderRequest,
+    fastapi_req: FastAPIRequest,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """
+    Queues a folder for processing and returns immediately with a job id.
+    Poll the status endpoint for progress and fetch the result once the job has succeeded.
+    """
+    try:
+        job = await job_queue.submit(request)
+    except JobQueueFullError as e:
+        logger.warning("Job submission rejected.", extra={'request_id': fastapi_req.state.request_id})
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return JobSubmissionResponse(
+        job_id=job.job_id,
+        status=job.status,
+        status_url=str(fastapi_req.url_for("get_job_status", job_id=job.job_id)),
+        result_url=str(fastapi_req.url_for("get_job_result", job_id=job.job_id))
+    )
+
+@app.get("/v1/jobs/{job_id}", response_model=JobStatusResponse, tags=["Jobs"])
+def get_job_status(job_id: str, fastapi_req: FastAPIRequest):
+    """Returns the job status and its per-stage progress."""
+    job = fastapi_req.app.state.job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job found with id: {job_id}")
+    return job
+
+@app.get("/v1/jobs/{job_id}/result", response_model=ClassifiedDocumentsResponse, tags=["Jobs"])
+def get_job_result(job_id: str, fastapi_req: FastAPIRequest):
+    """Returns the classification of a succeeded job."""
+    job_store = fastapi_req.app.state.job_store
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job found with id: {job_id}")
+    if job.status != "succeeded":
+        detail = f"Job {job_id} is {job.status}."
+        if job.error:
+            detail += f" {job.error}"
+        raise HTTPException(status_code=409, detail=detail)
+    return job_store.get_result(job_id)
+
+@app.delete("/v1/cache/results/{cache_key}", tags=["Cache"])
+def invalidate_cached_result(cache_key: str):
+    """Removes a single stored classification result (the key is reported in processing_metadata)."""
+    result_cache = get_result_cache()
+    if result_cache is None:
+        raise HTTPException(status_code=404, detail="The result cache is not enabled.")
+    if not result_cache.invalidate(cache_key):
+        raise HTTPException(status_code=404, detail=f"No cached result found for key: {cache_key}")
+    logger.info("Result cache entry invalidated.", extra={'result_cache_key': cache_key})
+    return {"invalidated": 1}
+
+@app.delete("/v1/cache/results", tags=["Cache"])
+def clear_cached_results():
+    """Removes every stored classification result."""
+    result_cache = get_result_cache()
+    if result_cache is None:
+        raise HTTPException(status_code=404, detail="The result cache is not enabled.")
+    removed = result_cache.clear()
+    logger.info("Result cache cleared.", extra={'invalidated': removed})
+    return {"invalidated": removed}
+
 @app.get("/health", tags=["Health"])
-def health_check():
-    """Provides a simple health check endpoint."""
-    return {"status": "ok", "service": "Document Processor"}
\ No newline at end of file
+def health_check(fastapi_req: FastAPIRequest):
+    """Provides a simple health check endpoint, with AI admission and hedging stats when those are enabled."""
+    health = {"status": "ok", "service": "Document Processor"}
+    for source, get_stats in ai_provider_stats_sources(fastapi_req.app.state.ai_provider).items():
+        health[source] = get_stats()
+    return health
+
+@app.get("/ready", tags=["Health"])
+def readiness_check(fastapi_req: FastAPIRequest):
+    """Readiness probe: 200 once the startup warm-up has finished, 503 while it is running or if it failed."""
+    warmup = fastapi_req.app.state.warmup.snapshot()
+    if warmup["status"] != "ready":
+        return JSONResponse(status_code=503, content={"status": "not_ready", "warmup": warmup})
+    return {"status": "ready", "warmup": warmup}
+
+@app.get("/metrics", tags=["Health"])
+def prometheus_metrics():
+    """Prometheus metrics: per-stage latency histograms, page/byte/token counters and in-flight gauges."""
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,145 @@
+import os
+from typing import Callable, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+# Prometheus metrics for the service, exposed on /metrics.
+# Page-level stage timings are measured where the work happens (possibly in a pool
+# process) and observed here from the page's timings in the request's own process,
+# so the default registry sees every page. Run with PROMETHEUS_MULTIPROC_DIR set to
+# aggregate metrics across uvicorn worker processes.
+
+METRIC_PREFIX = "document_processor"
+
+# From a millisecond-scale MIME sniff up to a multi-minute model call.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Keys of a page's timings_ms that are observed as stages.
+PAGE_TIMING_STAGES = ("extract", "rasterize", "hash", "encode", "base64", "cache")
+# Keys of a page's enhancement report timings that are observed as stages.
+ENHANCEMENT_TIMING_STAGES = ("precheck", "denoise", "deskew", "sharpen")
+
+STAGE_DURATION = Histogram(
+    f"{METRIC_PREFIX}_stage_duration_seconds",
+    "Duration of one pipeline stage for one file, page or model call.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUEST_DURATION = Histogram(
+    f"{METRIC_PREFIX}_http_request_duration_seconds",
+    "End-to-end HTTP request latency.",
+    ["method", "route", "status_code"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    f"{METRIC_PREFIX}_http_requests_in_flight",
+    "HTTP requests currently being handled.",
+    multiprocess_mode="livesum"
+)
+PAGES = Counter(
+    f"{METRIC_PREFIX}_pages_total",
+    "Pages preprocessed, by payload kind ('image' or 'text') and source ('processed' or 'cache').",
+    ["kind", "source"]
+)
+PAYLOAD_BYTES = Counter(
+    f"{METRIC_PREFIX}_payload_bytes_total",
+    "Bytes of page payload prepared for the model (base64 image data or extracted text).",
+    ["kind"]
+)
+AI_CALLS = Counter(
+    f"{METRIC_PREFIX}_ai_calls_total",
+    "Model calls by call type, model and outcome ('success' or 'error').",
+    ["call_type", "model", "outcome"]
+)
+AI_TOKENS = Counter(
+    f"{METRIC_PREFIX}_ai_tokens_total",
+    "Tokens reported by the model, by call type, model and token type.",
+    ["call_type", "model", "token_type"]
+)
+
+PIPELINE_QUEUE_DEPTH = Histogram(
+    f"{METRIC_PREFIX}_pipeline_queue_depth",
+    "Items waiting in front of a preprocessing pipeline stage, sampled as items are queued.",
+    ["stage"],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64)
+)
+PIPELINE_IDLE_SECONDS = Counter(
+    f"{METRIC_PREFIX}_pipeline_idle_seconds_total",
+    "Time preprocessing pipeline stages spent waiting for input ('starved') or for room downstream ('blocked').",
+    ["stage", "reason"]
+)
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_DURATION.labels(stage=stage).observe(seconds)
+
+def observe_page(page_data: Dict) -> None:
+    """Record the stage timings, count and payload size of one preprocessed page."""
+    timings_ms = page_data.get("timings_ms") or {}
+    from_cache = "cache" in timings_ms
+    for stage in PAGE_TIMING_STAGES:
+        if stage in timings_ms:
+            observe_stage(stage, timings_ms[stage] / 1000)
+    # A cached page's enhancement report describes the run that produced it, not this request.
+    if not from_cache:
+        enhancement_timings_ms = (page_data.get("enhancement") or {}).get("timings_ms") or {}
+        for stage in ENHANCEMENT_TIMING_STAGES:
+            if stage in enhancement_timings_ms:
+                observe_stage(stage, enhancement_timings_ms[stage] / 1000)
+
+    kind = "text" if "text" in page_data else "image"
+    PAGES.labels(kind=kind, source="cache" if from_cache else "processed").inc()
+    payload_bytes = len(page_data["text"].encode("utf-8")) if kind == "text" else len(page_data["base64_data"])
+    PAYLOAD_BYTES.labels(kind=kind).inc(payload_bytes)
+
+def observe_ai_call(call_type: str, model: str, latency_seconds: float, token_usage: Dict) -> None:
+    observe_stage("ai_call", latency_seconds)
+    AI_CALLS.labels(call_type=call_type, model=model, outcome="success").inc()
+    for token_type in ("prompt_tokens", "completion_tokens"):
+        if token_usage.get(token_type):
+            AI_TOKENS.labels(call_type=call_type, model=model, token_type=token_type.replace("_tokens", "")).inc(token_usage[token_type])
+
+def observe_ai_call_error(call_type: str, model: str) -> None:
+    AI_CALLS.labels(call_type=call_type, model=model, outcome="error").inc()
+
+def observe_pipeline_queue_depth(stage: str, depth: int) -> None:
+    PIPELINE_QUEUE_DEPTH.labels(stage=stage).observe(depth)
+
+def observe_pipeline_idle(stage: str, reason: str, seconds: float) -> None:
+    PIPELINE_IDLE_SECONDS.labels(stage=stage, reason=reason).inc(seconds)
+
+class StatsCollector:
+    """
+    Exposes live stats snapshots (e.g. AI admission queue depth) as gauges, read at scrape time.
+    Each source returns a flat dict; numeric values become `<prefix>_<source>_<key>` gauges.
+    """
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], Dict]] = {}
+
+    def collect(self):
+        for source, get_stats in list(self.sources.items()):
+            for key, value in get_stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield GaugeMetricFamily(f"{METRIC_PREFIX}_{source}_{key}", f"{source} {key.replace('_', ' ')}.", value=value)
+
+_stats_collector = StatsCollector()
+REGISTRY.register(_stats_collector)
+
+def set_stats_source(source: str, get_stats: Optional[Callable[[], Dict]]) -> None:
+    """Register (or, with None, remove) a live stats source exposed as gauges."""
+    if get_stats is None:
+        _stats_collector.sources.pop(source, None)
+    else:
+        _stats_collector.sources[source] = get_stats
+
+def render_metrics() -> tuple:
+    """Return the exposition body and its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Stats sources are per process; in multiprocess mode they describe the worker serving the scrape.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_stats_collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
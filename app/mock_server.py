@@ -0,0 +1,87 @@
+"""
+OpenAI-compatible stub server answering chat completions from a MockModel.
+
+Points the service at a local endpoint, so load tests cover the full HTTP path
+(connection pools, HTTP/2, streamed request bodies, retries) without a model:
+
+    python -m app.mock_server --port 8901
+    AI_PROVIDER=openai OPENAI_BASE_URL=http://127.0.0.1:8901/v1 OPENAI_API_KEY=mock uvicorn app.main:app
+
+Latencies, 500s and 429s follow the MOCK_AI_* settings of the server's environment.
+"""
+import json
+import time
+import uuid
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from .config import settings
+from .services.mock_provider import MockModel, manifest_filenames
+
+app = FastAPI(title="Mock OpenAI-compatible endpoint")
+model = MockModel()
+call_counts = {"calls": 0, "succeeded": 0, "rate_limited": 0, "failed": 0}
+
+def _content_parts(body: Dict) -> List[Dict]:
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content")
+        parts.extend(content if isinstance(content, list) else [{"type": "text", "text": content or ""}])
+    return parts
+
+def _error_response(status_code: int, message: str, error_type: str, headers: Optional[Dict] = None) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": error_type, "code": None}}, status_code=status_code, headers=headers)
+
+@app.post("/v1/chat/completions")
+@app.post("/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    parts = _content_parts(body)
+    filenames = manifest_filenames(parts)
+    call_counts["calls"] += 1
+
+    delay, failure = model.plan(len(filenames))
+    await asyncio.sleep(delay)
+    if failure == 429:
+        call_counts["rate_limited"] += 1
+        headers = {"retry-after": str(settings.MOCK_AI_RETRY_AFTER_SECONDS)} if settings.MOCK_AI_RETRY_AFTER_SECONDS is not None else None
+        return _error_response(429, "Simulated rate limit.", "rate_limit_exceeded", headers)
+    if failure is not None:
+        call_counts["failed"] += 1
+        return _error_response(failure, "Simulated server error.", "server_error")
+
+    schema_name = ((body.get("response_format") or {}).get("json_schema") or {}).get("name")
+    content = model.summarize(filenames) if schema_name == "DocumentPageSummaries" else model.classify(filenames)
+    call_counts["succeeded"] += 1
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", settings.MODEL_NAME),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": json.dumps(content)}
+        }],
+        "usage": model.token_usage(parts, content)
+    }
+
+@app.get("/stats")
+async def stats():
+    """Calls received so far, by outcome."""
+    return call_counts
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
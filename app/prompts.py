@@ -13,28 +13,7 @@ document_image_clustering_domain_context = f"""
           * SALES ORDER: A Sales Order is an internal document created by a seller (exporter) to confirm and record a sale after receiving a Purchase Order (PO) from a buyer (importer). It acts as an official confirmation that the seller has accepted the buyer's order and is committed to delivering the specified goods or services under the agreed-upon terms.
 """
 
-document_understanding_and_extraction_si_prompt_single_page = f"""
-  **Role:**
-    * You are an expert Document Analysis Agent, specializing in understanding complex document structure, and document reasoning.
-    * Your primary task is to meticulously analyze the provided document image and extract its content, structure, and metadata into a single, structured JSON object.
-    * The output must strictly adhere to the JSON schema provided in the **Output Format**.
-
-  **Objective:**
-    * You are given an image, which is a single page within a larger document. The document (to which the page image belongs) is part of a major Indian Financial Services organization's Trade flow processing workflow.
-    * Given the image of a document's page, along with additional image metadata, analyze the document page image comprehensively, and holistically, paying close attention to the interplay between text, tables, layout, and visual elements.
-    * Your primary objective is to answer the question below, and structure your output.
-      * Describe in a detailed manner, what you see in the document page image.
-    * Output your understanding of the document page image, in the given **Output Format.**
-
-  **Input:**
-    * A document page image file name - "document_page_image_file_name"
-    * A document page image with key - "document_page_image"
-    * Image metadata JSON - "document_page_image_metadata"
-
-  **Tasks:**
-    * **Comprehensively, with utmost attention to detail, analyze the given document_page_image, along with provided document_page_image_metadata.**
-    * **Use your understanding, and the guidelines provided below, to generate a structured output.**
-      * **filename:**
+document_page_summary_field_guidelines = f"""      * **filename:**
         * An absolutely must field to identify the original file name, as provided by the user in document_page_image_file_name.
 
       * **document_analysis:**
@@ -78,7 +57,30 @@ document_understanding_and_extraction_si_prompt_single_page = f"""
 
       * **page_notes:**
         * Use this field for any other crucial observations that are not captured by the fields above but would be important for a human reviewer. For example: "The document appears to be a draft version, as indicated by a 'DRAFT' watermark."
+"""
 
+document_understanding_and_extraction_si_prompt_single_page = f"""
+  **Role:**
+    * You are an expert Document Analysis Agent, specializing in understanding complex document structure, and document reasoning.
+    * Your primary task is to meticulously analyze the provided document image and extract its content, structure, and metadata into a single, structured JSON object.
+    * The output must strictly adhere to the JSON schema provided in the **Output Format**.
+
+  **Objective:**
+    * You are given an image, which is a single page within a larger document. The document (to which the page image belongs) is part of a major Indian Financial Services organization's Trade flow processing workflow.
+    * Given the image of a document's page, along with additional image metadata, analyze the document page image comprehensively, and holistically, paying close attention to the interplay between text, tables, layout, and visual elements.
+    * Your primary objective is to answer the question below, and structure your output.
+      * Describe in a detailed manner, what you see in the document page image.
+    * Output your understanding of the document page image, in the given **Output Format.**
+
+  **Input:**
+    * A document page image file name - "document_page_image_file_name"
+    * A document page image with key - "document_page_image"
+    * Image metadata JSON - "document_page_image_metadata"
+
+  **Tasks:**
+    * **Comprehensively, with utmost attention to detail, analyze the given document_page_image, along with provided document_page_image_metadata.**
+    * **Use your understanding, and the guidelines provided below, to generate a structured output.**
+{document_page_summary_field_guidelines}
     * Generate the output in the provided **Output Format.**
 
   **Output Format:**
@@ -86,6 +88,54 @@ document_understanding_and_extraction_si_prompt_single_page = f"""
     * Do not output any additional text, and / or comments.
 """
 
+document_clustering_sequencing_classification_steps = f"""
+    * Step 2: **Document Clustering:**
+      * Based on your comprehensive analysis, and understanding of all pages from Step 1, your task is to group the document page images (filenames) into a set of coherent, and complete documents.
+      * Note: Your reasoning for creating each cluster must explicitly reference the structured understanding for each document page image from Step 1, to accomplish this step.
+      * **Special guidance for internal bank processing form.**
+        * Ignore the document page images that have been tagged in Step 1 as internal_bank_processing_form.
+        * Treat this document page image as a single-page document, to be reviewed in Step 4.
+      * **Guiding Principle: A cluster of document page images represents a single, structurally coherent document.**
+        * Your primary goal is to identify pages that make up a single, distinct document type, or category, as per defined **Domain Context**.
+        * Since all documents are part of the same folder, they may reference each other and share details. This shared information links them as part of the same workflow, but may not mean they are the same *document*.
+      * Use the following clues, or information (but not limited to) to help cluster document page images into structured, coherent, logical, and readable documents,
+        * in-depth document page understanding from page notes, summary, key fields, tables, and full text
+        * similar document types, and document tags,
+        * similar logos, headers, any other visual elements,
+        * similar document layout, and formatting,
+        * similar signatures, and stamps, and their associated metadata
+      * If a page cannot be **confidently grouped with others,** treat it as a single-page document.
+
+    * Step 3: **Classification and Summarization:**
+      * For each document (clusters of document page images), you have just created in Step 2, **perform the following final analysis. You must consider all pages within the document cluster holistically to determine the document's nature, even though the pages may not be in sequential order.**
+        * **Definitive Document Type Assignment:**
+          * Based on the combined evidence from all pages in the cluster, assign **one definitive type.** This is your final classification.
+          * You must reference the provided **Domain context,** to assign the definitive document type, or category.
+        * **Overall document summary:**
+          * Create an overall, information-dense summary by **synthesizing information from across all pages in the cluster.**
+
+    * Step 4: **Special Guidance for internal bank processing form.**
+      * First, identify any page that you tagged in Step 1 as an internal_bank_processing_form.
+      * **A page with this tag serves as the operational lead page for a customer's primary request document.**
+      * **You must strictly add, or append this document page image to an existing CRL (Customer Request Letter) document.**
+        * If there are more than one CRL documents, use **shared detail markers like Client Name, Amount, etc. to select the closest associated CRL.**
+
+    * Step 5: **Page Sequencing:**
+      * For each document (document page image cluster) output from Step 2, 3, and 4, arrange the document pages in the correct sequential order to form a coherent, cohesive, complete, and readable document.
+      * Note: Your reasoning for ordering the document page images within a document (cluster) must explicitly reference the structured understanding for each document page image from Step 1, to accomplish this step.
+      * Use clues like (but not limited to),
+        * explicit page numbers (possible_page_number), bullet points, and numbering,
+        * narrative flow from the extracted data,
+        * document layout, and structure aligned with document type, or category,
+      * **Special guidance for internal bank processing form**
+        * For each document, identify if any document page image has been tagged in Step 1, as internal_bank_processing_form.
+        * It is imperative for you to consider this internal_bank_processing_form document page image, as the **second page,** of the CRL document, of which it is part.
+
+    * Step 6: **Final Output Generation:**
+      * Generate the final output **strictly** in the specified **Output Format.**
+      * Do not include any other text, explanations, or comments in your response.
+"""
+
 document_clustering_sequencing_classification_si_prompt_multi_pages_3 = f"""
   **Role:**
     * You are an expert **Document Clustering, Classification, and Sequencing Agent.**
@@ -145,54 +195,96 @@ document_clustering_sequencing_classification_si_prompt_multi_pages_3 = f"""
           * rows: List of rows in the table.
           * approx_position_on_page: Approximate position of the table on page.
         * is_internal_bank_processing_form: If a page contains **only internal bank processing fields** like **Scanned in trade flow, Checklist for trade finance, Product, Product code, accompanied with Handwritten text,** then it is an internal bank processing document.
+{document_clustering_sequencing_classification_steps}
+  **Output Format:**
+    * Generate output (strictly) as per the Pydantic response schema provided to you, i.e. NonExtractedDocuments.
+    * Do not output any additional text, explanation, reasoning, or comments.
+"""
 
-    * Step 2: **Document Clustering:**
-      * Based on your comprehensive analysis, and understanding of all pages from Step 1, your task is to group the document page images (filenames) into a set of coherent, and complete documents.
-      * Note: Your reasoning for creating each cluster must explicitly reference the structured understanding for each document page image from Step 1, to accomplish this step.
-      * **Special guidance for internal bank processing form.**
-        * Ignore the document page images that have been tagged in Step 1 as internal_bank_processing_form.
-        * Treat this document page image as a single-page document, to be reviewed in Step 4.
-      * **Guiding Principle: A cluster of document page images represents a single, structurally coherent document.**
-        * Your primary goal is to identify pages that make up a single, distinct document type, or category, as per defined **Domain Context**.
-        * Since all documents are part of the same folder, they may reference each other and share details. This shared information links them as part of the same workflow, but may not mean they are the same *document*.
-      * Use the following clues, or information (but not limited to) to help cluster document page images into structured, coherent, logical, and readable documents,
-        * in-depth document page understanding from page notes, summary, key fields, tables, and full text
-        * similar document types, and document tags,
-        * similar logos, headers, any other visual elements,
-        * similar document layout, and formatting,
-        * similar signatures, and stamps, and their associated metadata
-      * If a page cannot be **confidently grouped with others,** treat it as a single-page document.
+document_understanding_and_extraction_si_prompt_multi_pages = f"""
+  **Role:**
+    * You are an expert Document Analysis Agent, specializing in understanding complex document structure, and document reasoning.
+    * Your primary task is to meticulously analyze each of the provided document page images and extract its content, structure, and metadata into a structured JSON object per page.
+    * The output must strictly adhere to the JSON schema provided in the **Output Format**.
 
-    * Step 3: **Classification and Summarization:**
-      * For each document (clusters of document page images), you have just created in Step 2, **perform the following final analysis. You must consider all pages within the document cluster holistically to determine the document's nature, even though the pages may not be in sequential order.**
-        * **Definitive Document Type Assignment:**
-          * Based on the combined evidence from all pages in the cluster, assign **one definitive type.** This is your final classification.
-          * You must reference the provided **Domain context,** to assign the definitive document type, or category.
-        * **Overall document summary:**
-          * Create an overall, information-dense summary by **synthesizing information from across all pages in the cluster.**
+  {document_image_clustering_domain_context}
 
-    * Step 4: **Special Guidance for internal bank processing form.**
-      * First, identify any page that you tagged in Step 1 as an internal_bank_processing_form.
-      * **A page with this tag serves as the operational lead page for a customer's primary request document.**
-      * **You must strictly add, or append this document page image to an existing CRL (Customer Request Letter) document.**
-        * If there are more than one CRL documents, use **shared detail markers like Client Name, Amount, etc. to select the closest associated CRL.**
+  **Objective:**
+    * You are given a batch of images, each of which is a single page within a larger document. The pages may come from several different documents, and are part of a major Indian Financial Services organization's Trade flow processing workflow.
+    * Analyze every document page image independently, comprehensively, and holistically, paying close attention to the interplay between text, tables, layout, and visual elements.
+    * Your page summaries will later be used, without the images, to cluster the pages into documents, classify the documents, and sequence their pages. Capture every clue that helps with that (headers, logos, reference numbers, parties, amounts, dates, page numbers, signatures, and stamps).
+    * Output your understanding of the document page images, in the given **Output Format.**
 
-    * Step 5: **Page Sequencing:**
-      * For each document (document page image cluster) output from Step 2, 3, and 4, arrange the document pages in the correct sequential order to form a coherent, cohesive, complete, and readable document.
-      * Note: Your reasoning for ordering the document page images within a document (cluster) must explicitly reference the structured understanding for each document page image from Step 1, to accomplish this step.
-      * Use clues like (but not limited to),
-        * explicit page numbers (possible_page_number), bullet points, and numbering,
-        * narrative flow from the extracted data,
-        * document layout, and structure aligned with document type, or category,
-      * **Special guidance for internal bank processing form**
-        * For each document, identify if any document page image has been tagged in Step 1, as internal_bank_processing_form.
-        * It is imperative for you to consider this internal_bank_processing_form document page image, as the **second page,** of the CRL document, of which it is part.
+  **Inputs:**
+    * The document page images listed in the manifest below.
+    * The actual image bytes would be provided in the same sequence as the image_manifest as content parts.
+    * The document_page_image_filename of each manifest entry is the document_page_image_file_name of the corresponding page.
 
-    * Step 6: **Final Output Generation:**
-      * Generate the final output **strictly** in the specified **Output Format.**
-      * Do not include any other text, explanations, or comments in your response.
+    <image_manifest>
+    [{{
+      "document_page_image_filename": "(Text) Filename of the image"
+    }}]
+    </image_manifest>
+
+  **Tasks:**
+    * **For each document page image in the manifest, comprehensively, and with utmost attention to detail, analyze the image.**
+    * **Use your understanding, and the guidelines provided below, to generate one structured page summary per image.**
+{document_page_summary_field_guidelines}
+    * Generate exactly one page summary for every filename in the manifest, in manifest order, and never merge or skip pages.
+    * Generate the output in the provided **Output Format.**
+
+  **Output Format:**
+    * The output format is provided as the Pydantic schema - "DocumentPageSummaries"
+    * Do not output any additional text, and / or comments.
+"""
+
+document_clustering_sequencing_classification_si_prompt_from_page_summaries = f"""
+  **Role:**
+    * You are an expert **Document Clustering, Classification, and Sequencing Agent.**
+    * You are given a set of structured summaries of scanned and mixed document pages (one per page filename), each of which corresponds to a single page in a wider document.
+      * It is to be noted that these document pages come from multiple documents.
+      * It can be assumed that multiple documents have been scanned page by page and all resulting scanned images have been mixed, and uploaded into a single folder.
+      * Therefore, these document page filenames can be (re)grouped 1 to N number of documents.
+    * You are an expert in:
+      * Clustering: Identifying which individual document pages belong together to form a single, coherent, logical, and complete document.
+      * Classification: Holistically, and comprehensively analyzing all the pages within a cluster to assign a definitive document type and create an overall document summary.
+      * Sequencing: Sequence all document pages within a cluster to form a coherent, cohesive, complete, and readable document.
+    * Let's call this the **Document Stapling, and Classification Problem.**
+
+  {document_image_clustering_domain_context}
+
+  **Objective:**
+    * Your primary objective is to **analyze a collection of individual document page summaries** and **group their filenames into distinct clusters, where each cluster represents a complete, original document.**
+    * Once a document's pages are clustered, **your second objective is to perform a final, holistic analysis of all pages in that cluster to assign a definitive document type.**
+    * Post clustering document pages into a single document, and classifying the document, you are **required to sequence its constituent document pages, such that they form a cohesive, coherent, and readable document.**
+    * You will also generate an overall summary for each document based on the complete set of its pages.
+    * You would then generate output strictly in the specified **Output Format.**
+
+  **Inputs:**
+    * The page filenames listed in the manifest below.
+    * A JSON list of page summaries, following the Pydantic schema "DocumentPageSummary", with one entry per filename in the manifest.
+
+    <page_manifest>
+    [{{
+      "document_page_image_filename": "(Text) Filename of the page"
+    }}]
+    </page_manifest>
 
+  **Tasks:** Your task is to follow a structured, multi-step process to ensure accuracy.
+
+    * Step 1: Comprehensive Document Page Summaries Review**
+      * For each page summary provided, review its document_analysis, key_fields, tables, visual_elements, signatures, stamps, and page_notes to understand the page's content and context. This review is critical for your reasoning.
+      * is_internal_bank_processing_form: If a page contains **only internal bank processing fields** like **Scanned in trade flow, Checklist for trade finance, Product, Product code, accompanied with Handwritten text,** then it is an internal bank processing document.
+      * Every filename in the manifest must appear in exactly one document of your output.
+{document_clustering_sequencing_classification_steps}
   **Output Format:**
     * Generate output (strictly) as per the Pydantic response schema provided to you, i.e. NonExtractedDocuments.
     * Do not output any additional text, explanation, reasoning, or comments.
-"""
\ No newline at end of file
+"""
+
+digital_page_text_input_note = f"""
+  **Digital Page Text:**
+    * Some pages in the manifest are born-digital. For those pages, the content part is not an image but the page's extracted text layer, wrapped as <page_text document_page_image_filename="...">...</page_text>.
+    * Each page text block takes the same position in the content parts as the page image would have, and its document_page_image_filename matches the manifest entry.
+    * Treat a page text block exactly like a page image of the same page. Layout, logos, signatures, and stamps are not visible for these pages, so rely on headers, reference numbers, parties, amounts, dates, and page numbers in the text.
+"""
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from datetime import datetime
+from typing import Optional, List, Dict, Literal
 
 # =============================================================================
 # --- Schemas for this Microservice's API I/O ---
@@ -8,6 +9,9 @@ from typing import Optional, List, Dict
 class ProcessFolderRequest(BaseModel):
     folder_path: str = Field(..., description="The absolute path to the folder containing documents to process.")
     mapping_file_path: Optional[str] = Field(None, description="Optional path to the JSON file mapping random to original filenames.")
+    use_result_cache: bool = Field(True, description="Serve a stored classification for identical inputs, if the result cache is enabled. Set to false to force a fresh model call.")
+    digital_page_mode: Optional[Literal["image", "text", "low_res_image"]] = Field(None, description="How PDF pages with a text layer are sent to the model. Defaults to the DIGITAL_PAGE_MODE setting.")
+    enhancement_profile: Optional[Literal["full", "adaptive", "minimal", "none"]] = Field(None, description="Which image enhancement stages run per page. Defaults to the ENHANCEMENT_PROFILE setting.")
 
 class ClassifiedDocument(BaseModel):
     document_id: Optional[str] = Field(None, description="A unique identifier for the processed document.")
@@ -22,6 +26,38 @@ class ClassifiedDocumentsResponse(BaseModel):
     documents: List[ClassifiedDocument] = Field(description="The list of documents clustered, sequenced, and classified from the input files.")
     processing_metadata: Optional[dict] = Field(None, description="Metadata about the processing job, e.g., latency, token usage.")
 
+class PageSummariesResponse(BaseModel):
+    request_id: str = Field(description="The unique identifier for the processing request.")
+    page_summaries: List["DocumentPageSummary"] = Field(description="One structured summary per page, used as input to the map-reduce clustering step.")
+    processing_metadata: Optional[dict] = Field(None, description="Metadata about the model call, e.g., latency, token usage.")
+
+class ProcessFolderBatchRequest(BaseModel):
+    folders: List[ProcessFolderRequest] = Field(..., min_length=1, description="The folders to process. Each folder is processed exactly as by the single-folder endpoint.")
+
+class BatchFolderResult(BaseModel):
+    index: int = Field(description="Position of the folder in the batch request.")
+    folder_path: str = Field(description="The folder this result belongs to.")
+    status: Literal["succeeded", "failed"] = Field(description="Whether the folder was processed successfully.")
+    result: Optional[ClassifiedDocumentsResponse] = Field(None, description="The classification, if the folder succeeded.")
+    error: Optional[str] = Field(None, description="Why the folder failed, if it did.")
+    latency_ms: float = Field(description="Time from the folder being scheduled to its result.")
+
+class JobSubmissionResponse(BaseModel):
+    job_id: str = Field(description="The unique identifier of the queued job.")
+    status: str = Field(description="The job status at submission time, always 'queued'.")
+    status_url: str = Field(description="Endpoint to poll for the job status and progress.")
+    result_url: str = Field(description="Endpoint to fetch the classification once the job has succeeded.")
+
+class JobStatusResponse(BaseModel):
+    job_id: str = Field(description="The unique identifier of the job.")
+    status: Literal["queued", "running", "succeeded", "failed"] = Field(description="The current job status.")
+    progress: dict = Field(default_factory=dict, description="Per-stage progress, e.g., stage, pages_total, pages_preprocessed, ai_calls_in_flight.")
+    error: Optional[str] = Field(None, description="Why the job failed, if it did.")
+    created_at: datetime = Field(description="When the job was submitted.")
+    updated_at: datetime = Field(description="When the job status or progress last changed.")
+    started_at: Optional[datetime] = Field(None, description="When a worker picked the job up.")
+    finished_at: Optional[datetime] = Field(None, description="When the job succeeded or failed.")
+
 # =============================================================================
 # --- Schemas from Original `prompts.py` (For potential future use) ---
 # Note: These are not used in the current classification workflow but are
@@ -0,0 +1,167 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+from .ai_provider_interface import AIProviderOverloadedError
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep while waiting for admission; waiters re-check at least this often.
+_MAX_POLL_SECONDS = 0.25
+
+class TokenBucket:
+    """
+    Per-minute budget that refills continuously. The level may go negative when a call
+    turns out to use more than was reserved, which delays later calls accordingly.
+    Not thread-safe on its own; the AdmissionController serializes access.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self._updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def seconds_until(self, amount: float) -> float:
+        """Seconds until `amount` is available; amounts above capacity only need a full bucket."""
+        deficit = min(amount, self.capacity) - self.level
+        return max(0.0, deficit / self.refill_per_second)
+
+class AdmissionController:
+    """
+    Admits AI calls under a concurrency limit plus requests-per-minute and
+    tokens-per-minute budgets, from threads (`acquire`) and coroutines (`aacquire`) alike.
+    Upstream 429s pause all admissions for their Retry-After via `pause`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_wait_seconds: float = 300.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_wait_seconds = max_wait_seconds
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        self._paused_until = 0.0
+        self._stats = {"admitted": 0, "rejected": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _try_admit(self, tokens: int) -> float:
+        """Admit the call and return 0, or return how long to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            wait_seconds = 0.0
+            for bucket, amount in ((self.request_bucket, 1), (self.token_bucket, tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    wait_seconds = max(wait_seconds, bucket.seconds_until(amount))
+            if self._in_flight >= self.max_concurrency:
+                wait_seconds = max(wait_seconds, _MAX_POLL_SECONDS)
+            if wait_seconds > 0:
+                return wait_seconds
+
+            self._in_flight += 1
+            if self.request_bucket is not None:
+                self.request_bucket.level -= 1
+            if self.token_bucket is not None:
+                self.token_bucket.level -= tokens
+            return 0.0
+
+    def _record_wait(self, started_at: float, admitted: bool) -> float:
+        wait_ms = (time.monotonic() - started_at) * 1000
+        with self._lock:
+            if admitted:
+                self._stats["admitted"] += 1
+                self._stats["wait_ms_total"] += wait_ms
+                self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+            else:
+                self._stats["rejected"] += 1
+        return round(wait_ms, 2)
+
+    def _reject(self, started_at: float, retry_after: float) -> None:
+        self._record_wait(started_at, admitted=False)
+        raise AIProviderOverloadedError(
+            f"AI call was not admitted within {self.max_wait_seconds:.0f}s; the model endpoint is at capacity.",
+            retry_after=retry_after
+        )
+
+    def acquire(self, tokens: int) -> float:
+        """Block until the call is admitted. Returns the wait in milliseconds."""
+        started_at = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                wait_seconds = self._try_admit(tokens)
+                if wait_seconds == 0:
+                    return self._record_wait(started_at, admitted=True)
+                if time.monotonic() + wait_seconds - started_at > self.max_wait_seconds:
+                    self._reject(started_at, wait_seconds)
+                time.sleep(min(wait_seconds, _MAX_POLL_SECONDS))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    async def aacquire(self, tokens: int) -> float:
+        """Async variant of `acquire` that waits without blocking the event loop."""
+        started_at = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                wait_seconds = self._try_admit(tokens)
+                if wait_seconds == 0:
+                    return self._record_wait(started_at, admitted=True)
+                if time.monotonic() + wait_seconds - started_at > self.max_wait_seconds:
+                    self._reject(started_at, wait_seconds)
+                await asyncio.sleep(min(wait_seconds, _MAX_POLL_SECONDS))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self, reserved_tokens: int, used_tokens: Optional[int] = None) -> None:
+        """Free the call's concurrency slot and settle its token reservation against actual usage."""
+        with self._lock:
+            self._in_flight -= 1
+            if self.token_bucket is not None and used_tokens is not None:
+                self.token_bucket.level = min(self.token_bucket.capacity, self.token_bucket.level + reserved_tokens - used_tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every admission for `seconds`, e.g. after an upstream 429 with Retry-After."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning(f"AI call admissions paused for {seconds:.1f}s after an upstream rate limit.")
+
+    def stats(self) -> Dict:
+        """Snapshot of queue depth, in-flight calls, remaining budgets and wait times."""
+        with self._lock:
+            now = time.monotonic()
+            for bucket in (self.request_bucket, self.token_bucket):
+                if bucket is not None:
+                    bucket.refill(now)
+            admitted = self._stats["admitted"]
+            return {
+                "queue_depth": self._waiting,
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "requests_available": round(self.request_bucket.level, 1) if self.request_bucket else None,
+                "tokens_available": round(self.token_bucket.level) if self.token_bucket else None,
+                "paused_for_seconds": round(max(0.0, self._paused_until - now), 2),
+                "admitted": admitted,
+                "rejected": self._stats["rejected"],
+                "wait_ms_avg": round(self._stats["wait_ms_total"] / admitted, 2) if admitted else 0.0,
+                "wait_ms_max": round(self._stats["wait_ms_max"], 2)
+            }
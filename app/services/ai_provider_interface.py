@@ -1,6 +1,19 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict
-from ..schemas import ClassifiedDocumentsResponse
+from typing import Iterable, Dict, Optional
+from ..schemas import ClassifiedDocumentsResponse, PageSummariesResponse
+
+class AIProviderRateLimitError(Exception):
+    """The upstream model endpoint kept rejecting calls with 429 after every retry."""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AIProviderOverloadedError(Exception):
+    """A call waited longer than allowed for admission under the configured AI call limits."""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
 class AIProviderInterface(ABC):
     """
@@ -10,11 +23,52 @@ class AIProviderInterface(ABC):
     @abstractmethod
     def cluster_classify_and_sequence(
         self,
-        image_parts: List[Dict],
+        image_parts: Iterable[Dict],
         prompt: str,
         request_id: str
     ) -> ClassifiedDocumentsResponse:
         """
         Processes a list of images to cluster, classify, and sequence them.
+        `image_parts` may be a lazy iterator that produces pages while it is consumed;
+        providers that cannot stream a request body should simply materialize it.
+        """
+        pass
+
+    async def acluster_classify_and_sequence(
+        self,
+        image_parts: Iterable[Dict],
+        prompt: str,
+        request_id: str
+    ) -> ClassifiedDocumentsResponse:
+        """
+        Async variant of `cluster_classify_and_sequence`.
+        Providers with a native async client should override this; the default
+        runs the blocking implementation in a worker thread so the event loop stays free.
+        """
+        return await asyncio.to_thread(self.cluster_classify_and_sequence, image_parts, prompt, request_id)
+
+    def summarize_pages(
+        self,
+        image_parts: Iterable[Dict],
+        prompt: str,
+        request_id: str
+    ) -> PageSummariesResponse:
+        """
+        Produces one structured summary per page for a batch of page images.
+        This is the map step of map-reduce classification; providers that don't support it
+        can only be used in the single-call classification mode.
         """
-        pass
\ No newline at end of file
+        raise NotImplementedError(f"{type(self).__name__} does not support page summaries.")
+
+    async def asummarize_pages(
+        self,
+        image_parts: Iterable[Dict],
+        prompt: str,
+        request_id: str
+    ) -> PageSummariesResponse:
+        """Async variant of `summarize_pages`; the default runs it in a worker thread."""
+        return await asyncio.to_thread(self.summarize_pages, image_parts, prompt, request_id)
+
+    async def aclose(self) -> None:
+        """Release any network resources held by the provider. Called on application shutdown."""
+        pass
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, List
+
+from .ai_provider_interface import AIProviderInterface, AIProviderOverloadedError, AIProviderRateLimitError
+from .workflow_service import WorkflowService
+from ..config import settings
+from ..schemas import BatchFolderResult, ProcessFolderRequest
+
+logger = logging.getLogger(__name__)
+
+class BatchService:
+    """
+    Processes many folders in one call with shared scheduling: at most
+    BATCH_FOLDER_CONCURRENCY folders are in progress at a time, their pages share the
+    process-wide preprocessing pool, and their AI calls share one concurrency limiter.
+    """
+
+    def __init__(self, ai_provider: AIProviderInterface, ai_call_limiter: asyncio.Semaphore):
+        self.ai_provider = ai_provider
+        self.ai_call_limiter = ai_call_limiter
+
+    async def aprocess_folders(self, requests: List[ProcessFolderRequest], batch_id: str) -> AsyncIterator[BatchFolderResult]:
+        """Yield one result per folder, in completion order. Closing the iterator cancels the remaining folders."""
+        folder_slots = asyncio.Semaphore(settings.BATCH_FOLDER_CONCURRENCY)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def run_folder(index: int, request: ProcessFolderRequest) -> None:
+            async with folder_slots:
+                await results.put(await self._process_folder(index, request, f"{batch_id}-{index}"))
+
+        logger.info(f"Starting batch of {len(requests)} folders.", extra={'request_id': batch_id})
+        tasks = [asyncio.create_task(run_folder(index, request)) for index, request in enumerate(requests)]
+        try:
+            for _ in range(len(tasks)):
+                yield await results.get()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _process_folder(self, index: int, request: ProcessFolderRequest, request_id: str) -> BatchFolderResult:
+        log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
+        start_time = time.perf_counter()
+        workflow = WorkflowService(
+            self.ai_provider,
+            ai_call_limiter=self.ai_call_limiter,
+            preprocessing_execution_mode=settings.BATCH_PREPROCESSING_EXECUTION_MODE
+        )
+        result, error = None, None
+        try:
+            result = await workflow.aprocess_folder(request, request_id)
+        except FileNotFoundError as e:
+            logger.error("File or folder not found during batch processing", extra=log_extra, exc_info=True)
+            error = f"The specified path was not found: {e}"
+        except (AIProviderRateLimitError, AIProviderOverloadedError) as e:
+            logger.warning("AI call rejected during batch processing.", extra=log_extra)
+            error = str(e)
+        except Exception:
+            logger.critical("An unhandled exception occurred during batch processing.", extra=log_extra, exc_info=True)
+            error = f"An internal server error occurred. Please check logs for Request ID: {request_id}"
+
+        return BatchFolderResult(
+            index=index,
+            folder_path=request.folder_path,
+            status="succeeded" if error is None else "failed",
+            result=result,
+            error=error,
+            latency_ms=round((time.perf_counter() - start_time) * 1000, 2)
+        )
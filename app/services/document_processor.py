@@ -1,33 +1,233 @@
 import os
-import io
+import time
 import base64
+import hashlib
 import logging
-import magic
+import threading
+import multiprocessing
 import pymupdf
 import cv2
 import numpy
 from PIL import Image
-from typing import List, Dict
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import List, Dict, Iterator, Optional, Set, Tuple, Union
 
+from .. import metrics
 from ..config import settings
+from .file_ingestion import detect_mime_type, file_digest, open_pdf
+from .page_cache import get_page_cache
+from .page_pipeline import StagedPipeline
 
 logger = logging.getLogger(__name__)
 
+# How pages with a text layer are sent to the model: as a full-resolution enhanced image
+# (the original behaviour), as their extracted text, or as a low-resolution unenhanced image.
+DIGITAL_PAGE_MODES = ("image", "text", "low_res_image")
+
+# Which enhancement stages run per page: every stage ('full', the original behaviour), only
+# the stages a quick quality pre-check says the page needs ('adaptive'), grayscale plus
+# sharpen/contrast ('minimal'), or none at all.
+ENHANCEMENT_PROFILES = ("full", "adaptive", "minimal", "none")
+
+# cv2.imencode quality parameter and the setting that holds its value, per output format.
+IMAGE_ENCODE_PARAMS = {
+    "png": (cv2.IMWRITE_PNG_COMPRESSION, "IMAGE_PNG_COMPRESSION"),
+    "jpeg": (cv2.IMWRITE_JPEG_QUALITY, "IMAGE_QUALITY"),
+    "webp": (cv2.IMWRITE_WEBP_QUALITY, "IMAGE_QUALITY"),
+}
+
+# Sharpening kernel applied before the contrast adjustment.
+SHARPEN_KERNEL = numpy.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+
+# --- Per-thread work buffers reused across pages ---
+_work_buffers = threading.local()
+
+def _work_buffer(name: str, shape: Tuple[int, ...], dtype=numpy.uint8) -> numpy.ndarray:
+    """
+    Scratch array for one pipeline stage, owned by the calling thread and reallocated only
+    when the page size changes. Pages of a document usually share a size, so consecutive
+    pages (and pool tasks in the same worker) write into the same memory.
+    """
+    buffers = vars(_work_buffers)
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+        buffer = numpy.empty(shape, dtype=dtype)
+        buffers[name] = buffer
+    return buffer
+
+def _pixmap_array(pix: pymupdf.Pixmap) -> numpy.ndarray:
+    """A numpy view of a pixmap's samples, without copying: (h, w) for gray, (h, w, n) otherwise."""
+    rows = numpy.frombuffer(pix.samples_mv, dtype=numpy.uint8).reshape(pix.height, pix.stride)
+    if pix.n == 1:
+        return rows[:, :pix.width]
+    return rows[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+# Thumbnails whose brightest and darkest cells differ by less than this are (nearly)
+# blank. Their hashes say nothing about content, so blank pages are never collapsed.
+MIN_HASH_CONTRAST = 16
+
+def page_hash(pixels: numpy.ndarray, hash_size: Optional[int] = None) -> Optional[str]:
+    """
+    Perceptual hash (pHash) of a page as a hex string of hash_size² bits: the lowest
+    hash_size x hash_size DCT frequencies of a 4x larger thumbnail, each compared with
+    their median. Thresholding at the median sets about half the bits on any page, so
+    mostly-white pages still get distinct hashes. Returns None for (nearly) blank pages.
+    Accepts grayscale or BGR/RGB pixels.
+    """
+    hash_size = hash_size or settings.PAGE_DEDUP_HASH_SIZE
+    thumbnail = cv2.resize(pixels, (4 * hash_size, 4 * hash_size), interpolation=cv2.INTER_AREA)
+    if thumbnail.ndim == 3:
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+    if int(thumbnail.max()) - int(thumbnail.min()) < MIN_HASH_CONTRAST:
+        return None
+    frequencies = cv2.dct(thumbnail.astype(numpy.float32))[:hash_size, :hash_size]
+    bits = frequencies > numpy.median(frequencies)
+    return numpy.packbits(bits).tobytes().hex()
+
+def text_digest(text: str) -> Optional[str]:
+    """Digest of a page's text layer with whitespace normalized, or None when it has none."""
+    normalized = " ".join(text.split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest() if normalized else None
+
+# --- MuPDF access ---
+# PyMuPDF isn't thread-safe, not even across separate documents, and concurrent requests
+# (and the startup warm-up) preprocess on different threads of this process. Every MuPDF
+# call goes through this lock; enhancement and encoding run outside it.
+_mupdf_lock = threading.RLock()
+
+@contextmanager
+def _open_pdf_locked(filepath: str) -> Iterator[pymupdf.Document]:
+    """Open and close a PDF under the MuPDF lock. Work on its pages must take the lock too."""
+    with _mupdf_lock:
+        doc = open_pdf(filepath)
+    try:
+        yield doc
+    finally:
+        with _mupdf_lock:
+            doc.close()
+
+# --- Shared process pool for CPU-bound page preprocessing ---
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool_size() -> int:
+    """Number of worker processes used by the preprocessing pool."""
+    return settings.PREPROCESSING_MAX_WORKERS or os.cpu_count() or 1
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process-wide preprocessing pool, creating it on first use."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            max_workers = get_process_pool_size()
+            # 'spawn' avoids forking a parent that runs an event loop and HTTP client threads.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Preprocessing process pool started with {max_workers} workers.")
+        return _process_pool
+
+def shutdown_process_pool() -> None:
+    """Shut down the process-wide preprocessing pool, if it was started."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True, cancel_futures=True)
+            _process_pool = None
+            logger.info("Preprocessing process pool shut down.")
+
+def _worker_ready_task() -> int:
+    """Process-pool entry point for warm-up: unpickling it imports this module (and its libraries) in the worker."""
+    return os.getpid()
+
+def warm_up_process_pool() -> int:
+    """Start every worker of the preprocessing pool and wait until each has imported the preprocessing code. Returns the number of workers."""
+    executor = get_process_pool()
+    pool_size = get_process_pool_size()
+    # The pool starts a new worker for each task submitted while no worker is idle.
+    futures = [executor.submit(_worker_ready_task) for _ in range(pool_size)]
+    return len({future.result() for future in futures})
+
+def _preprocess_page_task(filepath: str, mime_type: str, page_index: int, processor_options: Dict) -> Dict:
+    """Process-pool entry point: preprocess a single page of a single file."""
+    processor = DocumentProcessor(use_page_cache=False, **processor_options)
+    return processor._process_file_page(filepath, mime_type, page_index)
+
+def _detach_pixmap(rendered: Dict) -> Dict:
+    """
+    Copy a rendered page's pixels out of its pixmap and drop the pixmap. Called under the
+    MuPDF lock, so the pixmap is freed there rather than on whichever thread finishes the page.
+    """
+    if rendered.get("pix") is not None:
+        rendered["pixels"] = rendered["pixels"].copy()
+        rendered["pix"] = None
+    return rendered
+
+class _PipelineRenderer:
+    """
+    Rasterize stage of the preprocessing pipeline. MuPDF isn't thread-safe, so this stage
+    runs on a single thread; it keeps the current PDF open across that file's pages.
+    """
+
+    def __init__(self, processor: "DocumentProcessor"):
+        self.processor = processor
+        self._filepath: Optional[str] = None
+        self._doc: Optional[pymupdf.Document] = None
+
+    def __call__(self, task: Dict) -> Dict:
+        if task["page_data"] is not None:
+            return task
+        if task["mime_type"] != "application/pdf":
+            rendered = self.processor._render_image(task["filepath"])
+        else:
+            with _mupdf_lock:
+                if task["filepath"] != self._filepath:
+                    self.close()
+                    self._doc = open_pdf(task["filepath"])
+                    self._filepath = task["filepath"]
+                # Later stages run on other threads, so every MuPDF object stays on this one.
+                rendered = _detach_pixmap(self.processor._render_pdf_page(self._doc.load_page(task["page_index"])))
+        task["rendered"] = rendered
+        return task
+
+    def close(self) -> None:
+        if self._doc is not None:
+            with _mupdf_lock:
+                self._doc.close()
+        self._doc = None
+        self._filepath = None
+
 class DocumentProcessor:
     """
     Handles all document preprocessing tasks, including PDF-to-image conversion
     and image enhancement.
     """
 
+    def __init__(
+        self,
+        use_page_cache: bool = True,
+        digital_page_mode: Optional[str] = None,
+        enhancement_profile: Optional[str] = None,
+        execution_mode: Optional[str] = None
+    ):
+        self.page_cache = get_page_cache() if use_page_cache else None
+        self.execution_mode = (execution_mode or settings.PREPROCESSING_EXECUTION_MODE).lower()
+        self.digital_page_mode = digital_page_mode or settings.DIGITAL_PAGE_MODE
+        self.enhancement_profile = enhancement_profile or settings.ENHANCEMENT_PROFILE
+        self.preprocessing_metadata: Dict = {}
+        self._cache_stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "time_saved_ms": 0.0}
+        self._pipeline_stats: Dict = {}
+
     def _get_file_mime_type(self, file_path: str) -> str:
-        """Get the MIME type of a file using python-magic for reliability."""
+        """Get the MIME type of a file from its header bytes using python-magic for reliability."""
+        start_time = time.perf_counter()
         try:
-            return magic.from_file(file_path, mime=True)
-        except Exception as e:
-            logger.warning(f"Could not determine MIME type for {file_path} using python-magic: {e}. Falling back to mimetypes.")
-            import mimetypes
-            mime_type, _ = mimetypes.guess_type(file_path)
-            return mime_type or 'application/octet-stream'
+            return detect_mime_type(file_path)
+        finally:
+            metrics.observe_stage("mime_detection", time.perf_counter() - start_time)
 
 
     def _classify_pdf_page(self, page: pymupdf.Page) -> str:
@@ -38,115 +238,809 @@ class DocumentProcessor:
         """Convert PIL.Image to OpenCV BGR numpy array."""
         return cv2.cvtColor(numpy.array(image), cv2.COLOR_RGB2BGR)
 
-    def _np_array_to_image(self, arr: numpy.ndarray) -> Image.Image:
-        """Convert a numpy array (BGR or Grayscale) to a PIL RGB Image."""
-        if arr.ndim == 2: # Grayscale
-            return Image.fromarray(arr).convert("RGB")
-        # BGR to RGB
-        return Image.fromarray(cv2.cvtColor(arr, cv2.COLOR_BGR2RGB))
-
-    def image_enhancement_pipeline(self, image: Image.Image) -> Image.Image:
-        """Run a PIL image through a series of CV2 enhancements."""
-        img_np = self._image_to_np_array(image)
-        gray = cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
-        denoised = cv2.fastNlMeansDenoising(gray, None, h=10.0, templateWindowSize=7, searchWindowSize=21)
-
-        # Deskew logic
-        inv = cv2.bitwise_not(denoised)
-        thresh = cv2.threshold(inv, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
-        coords = numpy.column_stack(numpy.where(thresh > 0))
-        
+    def _binarize(self, gray: numpy.ndarray) -> numpy.ndarray:
+        """Otsu-threshold a grayscale page so that ink is foreground (255)."""
+        inv = cv2.bitwise_not(gray)
+        return cv2.threshold(inv, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+
+    def _min_area_rect_skew_angle(self, binary: numpy.ndarray) -> Optional[float]:
+        """
+        Legacy estimator: fits a rotated rectangle around every foreground pixel of the
+        full-resolution page. Kept for comparison; see SKEW_ESTIMATOR.
+        """
+        coords = numpy.column_stack(numpy.where(binary > 0))
+        if coords.shape[0] <= 10: # Only process if there are enough points
+            return None
+        angle = cv2.minAreaRect(coords)[-1]
+        if angle < -45:
+            return -(90 + angle)
+        return -angle
+
+    def _projection_skew_angle(self, binary: numpy.ndarray) -> Optional[float]:
+        """
+        Find the rotation that makes the horizontal projection profile of the
+        foreground sharpest, i.e. the angle at which text lines are level.
+        Foreground points are rotated analytically and binned per row, so no image is
+        rotated during the search: a coarse pass over the search range in 1 degree
+        steps is followed by a fine pass in 0.1 degree steps around the best angle.
+        """
+        points = cv2.findNonZero(binary)
+        if points is None or len(points) <= 10:
+            return None
+        points = points.reshape(-1, 2).astype(numpy.float32)
+        if len(points) > settings.SKEW_ESTIMATION_MAX_POINTS:
+            stride = -(-len(points) // settings.SKEW_ESTIMATION_MAX_POINTS)
+            points = points[::stride]
+        x, y = points[:, 0], points[:, 1]
+        # Rows are indexed from the centre so rotated points stay in a bounded bin range.
+        x = x - x.mean()
+        y = y - y.mean()
+        offset = int(numpy.ceil(numpy.hypot(numpy.abs(x).max(), numpy.abs(y).max()))) + 1
+
+        def profile_score(angle: float) -> float:
+            # Row of each point after cv2.getRotationMatrix2D(center, angle, 1.0).
+            radians = numpy.deg2rad(angle)
+            rows = numpy.rint(y * numpy.cos(radians) - x * numpy.sin(radians)).astype(numpy.int64) + offset
+            counts = numpy.bincount(rows, minlength=2 * offset + 1).astype(numpy.float64)
+            return float(numpy.dot(counts, counts))
+
+        search_range = settings.SKEW_SEARCH_RANGE
+        coarse_angles = numpy.arange(-search_range, search_range + 0.5, 1.0)
+        best_angle = max(coarse_angles, key=profile_score)
+        fine_angles = numpy.arange(best_angle - 1.0, best_angle + 1.05, 0.1)
+        return round(float(max(fine_angles, key=profile_score)), 2)
+
+    def _estimate_skew(self, gray: numpy.ndarray) -> Optional[float]:
+        """
+        Rotation angle, in degrees, that straightens a grayscale page. The projection
+        estimator runs on a copy halved until it fits SKEW_ESTIMATION_MAX_SIDE; the
+        rotation itself is always applied at full resolution by the caller.
+        """
+        if settings.SKEW_ESTIMATOR.lower() == "min_area_rect":
+            return self._min_area_rect_skew_angle(self._binarize(gray))
+
+        # Gaussian pyramid halving is several times faster than an INTER_AREA resize.
+        while max(gray.shape) > settings.SKEW_ESTIMATION_MAX_SIDE:
+            gray = cv2.pyrDown(gray)
+        return self._projection_skew_angle(self._binarize(gray))
+
+    def _rotate(self, gray: numpy.ndarray, angle: float) -> numpy.ndarray:
+        (h, w) = gray.shape
+        center = (w // 2, h // 2)
+        M = cv2.getRotationMatrix2D(center, angle, 1.0)
+        return cv2.warpAffine(gray, M, (w, h), dst=_work_buffer("deskew", gray.shape), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+    def _denoise(self, gray: numpy.ndarray) -> numpy.ndarray:
+        return cv2.fastNlMeansDenoising(gray, _work_buffer("denoise", gray.shape), h=10.0, templateWindowSize=7, searchWindowSize=21)
+
+    def _sharpen_and_adjust_contrast(self, gray: numpy.ndarray) -> numpy.ndarray:
+        sharpened = cv2.filter2D(src=gray, ddepth=-1, kernel=SHARPEN_KERNEL, dst=_work_buffer("sharpen", gray.shape))
+        # The contrast adjustment runs in place on the sharpened buffer.
+        return cv2.convertScaleAbs(sharpened, dst=sharpened, alpha=settings.SHARPEN_CONTRAST_ALPHA, beta=settings.SHARPEN_CONTRAST_BETA)
+
+    def _estimate_noise(self, gray: numpy.ndarray) -> float:
+        """
+        Estimate the Gaussian noise sigma (Immerkaer's method) on a full-resolution
+        centre crop, so the estimate isn't smoothed away by downscaling.
+        """
+        crop_size = settings.ENHANCEMENT_NOISE_CROP_SIZE
+        (h, w) = gray.shape
+        top, left = max(0, (h - crop_size) // 2), max(0, (w - crop_size) // 2)
+        crop = gray[top:top + crop_size, left:left + crop_size].astype(numpy.float32)
+        if crop.shape[0] < 3 or crop.shape[1] < 3:
+            return 0.0
+        kernel = numpy.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=numpy.float32)
+        response = cv2.filter2D(crop, -1, kernel)[1:-1, 1:-1]
+        return float(numpy.sqrt(numpy.pi / 2) * numpy.abs(response).mean() / 6)
+
+    def _full_enhancement(self, gray: numpy.ndarray, report: Dict) -> numpy.ndarray:
+        """The original pipeline: denoise, deskew, sharpen and contrast on every page."""
+        timings_ms = report["timings_ms"]
+        start_time = time.perf_counter()
+        denoised = self._denoise(gray)
+        timings_ms["denoise"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        start_time = time.perf_counter()
+        angle = self._estimate_skew(denoised)
+        report["stages"] = ["denoise", "sharpen"]
+
         deskewed = denoised
-        if coords.shape[0] > 10: # Only process if there are enough points
-            angle = cv2.minAreaRect(coords)[-1]
-            if angle < -45:
-                angle = -(90 + angle)
-            else:
-                angle = -angle
-            
-            if abs(angle) > settings.SMALL_ANGLE_THRESHOLD:
-                (h, w) = denoised.shape
-                center = (w // 2, h // 2)
-                M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                deskewed = cv2.warpAffine(denoised, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-
-        # Sharpen & Contrast
-        kernel = numpy.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-        sharpened = cv2.filter2D(src=deskewed, ddepth=-1, kernel=kernel)
-        adjusted = cv2.convertScaleAbs(sharpened, alpha=settings.SHARPEN_CONTRAST_ALPHA, beta=settings.SHARPEN_CONTRAST_BETA)
-        
-        return self._np_array_to_image(adjusted)
+        if angle is not None and abs(angle) > settings.SMALL_ANGLE_THRESHOLD:
+            deskewed = self._rotate(denoised, angle)
+            report["stages"].insert(1, "deskew")
+        timings_ms["deskew"] = round((time.perf_counter() - start_time) * 1000, 2)
 
-    def _process_pdf_to_images(self, pdf_bytes: bytes) -> List[Dict]:
-        """Convert each page of a PDF to an enhanced image."""
-        images_data = []
-        doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
-        scaling_factor = settings.TARGET_DPI / settings.DEFAULT_DPI
-        matrix = pymupdf.Matrix(scaling_factor, scaling_factor)
+        start_time = time.perf_counter()
+        adjusted = self._sharpen_and_adjust_contrast(deskewed)
+        timings_ms["sharpen"] = round((time.perf_counter() - start_time) * 1000, 2)
+        return adjusted
+
+    def _adaptive_enhancement(self, gray: numpy.ndarray, classification: str, report: Dict) -> numpy.ndarray:
+        """Run only the stages the quality pre-check says this page needs."""
+        report["stages"] = []
+        if classification == "digital":
+            # Vector-rendered pages are noise-free, straight and sharp already.
+            return gray
+
+        timings_ms = report["timings_ms"]
+        start_time = time.perf_counter()
+        noise_sigma = self._estimate_noise(gray)
+        angle = self._estimate_skew(gray)
+        report["noise_sigma"] = round(noise_sigma, 2)
+        report["skew_angle"] = round(angle, 2) if angle is not None else None
+        timings_ms["precheck"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        if noise_sigma > settings.ENHANCEMENT_NOISE_THRESHOLD:
+            start_time = time.perf_counter()
+            gray = self._denoise(gray)
+            timings_ms["denoise"] = round((time.perf_counter() - start_time) * 1000, 2)
+            report["stages"].append("denoise")
+        if angle is not None and abs(angle) > settings.SMALL_ANGLE_THRESHOLD:
+            start_time = time.perf_counter()
+            gray = self._rotate(gray, angle)
+            timings_ms["deskew"] = round((time.perf_counter() - start_time) * 1000, 2)
+            report["stages"].append("deskew")
+        report["stages"].append("sharpen")
+        start_time = time.perf_counter()
+        adjusted = self._sharpen_and_adjust_contrast(gray)
+        timings_ms["sharpen"] = round((time.perf_counter() - start_time) * 1000, 2)
+        return adjusted
+
+    def image_enhancement_pipeline(self, image: Union[Image.Image, numpy.ndarray], classification: str = "scanned") -> Tuple[numpy.ndarray, Dict]:
+        """
+        Run a PIL image, or a grayscale or BGR array, through the CV2 enhancements of the
+        current enhancement profile. Returns the enhanced image as a grayscale array (the
+        input array for the 'none' profile) and a report of the stages that ran and their
+        timings. Enhanced arrays live in this thread's work buffers: they are only valid
+        until the next page is enhanced on the same thread.
+        """
+        report = {"profile": self.enhancement_profile, "timings_ms": {}}
+        img_np = self._image_to_np_array(image) if isinstance(image, Image.Image) else image
+        if self.enhancement_profile == "none":
+            report["stages"] = []
+            return img_np, report
+
+        gray = img_np if img_np.ndim == 2 else cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
+        if self.enhancement_profile == "full":
+            adjusted = self._full_enhancement(gray, report)
+        elif self.enhancement_profile == "adaptive":
+            adjusted = self._adaptive_enhancement(gray, classification, report)
+        else:
+            report["stages"] = ["sharpen"]
+            start_time = time.perf_counter()
+            adjusted = self._sharpen_and_adjust_contrast(gray)
+            report["timings_ms"]["sharpen"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        return adjusted, report
+
+    def _encode_image(self, img_np: numpy.ndarray) -> Tuple[bytes, str]:
+        """
+        Encode a grayscale or BGR page array with the configured format, quality,
+        colour handling and pixel budget. Returns the encoded bytes and their MIME type.
+        """
+        image_format = settings.DEFAULT_IMAGE_FORMAT.lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in IMAGE_ENCODE_PARAMS:
+            raise ValueError(f"Unsupported image format: {image_format}. Expected one of {tuple(IMAGE_ENCODE_PARAMS)}.")
+
+        if img_np.ndim == 2 and not settings.IMAGE_GRAYSCALE_PASSTHROUGH:
+            img_np = cv2.cvtColor(img_np, cv2.COLOR_GRAY2BGR, dst=_work_buffer("encode", img_np.shape + (3,)))
+
+        (h, w) = img_np.shape[:2]
+        if settings.IMAGE_MAX_PIXELS and h * w > settings.IMAGE_MAX_PIXELS:
+            scale = (settings.IMAGE_MAX_PIXELS / (h * w)) ** 0.5
+            img_np = cv2.resize(img_np, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        param_flag, param_setting = IMAGE_ENCODE_PARAMS[image_format]
+        ok, encoded = cv2.imencode(f".{image_format}", img_np, [param_flag, getattr(settings, param_setting)])
+        if not ok:
+            raise ValueError(f"Failed to encode page as {image_format}.")
+        return encoded.tobytes(), f"image/{image_format}"
+
+    def _encode_page(
+        self,
+        img_np: numpy.ndarray,
+        page_number: int,
+        classification: str,
+        timings_ms: Dict,
+        enhancement: Optional[Dict] = None
+    ) -> Dict:
+        """Encode an enhanced page array into the page data dictionary."""
+        start_time = time.perf_counter()
+        image_bytes, mime_type = self._encode_image(img_np)
+        timings_ms["encode"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        start_time = time.perf_counter()
+        base64_data = base64.b64encode(image_bytes).decode("utf-8")
+        timings_ms["base64"] = round((time.perf_counter() - start_time) * 1000, 2)
+        timings_ms["total"] = round(sum(timings_ms.values()), 2)
+
+        return {
+            "page_number": page_number,
+            "classification": classification,
+            "base64_data": base64_data,
+            "mime_type": mime_type,
+            "image_bytes": len(image_bytes),
+            "timings_ms": timings_ms,
+            "enhancement": enhancement
+        }
+
+    def warm_up(self) -> Dict[str, float]:
+        """
+        Preprocess a small generated page end to end, so the one-time initialization of
+        libmagic, MuPDF (fonts, colour spaces) and OpenCV happens before the first request.
+        Returns the milliseconds each step took.
+        """
+        timings_ms = {}
+        start_time = time.perf_counter()
+        with _mupdf_lock, pymupdf.open() as doc:
+            page = doc.new_page(width=120, height=170)
+            page.insert_text((10, 20), "Warm-up page 1", fontsize=8)
+            pdf_bytes = doc.tobytes()
+        detect_mime_type("warm-up.pdf", header=pdf_bytes)
+        timings_ms["mime_detection"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        start_time = time.perf_counter()
+        with _mupdf_lock, pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+            rendered = _detach_pixmap(self._render_pdf_page(doc.load_page(0)))
+        timings_ms["render"] = round((time.perf_counter() - start_time) * 1000, 2)
+        start_time = time.perf_counter()
+        self._finish_page(rendered)
+        timings_ms["enhance_encode"] = round((time.perf_counter() - start_time) * 1000, 2)
+        return timings_ms
+
+    @property
+    def digital_page_mode(self) -> str:
+        return self._digital_page_mode
+
+    @digital_page_mode.setter
+    def digital_page_mode(self, mode: str) -> None:
+        mode = mode.lower()
+        if mode not in DIGITAL_PAGE_MODES:
+            raise ValueError(f"Unsupported digital page mode: {mode}. Expected one of {DIGITAL_PAGE_MODES}.")
+        self._digital_page_mode = mode
+
+    @property
+    def enhancement_profile(self) -> str:
+        return self._enhancement_profile
 
-        for page_num, page in enumerate(doc):
+    @enhancement_profile.setter
+    def enhancement_profile(self, profile: str) -> None:
+        profile = profile.lower()
+        if profile not in ENHANCEMENT_PROFILES:
+            raise ValueError(f"Unsupported enhancement profile: {profile}. Expected one of {ENHANCEMENT_PROFILES}.")
+        self._enhancement_profile = profile
+
+    def _rasterize_grayscale(self) -> bool:
+        """Pages are enhanced in grayscale, so unless enhancement is off they can be rendered that way."""
+        return settings.RASTERIZE_GRAYSCALE and self.enhancement_profile != "none"
+
+    def processor_options(self) -> Dict:
+        """Per-request options a pool worker needs to preprocess pages the same way as this processor."""
+        return {"digital_page_mode": self.digital_page_mode, "enhancement_profile": self.enhancement_profile}
+
+    def page_cache_variant(self) -> str:
+        """Identifies the digital page handling and enhancement profile in cache keys; empty for the original behaviour."""
+        variant = ""
+        if self.digital_page_mode != "image":
+            variant += (
+                f"digital_page_mode={self.digital_page_mode};"
+                f"min_text_chars={settings.DIGITAL_PAGE_MIN_TEXT_CHARS};"
+                f"low_res_dpi={settings.DIGITAL_PAGE_LOW_RES_DPI};"
+            )
+        if self.enhancement_profile != "full":
+            variant += f"enhancement_profile={self.enhancement_profile};"
+        if self.enhancement_profile == "adaptive":
+            variant += (
+                f"noise_threshold={settings.ENHANCEMENT_NOISE_THRESHOLD};"
+                f"noise_crop_size={settings.ENHANCEMENT_NOISE_CROP_SIZE};"
+            )
+        if self._rasterize_grayscale():
+            variant += "rasterize=gray;"
+        return variant
+
+    def _process_pdf_page(self, doc: pymupdf.Document, page_index: int) -> Dict:
+        """
+        Rasterize, enhance and encode a single PDF page, or take the text-first path for
+        digital pages. Only the MuPDF part holds the MuPDF lock, and the pixmap is released
+        inside it.
+        """
+        with _mupdf_lock:
+            rendered = _detach_pixmap(self._render_pdf_page(doc.load_page(page_index)))
+        return self._finish_page(rendered)
+
+    def _render_pdf_page(self, page: pymupdf.Page) -> Dict:
+        """
+        The MuPDF part of preprocessing a PDF page: text extraction, classification and
+        rasterization. Returns the finished page data for text-first digital pages, and
+        otherwise a rendered page to pass to `_finish_page`.
+        """
+        timings_ms = {}
+
+        # Extracted once: it drives the digital page mode, the classification and the duplicate check.
+        start_time = time.perf_counter()
+        text = page.get_text("text").strip()
+        timings_ms["extract"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        # Pages with only a stray page number or stamp in their text layer still go as images.
+        if self.digital_page_mode != "image" and len(text) >= settings.DIGITAL_PAGE_MIN_TEXT_CHARS:
+            if self.digital_page_mode == "text":
+                return self._text_page(text, page.number + 1, timings_ms)
+            rendered = self._render_low_res_pdf_page(page, timings_ms)
+            rendered["text_digest"] = text_digest(text)
+            return rendered
+
+        start_time = time.perf_counter()
+        pix, pixels = self._rasterize(page, settings.TARGET_DPI, self._rasterize_grayscale())
+        timings_ms["rasterize"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        return {
+            "page_number": page.number + 1,
+            "classification": "digital" if text else "scanned",
+            "text_digest": text_digest(text),
+            # Owns the memory `pixels` views; `_detach_pixmap` copies the pixels out and drops it.
+            "pix": pix,
+            "pixels": pixels,
+            "enhance": True,
+            "timings_ms": timings_ms
+        }
+
+    def _render_low_res_pdf_page(self, page: pymupdf.Page, timings_ms: Dict) -> Dict:
+        """Render a digital page at DIGITAL_PAGE_LOW_RES_DPI. Born-digital renders are clean, so enhancement is skipped."""
+        start_time = time.perf_counter()
+        pix, pixels = self._rasterize(page, settings.DIGITAL_PAGE_LOW_RES_DPI, grayscale=False)
+        timings_ms["rasterize"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        return {"page_number": page.number + 1, "classification": "digital", "pix": pix, "pixels": pixels, "enhance": False, "timings_ms": timings_ms}
+
+    def _rasterize(self, page: pymupdf.Page, dpi: int, grayscale: bool) -> Tuple[pymupdf.Pixmap, numpy.ndarray]:
+        """
+        Render a page and return the pixmap with a view of its samples, without copying:
+        (h, w) for grayscale renders, (h, w, 3) RGB otherwise. The view is only valid
+        while the pixmap is referenced.
+        """
+        scaling_factor = dpi / settings.DEFAULT_DPI
+        matrix = pymupdf.Matrix(scaling_factor, scaling_factor)
+        if grayscale:
+            pix = page.get_pixmap(matrix=matrix, colorspace=pymupdf.csGRAY)
+        else:
             pix = page.get_pixmap(matrix=matrix)
-            img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
-            enhanced_img = self.image_enhancement_pipeline(img)
-            
-            buffer = io.BytesIO()
-            enhanced_img.save(buffer, format=settings.DEFAULT_IMAGE_FORMAT)
-            
-            images_data.append({
-                "page_number": page_num + 1,
-                "classification": self._classify_pdf_page(page),
-                "base64_data": base64.b64encode(buffer.getvalue()).decode("utf-8"),
-                "mime_type": f"image/{settings.DEFAULT_IMAGE_FORMAT}"
-            })
-        return images_data
+        return pix, _pixmap_array(pix)
+
+    def _finish_page(self, rendered: Dict) -> Dict:
+        """
+        Enhance (unless disabled for the page) and encode a rendered page on the calling
+        thread. Page data that was finished while rendering passes through.
+        """
+        if "pixels" not in rendered:
+            return rendered
+        timings_ms = rendered["timings_ms"]
+        img_np = rendered["pixels"]
+        if img_np.ndim == 3:
+            start_time = time.perf_counter()
+            img_np = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR, dst=_work_buffer("rasterize", img_np.shape))
+            timings_ms["rasterize"] = round(timings_ms.get("rasterize", 0.0) + (time.perf_counter() - start_time) * 1000, 2)
+
+        start_time = time.perf_counter()
+        perceptual_hash = page_hash(img_np)
+        timings_ms["hash"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        enhancement = None
+        if rendered["enhance"]:
+            start_time = time.perf_counter()
+            img_np, enhancement = self.image_enhancement_pipeline(img_np, rendered["classification"])
+            timings_ms["enhance"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        page_data = self._encode_page(img_np, rendered["page_number"], rendered["classification"], timings_ms, enhancement)
+        page_data["page_hash"] = perceptual_hash
+        page_data["text_digest"] = rendered.get("text_digest")
+        return page_data
+
+    def _text_page(self, text: str, page_number: int, timings_ms: Dict) -> Dict:
+        """Page data for a digital page sent as its extracted text layer instead of an image."""
+        timings_ms["total"] = round(sum(timings_ms.values()), 2)
+        return {
+            "page_number": page_number,
+            "classification": "digital",
+            "text": text,
+            "mime_type": "text/plain",
+            "timings_ms": timings_ms
+        }
+
+    def _process_pdf_to_images(self, pdf_bytes: bytes) -> List[Dict]:
+        """Convert each page of a PDF to an enhanced image."""
+        with _mupdf_lock:
+            doc = pymupdf.open(stream=pdf_bytes, filetype="pdf")
+            page_count = doc.page_count
+        try:
+            return [self._process_pdf_page(doc, page_index) for page_index in range(page_count)]
+        finally:
+            with _mupdf_lock:
+                doc.close()
 
     def _process_image(self, file_path: str) -> List[Dict]:
         """Process a single image file."""
-        img = Image.open(file_path).convert("RGB")
-        enhanced_img = self.image_enhancement_pipeline(img)
-        
-        buffer = io.BytesIO()
-        enhanced_img.save(buffer, format=settings.DEFAULT_IMAGE_FORMAT)
-        
-        return [{
-            "page_number": 1,
-            "classification": "scanned",
-            "base64_data": base64.b64encode(buffer.getvalue()).decode("utf-8"),
-            "mime_type": f"image/{settings.DEFAULT_IMAGE_FORMAT}"
-        }]
+        return [self._finish_page(self._render_image(file_path))]
 
-    def preprocess_folder(self, data_folder: str) -> List[Dict]:
-        """Iterate through a folder, preprocess all files, and return image data."""
-        processed_pages = []
+    def _render_image(self, file_path: str) -> Dict:
+        """Decode an image file into a rendered page: grayscale, or RGB when it is rendered in colour."""
+        timings_ms = {}
+
+        start_time = time.perf_counter()
+        with Image.open(file_path) as image:
+            pixels = numpy.asarray(image.convert("L" if self._rasterize_grayscale() else "RGB"))
+        timings_ms["rasterize"] = round((time.perf_counter() - start_time) * 1000, 2)
+
+        return {"page_number": 1, "classification": "scanned", "pix": None, "pixels": pixels, "enhance": True, "timings_ms": timings_ms}
+
+    def _get_page_count(self, filepath: str, mime_type: str) -> int:
+        """Return the number of pages a supported file will produce."""
+        if mime_type == "application/pdf":
+            with _mupdf_lock, open_pdf(filepath) as doc:
+                return doc.page_count
+        return 1
+
+    def _page_cache_keys(self, filepath: str, page_count: int) -> List[Optional[str]]:
+        """Cache keys for every page of a file, or all None when the page cache is disabled."""
+        if self.page_cache is None:
+            return [None] * page_count
+        content_digest = file_digest(filepath)
+        variant = self.page_cache_variant()
+        return [self.page_cache.make_key(content_digest, page_index, variant) for page_index in range(page_count)]
+
+    def _get_cached_page(self, cache_key: Optional[str], page_number: int) -> Optional[Dict]:
+        """Rebuild a page data dictionary from the page cache, or return None on a miss."""
+        if cache_key is None:
+            return None
+
+        start_time = time.perf_counter()
+        entry = self.page_cache.get(cache_key)
+        if entry is None:
+            self._cache_stats["misses"] += 1
+            return None
+
+        self._cache_stats["hits"] += 1
+        self._cache_stats["bytes_saved"] += len(entry["data"])
+        self._cache_stats["time_saved_ms"] += entry["timings_ms"].get("total", 0.0)
+        cache_ms = round((time.perf_counter() - start_time) * 1000, 2)
+        page_data = {
+            "page_number": page_number,
+            "classification": entry["classification"],
+            "mime_type": entry["mime_type"],
+            "timings_ms": {"cache": cache_ms, "total": cache_ms},
+            "enhancement": entry.get("enhancement"),
+            "page_hash": entry.get("page_hash"),
+            "text_digest": entry.get("text_digest")
+        }
+        if entry["mime_type"] == "text/plain":
+            page_data["text"] = entry["data"].decode("utf-8")
+        else:
+            page_data["base64_data"] = base64.b64encode(entry["data"]).decode("utf-8")
+            page_data["image_bytes"] = len(entry["data"])
+        return page_data
+
+    def _store_cached_page(self, cache_key: Optional[str], page_data: Dict) -> None:
+        """Write a freshly preprocessed page to the page cache."""
+        if cache_key is None:
+            return
+        header = {
+            "classification": page_data["classification"],
+            "mime_type": page_data["mime_type"],
+            "timings_ms": page_data["timings_ms"],
+            "enhancement": page_data.get("enhancement"),
+            "page_hash": page_data.get("page_hash"),
+            "text_digest": page_data.get("text_digest")
+        }
+        if "text" in page_data:
+            data = page_data["text"].encode("utf-8")
+        else:
+            data = base64.b64decode(page_data["base64_data"])
+        self.page_cache.put(cache_key, header, data)
+
+    def _process_file_page(self, filepath: str, mime_type: str, page_index: int) -> Dict:
+        """Preprocess one page of a file. Used as the unit of work for the process pool."""
+        if mime_type == "application/pdf":
+            with _open_pdf_locked(filepath) as doc:
+                return self._process_pdf_page(doc, page_index)
+        return self._process_image(filepath)[0]
+
+    def plan_folder(self, data_folder: str) -> List[Tuple[str, str, str, int]]:
+        """
+        Return (filename, filepath, mime_type, page_count) for every supported file, in
+        deterministic order. This is cheap (no rasterization), so the full page list and
+        manifest are known before any page is preprocessed.
+        """
         if not os.path.isdir(data_folder):
             raise FileNotFoundError(f"The specified folder does not exist: {data_folder}")
 
+        planned_files = []
         for filename in sorted(os.listdir(data_folder)):
             filepath = os.path.join(data_folder, filename)
             if not os.path.isfile(filepath):
                 continue
-            
+
+            mime_type = self._get_file_mime_type(filepath)
+            if mime_type != "application/pdf" and not mime_type.startswith("image/"):
+                logger.warning(f"Skipping unsupported file type: {filename}")
+                continue
             try:
-                mime_type = self._get_file_mime_type(filepath)
-                logger.info(f"Processing file: {filename} (MIME: {mime_type})")
+                page_count = self._get_page_count(filepath, mime_type)
+            except Exception:
+                logger.error(f"Failed to open file {filename}", exc_info=True)
+                continue
+            planned_files.append((filename, filepath, mime_type, page_count))
+        return planned_files
+
+    def planned_page_filenames(self, planned_files: List[Tuple[str, str, str, int]]) -> List[str]:
+        """Page filenames, in manifest order, that preprocessing the planned files will produce."""
+        return [
+            f"{filename}_page_{page_number}"
+            for filename, _, _, page_count in planned_files
+            for page_number in range(1, page_count + 1)
+        ]
+
+    def _iter_pool_results(
+        self,
+        executor: Executor,
+        tasks: Iterator[Tuple[str, str, str, int, Optional[str]]],
+        window: int
+    ) -> Iterator[Tuple[Tuple[str, str, str, int, Optional[str]], Future, bool]]:
+        """
+        Submit page tasks to the executor, keeping at most `window` in flight,
+        and yield (task, future, from_cache) tuples in submission order.
+        Pages found in the page cache are resolved in the parent without a round-trip to the pool.
+        """
+        pending = deque()
+
+        def submit_next() -> None:
+            task = next(tasks, None)
+            if task is None:
+                return
+            _, filepath, mime_type, page_index, cache_key = task
+            cached_page = self._get_cached_page(cache_key, page_index + 1)
+            if cached_page is not None:
+                future = Future()
+                future.set_result(cached_page)
+            else:
+                future = executor.submit(_preprocess_page_task, filepath, mime_type, page_index, self.processor_options())
+            pending.append((task, future, cached_page is not None))
+
+        for _ in range(window):
+            submit_next()
+        while pending:
+            task, future, from_cache = pending.popleft()
+            submit_next()
+            yield task, future, from_cache
+
+    def _iter_pool_tasks(self, planned_files: List[Tuple[str, str, str, int]]) -> Iterator[Tuple[str, str, str, int, Optional[str]]]:
+        """Expand planned files into page tasks, computing page cache keys lazily, one file at a time."""
+        for filename, filepath, mime_type, page_count in planned_files:
+            logger.info(f"Processing file: {filename} (MIME: {mime_type}, pages: {page_count})")
+            for page_index, cache_key in enumerate(self._page_cache_keys(filepath, page_count)):
+                yield filename, filepath, mime_type, page_index, cache_key
+
+    def _iter_folder_in_pool(self, planned_files: List[Tuple[str, str, str, int]], strict: bool, failed_files: Set[str]) -> Iterator[Tuple[str, Dict]]:
+        """Fan page-level work out over the shared process pool, yielding (filename, page data) in order."""
+        executor = get_process_pool()
+        # Bound the number of in-flight pages so finished results don't pile up in memory.
+        window = 2 * get_process_pool_size()
+
+        for (filename, _, _, page_index, cache_key), future, from_cache in self._iter_pool_results(executor, self._iter_pool_tasks(planned_files), window):
+            if filename in failed_files:
+                future.cancel()
+                continue
+            try:
+                page_data = future.result()
+            except Exception:
+                if strict:
+                    raise
+                logger.error(f"Failed to process page {page_index + 1} of file {filename}; skipping the file", exc_info=True)
+                failed_files.add(filename)
+                continue
+            if not from_cache:
+                self._store_cached_page(cache_key, page_data)
+            yield filename, page_data
+
+    def _iter_pipeline_tasks(self, planned_files: List[Tuple[str, str, str, int]]) -> Iterator[Dict]:
+        """Pipeline source: one task per page, in order, with page cache hits resolved up front."""
+        for filename, filepath, mime_type, page_count in planned_files:
+            logger.info(f"Processing file: {filename} (MIME: {mime_type}, pages: {page_count})")
+            for page_index, cache_key in enumerate(self._page_cache_keys(filepath, page_count)):
+                page_data = self._get_cached_page(cache_key, page_index + 1)
+                yield {
+                    "filename": filename,
+                    "filepath": filepath,
+                    "mime_type": mime_type,
+                    "page_index": page_index,
+                    "cache_key": cache_key,
+                    "from_cache": page_data is not None,
+                    "page_data": page_data
+                }
+
+    def _finish_task(self, task: Dict) -> Dict:
+        """Enhance and encode stage of the preprocessing pipeline."""
+        if task["page_data"] is None:
+            task["page_data"] = self._finish_page(task.pop("rendered"))
+        return task
 
-                pages_data = []
-                if mime_type == "application/pdf":
-                    with open(filepath, "rb") as f:
-                        pages_data = self._process_pdf_to_images(f.read())
-                elif mime_type.startswith("image/"):
-                    pages_data = self._process_image(filepath)
-                else:
-                    logger.warning(f"Skipping unsupported file type: {filename}")
+    def _iter_folder_in_pipeline(self, planned_files: List[Tuple[str, str, str, int]], strict: bool, failed_files: Set[str]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Preprocess pages in a staged pipeline: page cache lookups, rasterization (one
+        thread) and enhancement plus encoding (PIPELINE_ENHANCE_WORKERS threads) run at
+        the same time, with PIPELINE_QUEUE_SIZE pages queued between stages. The caller
+        (e.g. AI submission) is the last stage, so it can send the first pages while later
+        pages are still being processed. (filename, page data) pairs are yielded in order.
+        """
+        renderer = _PipelineRenderer(self)
+        pipeline = StagedPipeline(
+            self._iter_pipeline_tasks(planned_files),
+            [
+                ("rasterize", renderer, 1),
+                # Enhanced arrays live in per-thread work buffers, so encoding runs on the enhancing thread.
+                ("enhance_encode", self._finish_task, settings.PIPELINE_ENHANCE_WORKERS or os.cpu_count() or 1)
+            ],
+            settings.PIPELINE_QUEUE_SIZE,
+            source_stage="ingest",
+            consumer_stage="submit",
+            name="preprocess"
+        )
+        try:
+            for task, error in pipeline:
+                if task is None:
+                    # The page source itself failed, so no further pages can be produced.
+                    raise error
+                filename = task["filename"]
+                if filename in failed_files:
+                    continue
+                if error is not None:
+                    if strict:
+                        raise error
+                    logger.error(f"Failed to process page {task['page_index'] + 1} of file {filename}; skipping the file", exc_info=error)
+                    failed_files.add(filename)
                     continue
-                
-                # Add original filename to each page for tracing
-                for page in pages_data:
-                    page['filename'] = f"{filename}_page_{page['page_number']}"
-                processed_pages.extend(pages_data)
+                if not task["from_cache"]:
+                    self._store_cached_page(task["cache_key"], task["page_data"])
+                yield filename, task["page_data"]
+        finally:
+            pipeline.close()
+            renderer.close()
+            self._pipeline_stats = pipeline.stats()
 
-            except Exception as e:
+    def _iter_folder_sequential(self, planned_files: List[Tuple[str, str, str, int]], strict: bool, failed_files: Set[str]) -> Iterator[Tuple[str, Dict]]:
+        """Preprocess each file in turn on the calling thread, yielding (filename, page data) as pages are produced."""
+        for filename, filepath, mime_type, page_count in planned_files:
+            try:
+                logger.info(f"Processing file: {filename} (MIME: {mime_type})")
+                for page_data in self._iter_file_pages(filepath, mime_type, page_count):
+                    yield filename, page_data
+            except Exception:
+                if strict:
+                    raise
                 logger.error(f"Failed to process file {filename}", exc_info=True)
-                # Decide whether to raise the error or just log and continue
-        
-        return processed_pages
\ No newline at end of file
+                failed_files.add(filename)
+
+    def _iter_complete_files(self, pages: Iterator[Tuple[str, Dict]], failed_files: Set[str]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Hold back each file's pages until the file is finished, and drop every page of a
+        file that failed part-way, so a file is either sent whole or skipped.
+        """
+        held_filename, held_pages = None, []
+        for filename, page_data in pages:
+            if filename != held_filename:
+                if held_filename not in failed_files:
+                    yield from ((held_filename, held_page) for held_page in held_pages)
+                held_filename, held_pages = filename, []
+            held_pages.append(page_data)
+        if held_filename not in failed_files:
+            yield from ((held_filename, held_page) for held_page in held_pages)
+
+    def _iter_file_pages(self, filepath: str, mime_type: str, page_count: int) -> Iterator[Dict]:
+        """Preprocess every page of one file, serving pages from the page cache where possible."""
+        cache_keys = self._page_cache_keys(filepath, page_count)
+        if mime_type != "application/pdf":
+            page_data = self._get_cached_page(cache_keys[0], 1)
+            if page_data is None:
+                page_data = self._process_image(filepath)[0]
+                self._store_cached_page(cache_keys[0], page_data)
+            yield page_data
+            return
+
+        # Opened by path: pages are read from disk on demand instead of holding the whole file in memory.
+        with _open_pdf_locked(filepath) as doc:
+            for page_index, cache_key in enumerate(cache_keys):
+                page_data = self._get_cached_page(cache_key, page_index + 1)
+                if page_data is None:
+                    page_data = self._process_pdf_page(doc, page_index)
+                    self._store_cached_page(cache_key, page_data)
+                yield page_data
+
+    def _tag_page(self, filename: str, page_data: Dict) -> Dict:
+        """Add the original filename to the page for tracing and log its timings."""
+        page_data['filename'] = f"{filename}_page_{page_data['page_number']}"
+        logger.debug(f"Preprocessed page {page_data['filename']}", extra={"timings_ms": page_data["timings_ms"]})
+        return page_data
+
+    def iter_preprocess_folder(self, planned_files: List[Tuple[str, str, str, int]], strict: bool = False) -> Iterator[Dict]:
+        """
+        Lazily preprocess the planned files, yielding page data in deterministic order.
+        Only a small window of pages is alive at any time, so callers that consume pages
+        as they arrive keep memory bounded regardless of folder size.
+        With `strict`, the first failing page raises and pages stream out as they are
+        produced. Otherwise a file with a failing page is logged and skipped as a whole, so
+        each file's pages are held until the file is finished.
+        """
+        self._cache_stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "time_saved_ms": 0.0}
+        start_time = time.perf_counter()
+        pages = 0
+        text_pages = 0
+        payload_bytes = 0
+        enhancement_stages = {"denoise": 0, "deskew": 0, "sharpen": 0}
+        image_pages = 0
+        image_bytes = 0
+        encoded_pages = 0
+        encode_ms = 0.0
+
+        failed_files: Set[str] = set()
+        if self.execution_mode == "process_pool":
+            page_iter = self._iter_folder_in_pool(planned_files, strict, failed_files)
+        elif self.execution_mode == "pipeline":
+            page_iter = self._iter_folder_in_pipeline(planned_files, strict, failed_files)
+        else:
+            page_iter = self._iter_folder_sequential(planned_files, strict, failed_files)
+        if not strict:
+            page_iter = self._iter_complete_files(page_iter, failed_files)
+        for filename, page_data in page_iter:
+            page_data = self._tag_page(filename, page_data)
+            metrics.observe_page(page_data)
+            pages += 1
+            if "text" in page_data:
+                text_pages += 1
+                payload_bytes += len(page_data["text"].encode("utf-8"))
+            else:
+                payload_bytes += len(page_data["base64_data"])
+                image_pages += 1
+                image_bytes += page_data["image_bytes"]
+                if "encode" in page_data["timings_ms"]:
+                    encoded_pages += 1
+                    encode_ms += page_data["timings_ms"]["encode"]
+            for stage in (page_data.get("enhancement") or {}).get("stages", []):
+                enhancement_stages[stage] += 1
+            yield page_data
+
+        self.preprocessing_metadata = {
+            "execution_mode": self.execution_mode,
+            "digital_page_mode": self.digital_page_mode,
+            "enhancement_profile": self.enhancement_profile,
+            "enhancement_stages": enhancement_stages,
+            "files": len(planned_files),
+            "pages": pages,
+            "text_pages": text_pages,
+            "payload_bytes": payload_bytes,
+            "encoding": {
+                "format": settings.DEFAULT_IMAGE_FORMAT,
+                "grayscale": settings.IMAGE_GRAYSCALE_PASSTHROUGH,
+                "max_pixels": settings.IMAGE_MAX_PIXELS,
+                "image_pages": image_pages,
+                "bytes_per_page": round(image_bytes / image_pages) if image_pages else 0,
+                # Pages served from the page cache were not encoded in this request.
+                "encode_ms_per_page": round(encode_ms / encoded_pages, 2) if encoded_pages else None
+            },
+            "latency_ms": round((time.perf_counter() - start_time) * 1000, 2)
+        }
+        if self.execution_mode == "pipeline":
+            self.preprocessing_metadata["pipeline"] = self._pipeline_stats
+        if self.page_cache is not None:
+            self.preprocessing_metadata["page_cache"] = {
+                **self._cache_stats,
+                "time_saved_ms": round(self._cache_stats["time_saved_ms"], 2)
+            }
+
+        logger.info("Preprocessing performance metric", extra={
+            "metric_type": "preprocessing_performance",
+            **self.preprocessing_metadata
+        })
+
+    def preprocess_folder(self, data_folder: str) -> List[Dict]:
+        """Iterate through a folder, preprocess all files, and return image data."""
+        return list(self.iter_preprocess_folder(self.plan_folder(data_folder)))
@@ -0,0 +1,93 @@
+import os
+import mmap
+import hashlib
+import logging
+import mimetypes
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
+
+from ..config import settings
+
+# libmagic and PyMuPDF are imported on first use, so importing the service (e.g. app.main)
+# doesn't load them; the startup warm-up loads them before the first request.
+if TYPE_CHECKING:
+    import pymupdf
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start of a file for type detection. The PDF and image
+# signatures libmagic looks for all sit well within this.
+MIME_SNIFF_BYTES = 8192
+# Read size when hashing without a memory map.
+DIGEST_CHUNK_BYTES = 1024 * 1024
+
+def read_file_header(file_path: str, size: int = MIME_SNIFF_BYTES) -> bytes:
+    """Read the first `size` bytes of a file with a single read."""
+    with open(file_path, "rb", buffering=0) as f:
+        return f.read(size)
+
+def detect_mime_type(file_path: str, header: Optional[bytes] = None) -> str:
+    """
+    Detect a file's MIME type from its header bytes, so libmagic doesn't open and
+    scan the file itself. Falls back to the file extension if libmagic fails.
+    """
+    try:
+        import magic
+
+        if header is None:
+            header = read_file_header(file_path)
+        return magic.from_buffer(header, mime=True)
+    except Exception as e:
+        logger.warning(f"Could not determine MIME type for {file_path} using python-magic: {e}. Falling back to mimetypes.")
+        mime_type, _ = mimetypes.guess_type(file_path)
+        return mime_type or 'application/octet-stream'
+
+def _map_file(file_path: str) -> Optional[mmap.mmap]:
+    """Read-only memory map of a file, or None for empty files (which can't be mapped)."""
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        # The map keeps its own handle, so the file object can be closed right away.
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def open_pdf(file_path: str) -> "pymupdf.Document":
+    """
+    Open a PDF without copying its bytes into a Python `bytes` object: by path, where
+    MuPDF reads objects from the file on demand, or with INGESTION_MMAP_ENABLED over a
+    read-only memory map, where pages are faulted in without read syscalls.
+    """
+    import pymupdf
+
+    if settings.INGESTION_MMAP_ENABLED:
+        mapped = _map_file(file_path)
+        if mapped is not None:
+            # The document holds the view, which keeps the map alive until the document is released.
+            return pymupdf.open(stream=memoryview(mapped), filetype="pdf")
+    return pymupdf.open(file_path, filetype="pdf")
+
+@lru_cache(maxsize=4096)
+def _file_digest(file_path: str, inode: int, size: int, mtime_ns: int) -> str:
+    digest = hashlib.sha256()
+    mapped = _map_file(file_path) if settings.INGESTION_MMAP_ENABLED else None
+    if mapped is not None:
+        with mapped:
+            digest.update(mapped)
+        return digest.hexdigest()
+
+    # Read into one reused buffer instead of allocating a new bytes object per chunk.
+    buffer = bytearray(DIGEST_CHUNK_BYTES)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while read_bytes := f.readinto(buffer):
+            digest.update(view[:read_bytes])
+    return digest.hexdigest()
+
+def file_digest(file_path: str) -> str:
+    """
+    SHA-256 of a file's content, read into a reused buffer (or, with
+    INGESTION_MMAP_ENABLED, hashed straight from a read-only memory map).
+    Digests are memoized per path, inode, size and mtime, so the page cache and result
+    cache keys of one file (within and across requests) cost a single pass over it.
+    """
+    stat = os.stat(file_path)
+    return _file_digest(os.path.abspath(file_path), stat.st_ino, stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,152 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Iterable, Optional
+
+from .ai_provider_interface import AIProviderInterface
+from ..config import settings
+from ..schemas import ClassifiedDocumentsResponse, PageSummariesResponse
+
+logger = logging.getLogger(__name__)
+
+class HedgedAIProvider(AIProviderInterface):
+    """
+    Cuts tail latency by hedging slow calls. If the primary provider hasn't answered
+    after the HEDGE_PERCENTILE of recent call latencies, the same request is sent to the
+    hedge provider (possibly another model or endpoint) and the first response that parses
+    and validates wins; the other call is cancelled (async) or left to finish unused (sync).
+    Extra tokens spent on duplicates are capped at HEDGE_MAX_EXTRA_TOKEN_RATIO of all tokens.
+    Streamed request bodies can't be sent twice, so those calls are never hedged.
+    """
+
+    def __init__(self, primary: AIProviderInterface, hedge: AIProviderInterface):
+        self.primary = primary
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "budget_skips": 0, "total_tokens": 0, "extra_tokens": 0}
+        self._executor = ThreadPoolExecutor(max_workers=settings.HTTP_MAX_CONNECTIONS, thread_name_prefix="ai-hedge")
+
+    def _hedge_delay(self, call_type: str, image_parts: Iterable[Dict]) -> Optional[float]:
+        """Seconds to wait for the primary before hedging, or None if this call must not be hedged."""
+        if not isinstance(image_parts, list):
+            return None
+        with self._lock:
+            samples = self._latencies.get(call_type)
+            if samples is None or len(samples) < settings.HEDGE_MIN_SAMPLES:
+                return None
+            if self._stats["extra_tokens"] > settings.HEDGE_MAX_EXTRA_TOKEN_RATIO * self._stats["total_tokens"]:
+                self._stats["budget_skips"] += 1
+                return None
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * settings.HEDGE_PERCENTILE / 100))
+        return max(settings.HEDGE_MIN_DELAY_SECONDS, ordered[index])
+
+    def _record(self, response, call_type: str, started_at: float, hedge_delay: Optional[float], hedged: bool, winner: str, request_id: str):
+        """Update latency samples and spend, annotate the response and log hedged calls."""
+        latency_seconds = time.perf_counter() - started_at
+        tokens = ((response.processing_metadata or {}).get("token_usage") or {}).get("total_tokens") or 0
+        with self._lock:
+            # When the hedge wins this is a lower bound of the primary's latency.
+            self._latencies.setdefault(call_type, deque(maxlen=settings.HEDGE_LATENCY_WINDOW)).append(latency_seconds)
+            self._stats["calls"] += 1
+            self._stats["total_tokens"] += tokens
+            if hedged:
+                # The losing duplicate is billed for (at least) its prompt; count it like the winner.
+                self._stats["hedged"] += 1
+                self._stats["extra_tokens"] += tokens
+                self._stats["hedge_wins"] += winner == "hedge"
+        if not hedged:
+            return response
+
+        hedge = {"winner": winner, "hedge_delay_ms": round(hedge_delay * 1000, 2)}
+        response.processing_metadata = {**(response.processing_metadata or {}), "hedge": hedge}
+        logger.info("AI hedge metric", extra={
+            "request_id": request_id,
+            "metric_type": "ai_hedge",
+            "call_type": call_type,
+            **hedge,
+            "latency_ms": round(latency_seconds * 1000, 2),
+            **self.stats()
+        })
+        return response
+
+    def _call(self, call_type: str, primary_call: Callable, hedge_call: Callable, image_parts: Iterable[Dict], prompt: str, request_id: str):
+        hedge_delay = self._hedge_delay(call_type, image_parts)
+        started_at = time.perf_counter()
+        if hedge_delay is None:
+            response = primary_call(image_parts, prompt, request_id)
+            return self._record(response, call_type, started_at, None, False, "primary", request_id)
+
+        futures = {self._executor.submit(primary_call, image_parts, prompt, request_id): "primary"}
+        done, _ = wait(futures, timeout=hedge_delay)
+        if not done:
+            logger.info(f"Primary AI call exceeded {hedge_delay:.1f}s; sending a hedged request.", extra={"request_id": request_id})
+            futures[self._executor.submit(hedge_call, image_parts, prompt, request_id)] = "hedge"
+
+        pending, errors = set(futures), []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return self._record(future.result(), call_type, started_at, hedge_delay, len(futures) > 1, futures[future], request_id)
+                errors.append(future.exception())
+        raise errors[0]
+
+    async def _acall(self, call_type: str, primary_call: Callable, hedge_call: Callable, image_parts: Iterable[Dict], prompt: str, request_id: str):
+        hedge_delay = self._hedge_delay(call_type, image_parts)
+        started_at = time.perf_counter()
+        if hedge_delay is None:
+            response = await primary_call(image_parts, prompt, request_id)
+            return self._record(response, call_type, started_at, None, False, "primary", request_id)
+
+        tasks = {asyncio.create_task(primary_call(image_parts, prompt, request_id)): "primary"}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                logger.info(f"Primary AI call exceeded {hedge_delay:.1f}s; sending a hedged request.", extra={"request_id": request_id})
+                tasks[asyncio.create_task(hedge_call(image_parts, prompt, request_id))] = "hedge"
+
+            pending, errors = set(tasks), []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return self._record(task.result(), call_type, started_at, hedge_delay, len(tasks) > 1, tasks[task], request_id)
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            # Cancel the slower call (or both, if this coroutine itself was cancelled), and wait
+            # for the cancellation to land so the loser has freed its admission slot on return.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Cumulative hedge counts and the share of tokens spent on duplicates."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hedge_rate"] = round(stats["hedged"] / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["extra_token_ratio"] = round(stats["extra_tokens"] / stats["total_tokens"], 4) if stats["total_tokens"] else 0.0
+        return stats
+
+    def cluster_classify_and_sequence(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> ClassifiedDocumentsResponse:
+        return self._call("cluster_classify_and_sequence", self.primary.cluster_classify_and_sequence, self.hedge.cluster_classify_and_sequence, image_parts, prompt, request_id)
+
+    async def acluster_classify_and_sequence(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> ClassifiedDocumentsResponse:
+        return await self._acall("cluster_classify_and_sequence", self.primary.acluster_classify_and_sequence, self.hedge.acluster_classify_and_sequence, image_parts, prompt, request_id)
+
+    def summarize_pages(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> PageSummariesResponse:
+        return self._call("page_summaries", self.primary.summarize_pages, self.hedge.summarize_pages, image_parts, prompt, request_id)
+
+    async def asummarize_pages(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> PageSummariesResponse:
+        return await self._acall("page_summaries", self.primary.asummarize_pages, self.hedge.asummarize_pages, image_parts, prompt, request_id)
+
+    async def aclose(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        await self.primary.aclose()
+        if self.hedge is not self.primary:
+            await self.hedge.aclose()
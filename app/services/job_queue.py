@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import uuid
+from typing import Callable, Dict, List, Optional, Set
+
+from .ai_provider_interface import AIProviderInterface, AIProviderOverloadedError, AIProviderRateLimitError
+from .job_store import JobStoreInterface
+from .workflow_service import WorkflowService
+from ..config import settings
+from ..schemas import JobStatusResponse, ProcessFolderRequest
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+    pass
+
+class JobQueue:
+    """
+    Bounded in-process queue of folder-processing jobs, drained by a fixed number of
+    asyncio workers. Job state lives in the job store, so status and results can be read
+    from any worker process and queued jobs survive a restart: jobs running when the
+    queue stops are requeued, and running jobs whose heartbeat went stale (their process
+    died without stopping) are failed by a periodic sweep.
+    """
+
+    def __init__(self, job_store: JobStoreInterface, ai_provider: AIProviderInterface):
+        self.job_store = job_store
+        self.ai_provider = ai_provider
+        self.concurrency = settings.JOB_CONCURRENCY
+        self.max_size = settings.JOB_QUEUE_MAX_SIZE
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._running: Set[str] = set()
+
+    async def start(self) -> None:
+        """Re-enqueue jobs left over from a previous run and start the workers."""
+        loop = asyncio.get_running_loop()
+        queued_job_ids = await loop.run_in_executor(None, self.job_store.recover, settings.JOB_STALE_AFTER_SECONDS)
+        for job_id in queued_job_ids:
+            self._queue.put_nowait(job_id)
+        self._workers = [asyncio.create_task(self._worker(worker_index)) for worker_index in range(self.concurrency)]
+        self._sweeper = asyncio.create_task(self._sweep_stale_jobs())
+        logger.info(f"Job queue started with {self.concurrency} workers and {len(queued_job_ids)} recovered jobs.")
+
+    async def stop(self) -> None:
+        """Cancel the workers and requeue the jobs they were running, so the next start runs them again."""
+        tasks = self._workers + ([self._sweeper] if self._sweeper is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._sweeper = None
+        interrupted = list(self._running)
+        self._running.clear()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.job_store.requeue, interrupted)
+        logger.info(f"Job queue stopped; {len(interrupted)} running jobs requeued.")
+
+    async def submit(self, request: ProcessFolderRequest) -> JobStatusResponse:
+        """Persist a new job and enqueue it, or raise JobQueueFullError when the queue is at capacity."""
+        if self._queue.qsize() >= self.max_size:
+            raise JobQueueFullError(f"The job queue is full ({self.max_size} jobs waiting).")
+        job_id = str(uuid.uuid4())
+        loop = asyncio.get_running_loop()
+        job = await loop.run_in_executor(None, self.job_store.create, job_id, request)
+        self._queue.put_nowait(job_id)
+        logger.info("Job queued.", extra={'job_id': job_id, 'folder_path': request.folder_path, 'queued_jobs': self._queue.qsize()})
+        return job
+
+    async def _worker(self, worker_index: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception:
+                logger.critical("Job worker failed to record a job outcome.", extra={'job_id': job_id, 'worker': worker_index}, exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        loop = asyncio.get_running_loop()
+        log_extra = {'request_id': job_id, 'job_id': job_id}
+
+        if not await loop.run_in_executor(None, self.job_store.claim, job_id):
+            logger.info("Job already claimed by another worker; skipping.", extra=log_extra)
+            return
+        # A job cancelled by `stop` stays listed, so that `stop` can requeue it.
+        self._running.add(job_id)
+        try:
+            await self._run_claimed_job(job_id)
+        except Exception:
+            self._running.discard(job_id)
+            raise
+        self._running.discard(job_id)
+
+    async def _run_claimed_job(self, job_id: str) -> None:
+        loop = asyncio.get_running_loop()
+        log_extra = {'request_id': job_id, 'job_id': job_id}
+        request = await loop.run_in_executor(None, self.job_store.get_request, job_id)
+
+        # The workflow reports progress from executor threads; the latest snapshot is
+        # persisted periodically by a flusher task, so reporting never blocks on the store.
+        latest_progress: Dict = {}
+
+        def on_progress(progress: Dict) -> None:
+            nonlocal latest_progress
+            latest_progress = progress
+
+        flusher = asyncio.create_task(self._flush_progress(job_id, lambda: latest_progress))
+        workflow = WorkflowService(self.ai_provider, progress_callback=on_progress)
+        error: Optional[str] = None
+        try:
+            logger.info("Job started.", extra=log_extra)
+            result = await workflow.aprocess_folder(request, request_id=job_id)
+        except FileNotFoundError as e:
+            logger.error("File or folder not found during job processing", extra=log_extra, exc_info=True)
+            error = f"The specified path was not found: {e}"
+        except (AIProviderRateLimitError, AIProviderOverloadedError) as e:
+            logger.warning("AI call rejected during job processing.", extra=log_extra)
+            error = str(e)
+        except Exception:
+            logger.critical("An unhandled exception occurred during job processing.", extra=log_extra, exc_info=True)
+            error = f"An internal server error occurred. Please check logs for Request ID: {job_id}"
+        finally:
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+
+        if error is not None:
+            await loop.run_in_executor(None, self.job_store.fail, job_id, error, latest_progress)
+            return
+        await loop.run_in_executor(None, self.job_store.complete, job_id, result, {**latest_progress, "stage": "done"})
+        logger.info("Job succeeded.", extra=log_extra)
+
+    async def _sweep_stale_jobs(self) -> None:
+        """Fail running jobs without a heartbeat for JOB_STALE_AFTER_SECONDS, every JOB_STALE_SWEEP_INTERVAL_SECONDS until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(settings.JOB_STALE_SWEEP_INTERVAL_SECONDS)
+            try:
+                await loop.run_in_executor(None, self.job_store.fail_stale, settings.JOB_STALE_AFTER_SECONDS)
+            except Exception:
+                logger.warning("Failed to sweep stale jobs.", exc_info=True)
+
+    async def _flush_progress(self, job_id: str, get_progress: Callable[[], Dict]) -> None:
+        """Persist the latest progress every JOB_PROGRESS_INTERVAL_SECONDS until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(settings.JOB_PROGRESS_INTERVAL_SECONDS)
+            # Writing unchanged progress still refreshes updated_at, which is the job's heartbeat.
+            try:
+                await loop.run_in_executor(None, self.job_store.update_progress, job_id, get_progress())
+            except Exception:
+                logger.warning("Failed to persist job progress.", extra={'job_id': job_id}, exc_info=True)
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from abc import ABC, abstractmethod
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from ..schemas import ClassifiedDocumentsResponse, JobStatusResponse, ProcessFolderRequest
+
+logger = logging.getLogger(__name__)
+
+class JobStoreInterface(ABC):
+    """
+    Abstract base class for persistent job stores.
+    A job moves from 'queued' to 'running' to either 'succeeded' or 'failed'.
+    """
+    @abstractmethod
+    def create(self, job_id: str, request: ProcessFolderRequest) -> JobStatusResponse:
+        """Persist a new queued job."""
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[JobStatusResponse]:
+        """Return the job's status and progress, or None for an unknown job."""
+        pass
+
+    @abstractmethod
+    def get_request(self, job_id: str) -> Optional[ProcessFolderRequest]:
+        """Return the request the job was submitted with."""
+        pass
+
+    @abstractmethod
+    def get_result(self, job_id: str) -> Optional[ClassifiedDocumentsResponse]:
+        """Return the classification of a succeeded job."""
+        pass
+
+    @abstractmethod
+    def claim(self, job_id: str) -> bool:
+        """Atomically move a queued job to 'running'. Returns False if another worker got it first."""
+        pass
+
+    @abstractmethod
+    def update_progress(self, job_id: str, progress: Dict) -> None:
+        """Replace the progress of a running job; also serves as its heartbeat."""
+        pass
+
+    @abstractmethod
+    def complete(self, job_id: str, result: ClassifiedDocumentsResponse, progress: Dict) -> None:
+        """Mark a job as succeeded and store its result."""
+        pass
+
+    @abstractmethod
+    def fail(self, job_id: str, error: str, progress: Optional[Dict] = None) -> None:
+        """Mark a job as failed."""
+        pass
+
+    @abstractmethod
+    def requeue(self, job_ids: List[str]) -> int:
+        """Move running jobs back to 'queued', e.g. when the service stops while running them. Returns how many were moved."""
+        pass
+
+    @abstractmethod
+    def fail_stale(self, stale_after_seconds: float) -> int:
+        """Fail jobs that were running without a heartbeat for `stale_after_seconds`. Returns how many were failed."""
+        pass
+
+    @abstractmethod
+    def recover(self, stale_after_seconds: float) -> List[str]:
+        """
+        Prepare the store after a restart: fail stale running jobs (see `fail_stale`), and
+        return the ids of queued jobs, oldest first.
+        """
+        pass
+
+class SQLiteJobStore(JobStoreInterface):
+    """
+    Local job store backed by a SQLite file.
+    Follows the result cache: a short-lived connection per operation and WAL mode,
+    so the store can be shared across threads and worker processes.
+    """
+
+    def __init__(self, db_path: str, retention_seconds: Optional[int] = None):
+        self.db_path = db_path
+        self.retention_seconds = retention_seconds
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " job_id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " request_json TEXT NOT NULL,"
+                " progress_json TEXT NOT NULL DEFAULT '{}',"
+                " result_json TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _to_status(self, row: tuple) -> JobStatusResponse:
+        job_id, status, progress_json, error, created_at, updated_at, started_at, finished_at = row
+
+        def to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+            return datetime.fromtimestamp(timestamp, tz=timezone.utc) if timestamp is not None else None
+
+        return JobStatusResponse(
+            job_id=job_id,
+            status=status,
+            progress=json.loads(progress_json),
+            error=error,
+            created_at=to_datetime(created_at),
+            updated_at=to_datetime(updated_at),
+            started_at=to_datetime(started_at),
+            finished_at=to_datetime(finished_at)
+        )
+
+    def create(self, job_id: str, request: ProcessFolderRequest) -> JobStatusResponse:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, request_json, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, request.model_dump_json(), now, now)
+            )
+            # Opportunistically drop old finished jobs so the file doesn't grow without bound.
+            if self.retention_seconds:
+                conn.execute(
+                    "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at <= ?",
+                    (now - self.retention_seconds,)
+                )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[JobStatusResponse]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT job_id, status, progress_json, error, created_at, updated_at, started_at, finished_at"
+                " FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        return self._to_status(row) if row is not None else None
+
+    def get_request(self, job_id: str) -> Optional[ProcessFolderRequest]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT request_json FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return ProcessFolderRequest.model_validate_json(row[0]) if row is not None else None
+
+    def get_result(self, job_id: str) -> Optional[ClassifiedDocumentsResponse]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT result_json FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return ClassifiedDocumentsResponse.model_validate_json(row[0])
+
+    def claim(self, job_id: str) -> bool:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, updated_at = ? WHERE job_id = ? AND status = 'queued'",
+                (now, now, job_id)
+            )
+        return cursor.rowcount > 0
+
+    def update_progress(self, job_id: str, progress: Dict) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET progress_json = ?, updated_at = ? WHERE job_id = ? AND status = 'running'",
+                (json.dumps(progress), time.time(), job_id)
+            )
+
+    def complete(self, job_id: str, result: ClassifiedDocumentsResponse, progress: Dict) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result_json = ?, progress_json = ?, updated_at = ?, finished_at = ?"
+                " WHERE job_id = ?",
+                (result.model_dump_json(), json.dumps(progress), now, now, job_id)
+            )
+
+    def fail(self, job_id: str, error: str, progress: Optional[Dict] = None) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, progress_json = COALESCE(?, progress_json),"
+                " updated_at = ?, finished_at = ? WHERE job_id = ?",
+                (error, json.dumps(progress) if progress is not None else None, now, now, job_id)
+            )
+
+    def requeue(self, job_ids: List[str]) -> int:
+        if not job_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in job_ids)
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', progress_json = '{}', started_at = NULL, updated_at = ?"
+                f" WHERE status = 'running' AND job_id IN ({placeholders})",
+                (time.time(), *job_ids)
+            )
+        if cursor.rowcount:
+            logger.warning(f"Requeued {cursor.rowcount} interrupted jobs.")
+        return cursor.rowcount
+
+    def fail_stale(self, stale_after_seconds: float) -> int:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ?"
+                " WHERE status = 'running' AND updated_at <= ?",
+                ("The job stopped reporting progress, most likely because its worker crashed. Please resubmit it.", now, now, now - stale_after_seconds)
+            )
+        if cursor.rowcount:
+            logger.warning(f"Marked {cursor.rowcount} stale jobs as failed.")
+        return cursor.rowcount
+
+    def recover(self, stale_after_seconds: float) -> List[str]:
+        self.fail_stale(stale_after_seconds)
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row[0] for row in rows]
@@ -0,0 +1,207 @@
+import json
+import time
+import zlib
+import random
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .ai_provider_interface import AIProviderInterface
+from .rate_limited_provider import estimate_image_tokens, estimate_text_tokens
+from .. import metrics
+from ..config import settings
+from ..schemas import ClassifiedDocumentsResponse, DocumentPageSummaries, NonExtractedDocuments, PageSummariesResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "lognormal")
+
+MOCK_DOCUMENT_TYPES = ("COMMERCIAL_INVOICE", "PACKING_LIST", "BILL_OF_LADING", "CERTIFICATE_OF_ORIGIN", "INSURANCE_CERTIFICATE")
+
+def manifest_filenames(parts: Iterable[Dict]) -> List[str]:
+    """Page filenames listed in the image or page manifest among the input parts."""
+    for part in parts:
+        text = part.get("text", "") if part.get("type") == "text" else ""
+        for tag in ("image_manifest", "page_manifest"):
+            if text.startswith(f"<{tag}>") and text.endswith(f"</{tag}>"):
+                manifest = json.loads(text[len(tag) + 2:-(len(tag) + 3)])
+                return [entry["document_page_image_filename"] for entry in manifest]
+    return []
+
+class MockModel:
+    """
+    Stands in for the model behind the AI provider, for load tests without a model
+    endpoint. Draws call latencies from MOCK_AI_LATENCY_DISTRIBUTION, fails calls with
+    500s and 429s at the configured rates, and answers with schema-valid content in
+    which every source file's pages form one document, in manifest order.
+    Shared by MockAIProvider and the stub server in app.mock_server.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.distribution = settings.MOCK_AI_LATENCY_DISTRIBUTION.lower()
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unsupported mock latency distribution: {self.distribution}. Expected one of {LATENCY_DISTRIBUTIONS}.")
+        self._random = random.Random(settings.MOCK_AI_SEED if seed is None else seed)
+
+    def latency(self, pages: int) -> float:
+        """Seconds a call with this many pages takes."""
+        base = settings.MOCK_AI_LATENCY_SECONDS
+        if self.distribution == "uniform":
+            base = self._random.uniform(base - settings.MOCK_AI_LATENCY_SPREAD, base + settings.MOCK_AI_LATENCY_SPREAD)
+        elif self.distribution == "lognormal":
+            base *= self._random.lognormvariate(0.0, settings.MOCK_AI_LATENCY_SPREAD)
+        return max(0.0, base + pages * settings.MOCK_AI_LATENCY_PER_PAGE_SECONDS)
+
+    def failure(self) -> Optional[int]:
+        """The status code a call fails with (429 or 500), or None if it succeeds."""
+        draw = self._random.random()
+        if draw < settings.MOCK_AI_RATE_LIMIT_RATE:
+            return 429
+        if draw < settings.MOCK_AI_RATE_LIMIT_RATE + settings.MOCK_AI_ERROR_RATE:
+            return 500
+        return None
+
+    def plan(self, pages: int) -> Tuple[float, Optional[int]]:
+        """Seconds until the call returns and the status it fails with, if any. Rate-limited calls are rejected at once."""
+        failure = self.failure()
+        return (0.0 if failure == 429 else self.latency(pages)), failure
+
+    def classify(self, filenames: List[str]) -> Dict:
+        """NonExtractedDocuments content: one document per source file."""
+        documents: Dict[str, List[str]] = {}
+        for filename in filenames:
+            documents.setdefault(filename.rsplit("_page_", 1)[0], []).append(filename)
+        content = {
+            "documents": [
+                {
+                    "document_id": f"doc-{index + 1}",
+                    "document_type": MOCK_DOCUMENT_TYPES[zlib.crc32(source.encode("utf-8")) % len(MOCK_DOCUMENT_TYPES)],
+                    "document_summary": f"Mock document made of the {len(pages)} page(s) of {source}.",
+                    "pages": pages
+                }
+                for index, (source, pages) in enumerate(documents.items())
+            ]
+        }
+        return NonExtractedDocuments.model_validate(content).model_dump(exclude_none=True)
+
+    def summarize(self, filenames: List[str]) -> Dict:
+        """DocumentPageSummaries content: one summary per page."""
+        content = {
+            "document_page_summaries": [
+                {
+                    "filename": filename,
+                    "document_analysis": {
+                        "document_types_guess": [MOCK_DOCUMENT_TYPES[zlib.crc32(filename.rsplit("_page_", 1)[0].encode("utf-8")) % len(MOCK_DOCUMENT_TYPES)]],
+                        "overall_summary": f"Mock summary of {filename}.",
+                        "language": "en"
+                    }
+                }
+                for filename in filenames
+            ]
+        }
+        return DocumentPageSummaries.model_validate(content).model_dump(exclude_none=True)
+
+    def token_usage(self, parts: List[Dict], content: Dict) -> Dict:
+        """Estimated tokens for the input parts (prompt included) and the generated content."""
+        prompt_tokens = 0
+        for part in parts:
+            if part.get("type") == "text":
+                prompt_tokens += estimate_text_tokens(part.get("text", ""))
+            else:
+                image_url = part.get("image_url", "")
+                # The service sends the data URL itself; the OpenAI format wraps it in {"url": ...}.
+                prompt_tokens += estimate_image_tokens(image_url["url"] if isinstance(image_url, dict) else image_url)
+        completion_tokens = estimate_text_tokens(json.dumps(content))
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+class MockAIProvider(AIProviderInterface):
+    """
+    AI provider answering from a MockModel instead of a model endpoint (AI_PROVIDER=mock).
+    Input parts are consumed like a real provider consumes them, and failures are raised
+    as the same openai status errors a real endpoint produces, so admission control,
+    retries and hedging behave as they would in production.
+    """
+
+    def __init__(self, model_name: Optional[str] = None, model: Optional[MockModel] = None):
+        self.model_name = model_name or settings.MODEL_NAME
+        self.model = model or MockModel()
+        logger.info(f"Mock AI provider initialized for model {self.model_name}; no model endpoint will be called.")
+
+    def _status_error(self, status_code: int) -> Exception:
+        # The SDK is only needed for simulated failures, so it isn't loaded unless they are enabled.
+        import httpx
+        import openai
+
+        headers = {}
+        if status_code == 429 and settings.MOCK_AI_RETRY_AFTER_SECONDS is not None:
+            headers["retry-after"] = str(settings.MOCK_AI_RETRY_AFTER_SECONDS)
+        response = httpx.Response(status_code, headers=headers, request=httpx.Request("POST", "http://mock-ai-provider/chat/completions"))
+        error_class = openai.RateLimitError if status_code == 429 else openai.InternalServerError
+        return error_class(f"Simulated {status_code} from the mock AI provider.", response=response, body=None)
+
+    def _start_call(self, image_parts: List[Dict], prompt: str) -> Tuple[List[Dict], List[str], float, Optional[int]]:
+        parts = [{"type": "text", "text": prompt}] + image_parts
+        filenames = manifest_filenames(parts)
+        delay, failure = self.model.plan(len(filenames))
+        return parts, filenames, delay, failure
+
+    def _finish_call(self, call_type: str, parts: List[Dict], filenames: List[str], failure: Optional[int], start_time: float, request_id: str) -> Tuple[Dict, Dict]:
+        """Raise the simulated failure, or return the generated content and the call's metadata."""
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        if failure is not None:
+            metrics.observe_ai_call_error(call_type, self.model_name)
+            raise self._status_error(failure)
+
+        content = self.model.summarize(filenames) if call_type == "page_summaries" else self.model.classify(filenames)
+        token_usage = self.model.token_usage(parts, content)
+        metrics.observe_ai_call(call_type, self.model_name, latency_ms / 1000, token_usage)
+        logger.info("AI call performance metric", extra={
+            "request_id": request_id,
+            "metric_type": "ai_call_performance",
+            "call_type": call_type,
+            "model_name": self.model_name,
+            "latency_ms": round(latency_ms, 2),
+            "token_usage": token_usage,
+            "mock": True
+        })
+        return content, {"ai_call_latency_ms": latency_ms, "token_usage": token_usage}
+
+    async def _aconsume(self, image_parts: Iterable[Dict]) -> List[Dict]:
+        # Producing a part may preprocess a page (streamed request bodies), so drain them off the event loop.
+        if isinstance(image_parts, list):
+            return image_parts
+        return await asyncio.get_running_loop().run_in_executor(None, list, image_parts)
+
+    def _classified_response(self, content: Dict, metadata: Dict, request_id: str) -> ClassifiedDocumentsResponse:
+        return ClassifiedDocumentsResponse(request_id=request_id, documents=content["documents"], processing_metadata=metadata)
+
+    def _page_summaries_response(self, content: Dict, metadata: Dict, request_id: str) -> PageSummariesResponse:
+        return PageSummariesResponse(request_id=request_id, page_summaries=content["document_page_summaries"], processing_metadata=metadata)
+
+    def cluster_classify_and_sequence(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> ClassifiedDocumentsResponse:
+        parts, filenames, delay, failure = self._start_call(list(image_parts), prompt)
+        start_time = time.perf_counter()
+        time.sleep(delay)
+        content, metadata = self._finish_call("cluster_classify_and_sequence", parts, filenames, failure, start_time, request_id)
+        return self._classified_response(content, metadata, request_id)
+
+    async def acluster_classify_and_sequence(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> ClassifiedDocumentsResponse:
+        parts, filenames, delay, failure = self._start_call(await self._aconsume(image_parts), prompt)
+        start_time = time.perf_counter()
+        await asyncio.sleep(delay)
+        content, metadata = self._finish_call("cluster_classify_and_sequence", parts, filenames, failure, start_time, request_id)
+        return self._classified_response(content, metadata, request_id)
+
+    def summarize_pages(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> PageSummariesResponse:
+        parts, filenames, delay, failure = self._start_call(list(image_parts), prompt)
+        start_time = time.perf_counter()
+        time.sleep(delay)
+        content, metadata = self._finish_call("page_summaries", parts, filenames, failure, start_time, request_id)
+        return self._page_summaries_response(content, metadata, request_id)
+
+    async def asummarize_pages(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> PageSummariesResponse:
+        parts, filenames, delay, failure = self._start_call(await self._aconsume(image_parts), prompt)
+        start_time = time.perf_counter()
+        await asyncio.sleep(delay)
+        content, metadata = self._finish_call("page_summaries", parts, filenames, failure, start_time, request_id)
+        return self._page_summaries_response(content, metadata, request_id)
@@ -2,84 +2,432 @@ import httpx
 import openai
 import json
 import time
+import random
+import asyncio
 import logging
-from typing import List, Dict
+import itertools
+from openai.types.chat import ChatCompletion
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Dict, Optional, Type, Union
 
 from .ai_provider_interface import AIProviderInterface
+from .rate_limited_provider import retry_after_seconds
+from .. import metrics
 from ..config import settings
-from ..schemas import ClassifiedDocumentsResponse, NonExtractedDocuments
+from ..schemas import ClassifiedDocumentsResponse, DocumentPageSummaries, NonExtractedDocuments, PageSummariesResponse
 
 logger = logging.getLogger(__name__)
 
+def _connection_pool_stats(http_client: Union[httpx.Client, httpx.AsyncClient]) -> Dict:
+    """
+    Snapshot of the underlying httpcore connection pool.
+    httpx does not expose pool metrics publicly, so this reads the pool defensively
+    and returns an empty dict if its internals ever change.
+    """
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    if pool is None:
+        return {}
+    try:
+        connections_idle = [connection.is_idle() for connection in pool.connections]
+        requests_queued = [request.is_queued() for request in getattr(pool, "_requests", [])]
+    except Exception:
+        return {}
+    return {
+        "connections_active": connections_idle.count(False),
+        "connections_idle": connections_idle.count(True),
+        "requests_active": requests_queued.count(False),
+        "requests_waiting": requests_queued.count(True)
+    }
+
+# Retry policy the SDK applies to its own requests (its defaults), applied to streamed
+# request bodies, which are sent with the HTTP client directly.
+RETRY_INITIAL_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 8.0
+RETRY_AFTER_MAX_SECONDS = 60.0
+
+def _strict_json_schema(schema: Any) -> Any:
+    """
+    Make a Pydantic JSON schema valid for strict structured outputs, as the SDK does for
+    `parse`: every object lists all its properties as required and allows no others, and
+    `null` defaults are dropped.
+    """
+    if isinstance(schema, list):
+        return [_strict_json_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    strict = {key: _strict_json_schema(value) for key, value in schema.items() if not (key == "default" and value is None)}
+    if strict.get("type") == "object":
+        strict.setdefault("additionalProperties", False)
+        if isinstance(strict.get("properties"), dict):
+            strict["required"] = list(strict["properties"])
+    return strict
+
+def json_schema_response_format(model: Type[BaseModel]) -> Dict:
+    """The `response_format` request parameter asking for output that matches `model`."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"schema": _strict_json_schema(model.model_json_schema()), "name": model.__name__, "strict": True}
+    }
+
 class OpenAIProvider(AIProviderInterface):
-    """Concrete implementation of the AI provider for OpenAI-compatible APIs."""
+    """
+    Concrete implementation of the AI provider for OpenAI-compatible APIs.
+    A single instance is meant to be shared process-wide so that its HTTP
+    connection pools (and their keep-alive HTTP/2 connections) are reused across requests.
+    """
     
-    def __init__(self):
-        http_client = httpx.Client(http2=True, verify=False)
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_url: Optional[str] = None,
+        model_name: Optional[str] = None,
+        api_key: Optional[str] = None
+    ):
+        self.base_url = base_url or settings.OPENAI_BASE_URL
+        self.model_name = model_name or settings.MODEL_NAME
+        self.api_key = api_key or settings.OPENAI_API_KEY
+        self.max_retries = max_retries
+        if not self.base_url or not self.api_key:
+            raise ValueError("OPENAI_BASE_URL and OPENAI_API_KEY must be set to use the OpenAI provider.")
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+        )
+        timeout = httpx.Timeout(
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            read=settings.HTTP_READ_TIMEOUT,
+            write=settings.HTTP_WRITE_TIMEOUT,
+            pool=settings.HTTP_POOL_TIMEOUT
+        )
+        self.http_client = httpx.Client(http2=settings.HTTP2_ENABLED, verify=False, limits=limits, timeout=timeout)
+        self.async_http_client = httpx.AsyncClient(http2=settings.HTTP2_ENABLED, verify=False, limits=limits, timeout=timeout)
         try:
             self.client = openai.OpenAI(
-                api_key=settings.OPENAI_API_KEY,
-                base_url=settings.OPENAI_BASE_URL,
-                http_client=http_client
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self.http_client,
+                timeout=timeout,
+                max_retries=max_retries
             )
-            logger.info("OpenAI client initialized successfully.")
+            self.async_client = openai.AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self.async_http_client,
+                timeout=timeout,
+                max_retries=max_retries
+            )
+            logger.info(f"OpenAI client initialized successfully for model {self.model_name}.")
         except Exception as e:
             logger.error("Failed to initialize OpenAI client", exc_info=True)
             raise
 
+    async def aclose(self) -> None:
+        """Close both connection pools."""
+        await self.async_client.close()
+        self.client.close()
+        logger.info("OpenAI client connection pools closed.")
+
+    def _build_messages(self, image_parts: Iterable[Dict], prompt: str) -> List[Dict]:
+        """Prepend the prompt to the input parts as a single user message."""
+        prompt_part = [{"type": "text", "text": prompt}]
+        combined_parts = prompt_part + list(image_parts)
+        return [{"role": "user", "content": combined_parts}]
+
+    def _iter_request_body(self, image_parts: Iterable[Dict], prompt: str) -> Iterator[bytes]:
+        """
+        Serialize the chat completion request incrementally, one content part at a time,
+        so pages are encoded into the body as they arrive and released right after.
+        """
+        placeholder = "__CONTENT_PARTS__"
+        payload = {
+            **self._completion_params(),
+            "response_format": json_schema_response_format(NonExtractedDocuments),
+            "messages": [{"role": "user", "content": [placeholder]}]
+        }
+        body_prefix, body_suffix = json.dumps(payload).split(json.dumps(placeholder))
+
+        yield (body_prefix + json.dumps({"type": "text", "text": prompt})).encode("utf-8")
+        for part in image_parts:
+            yield ("," + json.dumps(part)).encode("utf-8")
+        yield body_suffix.encode("utf-8")
+
+    def _streaming_request_headers(self) -> Dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+
+    def _parse_streaming_response(self, response: httpx.Response) -> ChatCompletion:
+        """Turn the raw HTTP response of a streamed request into the SDK's ChatCompletion, raising SDK errors on failure."""
+        if response.is_error:
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            error_class = openai.RateLimitError if response.status_code == 429 else openai.APIStatusError
+            raise error_class(f"Error code: {response.status_code} - {body}", response=response, body=body)
+        return ChatCompletion.model_validate(response.json())
+
+    def _iter_recorded(self, chunks: Iterator[bytes], sent: List[bytes]) -> Iterator[bytes]:
+        """Pass body chunks through, keeping them so the request can be replayed on a retry."""
+        for chunk in chunks:
+            sent.append(chunk)
+            yield chunk
+
+    def _streaming_retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before resending a failed streamed request, or None if it must not
+        be retried: the SDK's policy for connection errors, timeouts, 408, 409, 429 and 5xx.
+        """
+        if attempt >= self.max_retries:
+            return None
+        response = getattr(error, "response", None)
+        if response is not None:
+            should_retry = response.headers.get("x-should-retry")
+            if should_retry == "false" or (should_retry != "true" and response.status_code not in (408, 409, 429) and response.status_code < 500):
+                return None
+        elif not isinstance(error, openai.APIConnectionError):
+            return None
+
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None and 0 < retry_after <= RETRY_AFTER_MAX_SECONDS:
+            return retry_after
+        return min(RETRY_INITIAL_DELAY_SECONDS * 2 ** attempt, RETRY_MAX_DELAY_SECONDS) * (1 - 0.25 * random.random())
+
+    def _connection_error(self, error: httpx.TransportError) -> openai.APIConnectionError:
+        """The SDK error for a transport failure, as the SDK itself would raise it."""
+        if isinstance(error, httpx.TimeoutException):
+            return openai.APITimeoutError(request=error.request)
+        return openai.APIConnectionError(request=error.request)
+
+    def _log_streaming_retry(self, error: Exception, attempt: int, delay: float) -> None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+        logger.warning(f"Streamed AI request failed ({status_code or type(error).__name__}); resending it in {delay:.1f}s (retry {attempt + 1} of {self.max_retries}).")
+
+    def _post_streaming_body(self, image_parts: Iterable[Dict], prompt: str) -> ChatCompletion:
+        sent: List[bytes] = []
+        body_chunks = self._iter_recorded(self._iter_request_body(image_parts, prompt), sent)
+        content: Iterable[bytes] = body_chunks
+        attempt = 0
+        while True:
+            try:
+                try:
+                    response = self.http_client.post(
+                        str(self.client.base_url.join("chat/completions")),
+                        content=content,
+                        headers=self._streaming_request_headers()
+                    )
+                except httpx.TransportError as e:
+                    raise self._connection_error(e) from e
+                return self._parse_streaming_response(response)
+            except openai.APIError as e:
+                delay = self._streaming_retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                self._log_streaming_retry(e, attempt, delay)
+                time.sleep(delay)
+                # Resend what was already produced, then whatever the first attempt didn't get to.
+                content = itertools.chain(list(sent), body_chunks)
+                attempt += 1
+
+    async def _apost_streaming_body(self, image_parts: Iterable[Dict], prompt: str) -> ChatCompletion:
+        loop = asyncio.get_running_loop()
+        sent: List[bytes] = []
+        body_chunks = self._iter_recorded(self._iter_request_body(image_parts, prompt), sent)
+
+        async def iter_body(replay: List[bytes]) -> AsyncIterator[bytes]:
+            for chunk in replay:
+                yield chunk
+            # Producing a chunk may preprocess a page, so pull chunks off the event loop.
+            while True:
+                chunk = await loop.run_in_executor(None, next, body_chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+
+        attempt = 0
+        replay: List[bytes] = []
+        while True:
+            try:
+                try:
+                    response = await self.async_http_client.post(
+                        str(self.async_client.base_url.join("chat/completions")),
+                        content=iter_body(replay),
+                        headers=self._streaming_request_headers()
+                    )
+                except httpx.TransportError as e:
+                    raise self._connection_error(e) from e
+                return self._parse_streaming_response(response)
+            except openai.APIError as e:
+                delay = self._streaming_retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                self._log_streaming_retry(e, attempt, delay)
+                await asyncio.sleep(delay)
+                replay = list(sent)
+                attempt += 1
+
+    def _completion_params(self, response_format: type = NonExtractedDocuments) -> Dict:
+        """Model and generation parameters shared by the sync and async calls."""
+        return {
+            "model": self.model_name,
+            "temperature": settings.TEMPERATURE,
+            "top_p": settings.TOP_P,
+            "response_format": response_format,
+            "reasoning_effort": settings.REASONING_EFFORT,
+            "max_completion_tokens": settings.MAX_COMPLETION_TOKENS
+        }
+
     def cluster_classify_and_sequence(
         self,
-        image_parts: List[Dict],
+        image_parts: Iterable[Dict],
         prompt: str,
         request_id: str
     ) -> ClassifiedDocumentsResponse:
         """Calls the OpenAI-compatible API and logs detailed metrics."""
         
         log_extra = {"request_id": request_id}
-        prompt_part = [{"type": "text", "text": prompt}]
-        combined_parts = prompt_part + image_parts
-        
-        messages = [{"role": "user", "content": combined_parts}]
 
+        pool_stats = _connection_pool_stats(self.http_client)
         start_time = time.perf_counter()
         
         try:
-            response = self.client.beta.chat.completions.parse(
-                model=settings.MODEL_NAME,
-                messages=messages,
-                temperature=settings.TEMPERATURE,
-                top_p=settings.TOP_P,
-                response_format=NonExtractedDocuments,
-                reasoning_effort=settings.REASONING_EFFORT,
-                max_completion_tokens=settings.MAX_COMPLETION_TOKENS
-            )
+            if settings.STREAM_REQUEST_BODY:
+                response = self._post_streaming_body(image_parts, prompt)
+            else:
+                messages = self._build_messages(image_parts, prompt)
+                response = self.client.beta.chat.completions.parse(messages=messages, **self._completion_params())
+        except Exception:
+            metrics.observe_ai_call_error("cluster_classify_and_sequence", self.model_name)
+            logger.error("API call to OpenAI provider failed", extra={**log_extra, "connection_pool": pool_stats}, exc_info=True)
+            raise
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        return self._build_classified_response(response, latency_ms, request_id, pool_stats)
+
+    async def acluster_classify_and_sequence(
+        self,
+        image_parts: Iterable[Dict],
+        prompt: str,
+        request_id: str
+    ) -> ClassifiedDocumentsResponse:
+        """Calls the OpenAI-compatible API through the async client and logs detailed metrics."""
+
+        log_extra = {"request_id": request_id}
+
+        pool_stats = _connection_pool_stats(self.async_http_client)
+        start_time = time.perf_counter()
+
+        try:
+            if settings.STREAM_REQUEST_BODY:
+                response = await self._apost_streaming_body(image_parts, prompt)
+            else:
+                messages = self._build_messages(image_parts, prompt)
+                response = await self.async_client.beta.chat.completions.parse(messages=messages, **self._completion_params())
+        except Exception:
+            metrics.observe_ai_call_error("cluster_classify_and_sequence", self.model_name)
+            logger.error("API call to OpenAI provider failed", extra={**log_extra, "connection_pool": pool_stats}, exc_info=True)
+            raise
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        return self._build_classified_response(response, latency_ms, request_id, pool_stats)
+
+    def summarize_pages(
+        self,
+        image_parts: Iterable[Dict],
+        prompt: str,
+        request_id: str
+    ) -> PageSummariesResponse:
+        """Calls the OpenAI-compatible API for per-page summaries of a batch of pages."""
+
+        log_extra = {"request_id": request_id}
+        messages = self._build_messages(image_parts, prompt)
+
+        pool_stats = _connection_pool_stats(self.http_client)
+        start_time = time.perf_counter()
+
+        try:
+            response = self.client.beta.chat.completions.parse(messages=messages, **self._completion_params(DocumentPageSummaries))
+        except Exception:
+            metrics.observe_ai_call_error("page_summaries", self.model_name)
+            logger.error("API call to OpenAI provider failed", extra={**log_extra, "connection_pool": pool_stats}, exc_info=True)
+            raise
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        return self._build_page_summaries_response(response, latency_ms, request_id, pool_stats)
+
+    async def asummarize_pages(
+        self,
+        image_parts: Iterable[Dict],
+        prompt: str,
+        request_id: str
+    ) -> PageSummariesResponse:
+        """Calls the OpenAI-compatible API through the async client for per-page summaries of a batch of pages."""
+
+        log_extra = {"request_id": request_id}
+        messages = self._build_messages(image_parts, prompt)
+
+        pool_stats = _connection_pool_stats(self.async_http_client)
+        start_time = time.perf_counter()
+
+        try:
+            response = await self.async_client.beta.chat.completions.parse(messages=messages, **self._completion_params(DocumentPageSummaries))
         except Exception:
-            logger.error("API call to OpenAI provider failed", extra=log_extra, exc_info=True)
+            metrics.observe_ai_call_error("page_summaries", self.model_name)
+            logger.error("API call to OpenAI provider failed", extra={**log_extra, "connection_pool": pool_stats}, exc_info=True)
             raise
 
-        end_time = time.perf_counter()
-        latency_ms = (end_time - start_time) * 1000
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        return self._build_page_summaries_response(response, latency_ms, request_id, pool_stats)
 
-        # --- Structured Metric Logging ---
+    def _log_call_metric(self, response, latency_ms: float, request_id: str, pool_stats: Dict, call_type: str) -> Dict:
+        """Log the structured performance metric for a model call and return its token usage."""
         token_usage = response.usage.to_dict() if response.usage else {}
+        metrics.observe_ai_call(call_type, self.model_name, latency_ms / 1000, token_usage)
         log_metric_data = {
             "request_id": request_id,
             "metric_type": "ai_call_performance",
-            "model_name": settings.MODEL_NAME,
+            "call_type": call_type,
+            "model_name": self.model_name,
             "latency_ms": round(latency_ms, 2),
-            "token_usage": token_usage
+            "token_usage": token_usage,
+            "connection_pool": pool_stats
         }
         logger.info("AI call performance metric", extra=log_metric_data)
+        return token_usage
 
-        # Safely parse the response content
+    def _parse_structured_output(self, response, schema: type, request_id: str):
+        """Safely parse the response content and validate it against the expected Pydantic model."""
+        log_extra = {"request_id": request_id}
+        start_time = time.perf_counter()
         try:
             response_json_str = response.choices[0].message.content.replace("```json", "").replace("```", "").strip()
             raw_response = json.loads(response_json_str)
             # Validate that the parsed response matches the expected Pydantic model
-            validated_response = NonExtractedDocuments.model_validate(raw_response)
+            return schema.model_validate(raw_response)
         except (IndexError, json.JSONDecodeError, Exception) as e:
             logger.error(f"Failed to parse or validate model response: {e}. Response: '{getattr(response.choices[0].message, 'content', 'N/A')}'", extra=log_extra)
             raise ValueError("Could not parse a valid JSON object from the model's response.")
+        finally:
+            metrics.observe_stage("response_parsing", time.perf_counter() - start_time)
+
+    def _build_page_summaries_response(self, response, latency_ms: float, request_id: str, pool_stats: Dict) -> PageSummariesResponse:
+        """Log call metrics and transform the raw completion into a PageSummariesResponse."""
+        token_usage = self._log_call_metric(response, latency_ms, request_id, pool_stats, "page_summaries")
+        validated_response = self._parse_structured_output(response, DocumentPageSummaries, request_id)
+
+        return PageSummariesResponse(
+            request_id=request_id,
+            page_summaries=validated_response.document_page_summaries or [],
+            processing_metadata={"ai_call_latency_ms": latency_ms, "token_usage": token_usage}
+        )
+
+    def _build_classified_response(self, response, latency_ms: float, request_id: str, pool_stats: Dict) -> ClassifiedDocumentsResponse:
+        """Log call metrics and transform the raw completion into a ClassifiedDocumentsResponse."""
+        token_usage = self._log_call_metric(response, latency_ms, request_id, pool_stats, "cluster_classify_and_sequence")
+        validated_response = self._parse_structured_output(response, NonExtractedDocuments, request_id)
 
         # Transform raw response to the standardized ClassifiedDocumentsResponse
         classified_docs = []
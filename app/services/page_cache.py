@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+from typing import Dict, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the preprocessing code changes in a way that alters its output,
+# so entries written by older builds are never served.
+PAGE_CACHE_VERSION = 2
+
+# Settings that influence the preprocessed page bytes; all of them are part of every cache key.
+CACHE_KEY_SETTINGS = (
+    "TARGET_DPI",
+    "DEFAULT_DPI",
+    "SMALL_ANGLE_THRESHOLD",
+    "DEFAULT_IMAGE_FORMAT",
+    "IMAGE_QUALITY",
+    "IMAGE_PNG_COMPRESSION",
+    "IMAGE_GRAYSCALE_PASSTHROUGH",
+    "IMAGE_MAX_PIXELS",
+    "SHARPEN_CONTRAST_ALPHA",
+    "SHARPEN_CONTRAST_BETA",
+    "SKEW_ESTIMATOR",
+    "SKEW_ESTIMATION_MAX_SIDE",
+    "SKEW_ESTIMATION_MAX_POINTS",
+    "SKEW_SEARCH_RANGE",
+)
+
+class PageImageCache:
+    """
+    On-disk, content-addressed cache of preprocessed page images.
+
+    Each entry is a single file holding a small JSON header followed by the encoded
+    page bytes. Entries are written atomically (temp file + rename), so concurrent
+    workers never observe partial entries. Reads refresh the entry's mtime, and
+    eviction removes the least recently used entries once the cache exceeds its size bound.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._approx_size = self._scan_size()
+
+    def make_key(self, content_digest: str, page_index: int, variant: str = "") -> str:
+        """Build the cache key from the source content, page index and enhancement settings."""
+        fingerprint = {name: getattr(settings, name) for name in CACHE_KEY_SETTINGS}
+        key_material = json.dumps(
+            [PAGE_CACHE_VERSION, content_digest, page_index, variant, fingerprint],
+            sort_keys=True
+        )
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.page")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached entry (header fields plus 'data' bytes), or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                header_line = f.readline()
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            logger.warning(f"Could not read page cache entry {key}", exc_info=True)
+            return None
+
+        try:
+            entry = json.loads(header_line)
+        except json.JSONDecodeError:
+            logger.warning(f"Discarding corrupt page cache entry {key}")
+            self._remove(path)
+            return None
+        entry["data"] = data
+        return entry
+
+    def put(self, key: str, header: Dict, data: bytes) -> None:
+        """Store an entry atomically and evict old entries if the cache has grown too large."""
+        path = self._entry_path(key)
+        shard_dir = os.path.dirname(path)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=shard_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(header).encode("utf-8") + b"\n")
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning(f"Could not write page cache entry {key}", exc_info=True)
+            self._remove(tmp_path)
+            return
+
+        self._approx_size += len(data)
+        if self._approx_size > self.max_bytes:
+            self._evict()
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._iter_entries())
+
+    def _iter_entries(self):
+        """Yield (path, size, mtime) for every entry currently on disk."""
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".page"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache is back under 90% of its bound."""
+        lock_path = os.path.join(self.cache_dir, ".evict.lock")
+        with open(lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is already evicting.
+                return
+
+            start_time = time.perf_counter()
+            entries = sorted(self._iter_entries(), key=lambda entry: entry[2])
+            total_size = sum(size for _, size, _ in entries)
+            target_size = int(self.max_bytes * 0.9)
+            evicted = 0
+            for path, size, _ in entries:
+                if total_size <= target_size:
+                    break
+                if self._remove(path):
+                    total_size -= size
+                    evicted += 1
+            self._approx_size = total_size
+            logger.info("Page cache eviction", extra={
+                "evicted_entries": evicted,
+                "cache_bytes": total_size,
+                "latency_ms": round((time.perf_counter() - start_time) * 1000, 2)
+            })
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+_page_cache: Optional[PageImageCache] = None
+
+def get_page_cache() -> Optional[PageImageCache]:
+    """Return the process-wide page cache, or None when caching is disabled."""
+    global _page_cache
+    if not settings.PAGE_CACHE_ENABLED:
+        return None
+    if _page_cache is None:
+        _page_cache = PageImageCache(settings.PAGE_CACHE_DIR, settings.PAGE_CACHE_MAX_BYTES)
+    return _page_cache
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from .rate_limited_provider import estimate_image_tokens
+from ..config import settings
+from ..schemas import ClassifiedDocumentsResponse
+
+logger = logging.getLogger(__name__)
+
+class PageHashIndex:
+    """
+    Finds a stored hash within `max_distance` bits of a query hash. Hashes are split
+    into max_distance + 1 bands. Two hashes that differ in at most max_distance bits
+    share at least one band exactly, so only hashes with a matching band are compared.
+    """
+
+    def __init__(self, bits: int, max_distance: int):
+        self.max_distance = max_distance
+        band_count = min(bits, max_distance + 1)
+        band_width = bits // band_count
+        # (shift, mask) per band; the last band takes the remaining bits.
+        self._bands = []
+        for band_index in range(band_count):
+            width = band_width if band_index < band_count - 1 else bits - band_width * (band_count - 1)
+            self._bands.append((band_index * band_width, (1 << width) - 1))
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self._hashes: List[int] = []
+        self._values: List[Dict] = []
+
+    def find(self, value: int) -> List[Dict]:
+        """The entries stored with a hash within max_distance bits, closest first."""
+        matches = {}
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            for entry in buckets.get((value >> shift) & mask, ()):
+                if entry not in matches:
+                    distance = (self._hashes[entry] ^ value).bit_count()
+                    if distance <= self.max_distance:
+                        matches[entry] = distance
+        return [self._values[entry] for entry in sorted(matches, key=lambda entry: (matches[entry], entry))]
+
+    def add(self, value: int, stored: Dict) -> None:
+        entry = len(self._hashes)
+        self._hashes.append(value)
+        self._values.append(stored)
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((value >> shift) & mask, []).append(entry)
+
+class PageDeduplicator:
+    """
+    Collapses duplicate pages within one request. The first page of each group is the
+    representative sent to the model; later duplicates are held back and listed right
+    after it in the classified documents.
+
+    Pages whose perceptual hashes are within PAGE_DEDUP_MAX_DISTANCE bits are only
+    candidates. Pages of one template filled in with other amounts hash as close as a
+    rescan of the same page, so with PAGE_DEDUP_MATCH 'exact' a candidate must also
+    have the same text layer, or, when neither page has one, the same encoded image.
+    """
+
+    def __init__(self, hash_size: Optional[int] = None, max_distance: Optional[int] = None, match: Optional[str] = None):
+        self.hash_size = hash_size or settings.PAGE_DEDUP_HASH_SIZE
+        self.max_distance = settings.PAGE_DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.match = match or settings.PAGE_DEDUP_MATCH
+        self._index = PageHashIndex(self.hash_size * self.hash_size, self.max_distance)
+        self.duplicates: Dict[str, List[str]] = {}
+        self._tokens_saved = 0
+
+    def _same_page(self, page: Dict, candidate: Dict) -> bool:
+        # A text layer is authoritative when either page has one.
+        if page["text_digest"] or candidate["text_digest"]:
+            return page["text_digest"] == candidate["text_digest"]
+        if self.match == "perceptual":
+            return True
+        return page["image_digest"] == candidate["image_digest"]
+
+    def is_duplicate(self, page: Dict) -> bool:
+        """Record the page and return whether it duplicates an earlier page, so it needn't be sent."""
+        hex_hash = page.get("page_hash")
+        # Text pages and pages hashed with another hash size (e.g. from the page cache) are always sent.
+        if hex_hash is None or "text" in page or len(hex_hash) * 4 != self.hash_size * self.hash_size:
+            return False
+        value = int(hex_hash, 16)
+        entry = {
+            "filename": page["filename"],
+            "text_digest": page.get("text_digest"),
+            "image_digest": hashlib.sha1(page["base64_data"].encode("ascii")).hexdigest()
+        }
+        representative = next((candidate for candidate in self._index.find(value) if self._same_page(entry, candidate)), None)
+        if representative is None:
+            self._index.add(value, entry)
+            return False
+        self.duplicates.setdefault(representative["filename"], []).append(page["filename"])
+        self._tokens_saved += estimate_image_tokens(f'data:{page["mime_type"]};base64,{page["base64_data"]}')
+        logger.debug(f"Page {page['filename']} duplicates {representative['filename']}; not sending it.")
+        return True
+
+    def cache_key_note(self) -> str:
+        """The duplicate groups, for result cache keys: the same pages sent can stand for different folders."""
+        if not self.duplicates:
+            return ""
+        groups = ";".join(f"{representative}={','.join(pages)}" for representative, pages in self.duplicates.items())
+        return f"<page_duplicates>{groups}</page_duplicates>"
+
+    def expand(self, response: ClassifiedDocumentsResponse) -> None:
+        """Insert every held-back page right after its representative in the classified documents."""
+        if not self.duplicates:
+            return
+        listed = {page for document in response.documents for page in document.pages}
+        for document in response.documents:
+            pages = []
+            for page in document.pages:
+                pages.append(page)
+                for duplicate in self.duplicates.get(page, ()):
+                    if duplicate not in listed:
+                        pages.append(duplicate)
+                        listed.add(duplicate)
+            document.pages = pages
+
+    def metadata(self) -> Dict:
+        return {
+            "groups": len(self.duplicates),
+            "duplicate_pages": sum(len(pages) for pages in self.duplicates.values()),
+            "estimated_tokens_saved": self._tokens_saved,
+            "duplicates": self.duplicates
+        }
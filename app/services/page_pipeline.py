@@ -0,0 +1,254 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .. import metrics
+
+# Seconds a waiting worker sleeps between checks of whether the pipeline was closed.
+_POLL_SECONDS = 0.1
+
+# Marks the end of the items in a queue.
+_DONE = object()
+
+class _Closed(Exception):
+    """Raised inside worker threads once the pipeline is closed."""
+
+class _Failed:
+    """Carries a stage's input item and error downstream in place of its result, so failures surface in order."""
+
+    def __init__(self, item, error: BaseException):
+        self.item = item
+        self.error = error
+
+class StagedPipeline:
+    """
+    Runs the items of a source iterator through a chain of stages, each on its own
+    threads, with a bounded queue in front of every stage and in front of the consumer.
+    Iterating the pipeline yields (result, error) pairs in source order. When a stage
+    raises, `result` is that stage's input item and `error` is the exception.
+
+    Every stage works at its own pace and concurrency. A slow consumer (e.g. one sending
+    pages to the model) holds back the stages before it instead of letting finished work
+    pile up in memory, and the consumer can start on the first items while later ones
+    are still in earlier stages.
+
+    Per stage, the pipeline records processed items, busy time, idle time spent waiting
+    for input ('starved') or for room in the next queue ('blocked'), and the depth of
+    the stage's input queue.
+    """
+
+    def __init__(
+        self,
+        source: Iterator,
+        stages: List[Tuple[str, Callable, int]],
+        queue_size: int,
+        source_stage: str = "source",
+        consumer_stage: str = "consumer",
+        name: str = "pipeline"
+    ):
+        self.source = source
+        self.stages = stages
+        self.source_stage = source_stage
+        self.consumer_stage = consumer_stage
+        self.name = name
+        # queues[i] feeds stages[i]; the last queue feeds the consumer.
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(len(stages) + 1)]
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._remaining_workers = [workers for _, _, workers in stages]
+        self._stats: Dict[str, Dict] = {}
+        for stage_name, workers in [(source_stage, 1)] + [(stage_name, workers) for stage_name, _, workers in stages] + [(consumer_stage, 1)]:
+            self._stats[stage_name] = {
+                "workers": workers, "items": 0, "busy_s": 0.0, "starved_s": 0.0, "blocked_s": 0.0,
+                "queue_depth_max": 0, "queue_depth_total": 0, "queue_samples": 0
+            }
+        # Name of the stage that reads from each queue, for depth stats.
+        self._queue_readers = [stage_name for stage_name, _, _ in stages] + [consumer_stage]
+
+    # --- Queue helpers (worker side) ---
+
+    def _put(self, queue_index: int, entry) -> float:
+        """Put an entry, waiting for room unless the pipeline is closed. Returns the seconds spent waiting."""
+        target = self.queues[queue_index]
+        start_time = time.perf_counter()
+        while True:
+            if self._closed.is_set():
+                raise _Closed()
+            try:
+                target.put(entry, timeout=_POLL_SECONDS)
+                break
+            except queue.Full:
+                continue
+        waited = time.perf_counter() - start_time
+        if entry is not _DONE:
+            self._sample_depth(queue_index, target.qsize())
+        return waited
+
+    def _get(self, queue_index: int):
+        source = self.queues[queue_index]
+        while True:
+            if self._closed.is_set():
+                raise _Closed()
+            try:
+                return source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+    def _sample_depth(self, queue_index: int, depth: int) -> None:
+        reader = self._queue_readers[queue_index]
+        metrics.observe_pipeline_queue_depth(reader, depth)
+        with self._lock:
+            stats = self._stats[reader]
+            stats["queue_depth_max"] = max(stats["queue_depth_max"], depth)
+            stats["queue_depth_total"] += depth
+            stats["queue_samples"] += 1
+
+    def _add_stats(self, stage_name: str, items: int, busy_s: float, starved_s: float, blocked_s: float) -> None:
+        with self._lock:
+            stats = self._stats[stage_name]
+            stats["items"] += items
+            stats["busy_s"] += busy_s
+            stats["starved_s"] += starved_s
+            stats["blocked_s"] += blocked_s
+
+    # --- Threads ---
+
+    def _run_source(self) -> None:
+        items = 0
+        busy_s = blocked_s = 0.0
+        try:
+            while True:
+                start_time = time.perf_counter()
+                try:
+                    item = next(self.source)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    busy_s += time.perf_counter() - start_time
+                    # The source can't continue after raising; surface the error and stop.
+                    blocked_s += self._put(0, (items, _Failed(None, e)))
+                    break
+                busy_s += time.perf_counter() - start_time
+                blocked_s += self._put(0, (items, item))
+                items += 1
+            self._put(0, _DONE)
+        except _Closed:
+            pass
+        finally:
+            self._add_stats(self.source_stage, items, busy_s, 0.0, blocked_s)
+
+    def _run_stage(self, stage_index: int) -> None:
+        stage_name, func, _ = self.stages[stage_index]
+        items = 0
+        busy_s = starved_s = blocked_s = 0.0
+        try:
+            while True:
+                start_time = time.perf_counter()
+                entry = self._get(stage_index)
+                starved_s += time.perf_counter() - start_time
+                if entry is _DONE:
+                    with self._lock:
+                        self._remaining_workers[stage_index] -= 1
+                        last_worker = self._remaining_workers[stage_index] == 0
+                    if last_worker:
+                        self._put(stage_index + 1, _DONE)
+                    else:
+                        # Leave the marker for the stage's other workers.
+                        self._put(stage_index, _DONE)
+                    break
+
+                sequence, item = entry
+                if not isinstance(item, _Failed):
+                    start_time = time.perf_counter()
+                    try:
+                        item = func(item)
+                    except Exception as e:
+                        item = _Failed(item, e)
+                    busy_s += time.perf_counter() - start_time
+                    items += 1
+                blocked_s += self._put(stage_index + 1, (sequence, item))
+        except _Closed:
+            pass
+        finally:
+            self._add_stats(stage_name, items, busy_s, starved_s, blocked_s)
+
+    def _start(self) -> None:
+        self._threads.append(threading.Thread(target=self._run_source, name=f"{self.name}-{self.source_stage}", daemon=True))
+        for stage_index, (stage_name, _, workers) in enumerate(self.stages):
+            for worker_index in range(workers):
+                self._threads.append(threading.Thread(
+                    target=self._run_stage,
+                    args=(stage_index,),
+                    name=f"{self.name}-{stage_name}-{worker_index}",
+                    daemon=True
+                ))
+        for thread in self._threads:
+            thread.start()
+
+    def close(self) -> None:
+        """Stop all stage threads (discarding items still in flight) and publish the idle time metrics. Idempotent."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        for thread in self._threads:
+            thread.join()
+        # The source thread has exited, so a suspended source generator can be closed from here.
+        close_source = getattr(self.source, "close", None)
+        if close_source is not None:
+            close_source()
+        with self._lock:
+            for stage_name, stats in self._stats.items():
+                metrics.observe_pipeline_idle(stage_name, "starved", stats["starved_s"])
+                metrics.observe_pipeline_idle(stage_name, "blocked", stats["blocked_s"])
+
+    def __iter__(self) -> Iterator[Tuple[object, Optional[BaseException]]]:
+        self._start()
+        consumer_queue = len(self.stages)
+        pending: Dict[int, object] = {}
+        next_sequence = 0
+        items = 0
+        busy_s = starved_s = 0.0
+        try:
+            while True:
+                while next_sequence in pending:
+                    item = pending.pop(next_sequence)
+                    next_sequence += 1
+                    items += 1
+                    start_time = time.perf_counter()
+                    if isinstance(item, _Failed):
+                        yield item.item, item.error
+                    else:
+                        yield item, None
+                    # Time the consumer spent on the item before asking for the next one.
+                    busy_s += time.perf_counter() - start_time
+
+                start_time = time.perf_counter()
+                entry = self.queues[consumer_queue].get()
+                starved_s += time.perf_counter() - start_time
+                if entry is _DONE:
+                    break
+                sequence, item = entry
+                pending[sequence] = item
+        finally:
+            self._add_stats(self.consumer_stage, items, busy_s, starved_s, 0.0)
+            self.close()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-stage items, busy/starved/blocked milliseconds and input queue depth."""
+        with self._lock:
+            snapshot = {stage_name: dict(stats) for stage_name, stats in self._stats.items()}
+        summary = {}
+        for stage_name, stats in snapshot.items():
+            summary[stage_name] = {
+                "workers": stats["workers"],
+                "items": stats["items"],
+                "busy_ms": round(stats["busy_s"] * 1000, 2),
+                "starved_ms": round(stats["starved_s"] * 1000, 2),
+                "blocked_ms": round(stats["blocked_s"] * 1000, 2)
+            }
+            if stats["queue_samples"]:
+                summary[stage_name]["queue_depth_max"] = stats["queue_depth_max"]
+                summary[stage_name]["queue_depth_mean"] = round(stats["queue_depth_total"] / stats["queue_samples"], 2)
+        return summary
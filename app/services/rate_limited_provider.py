@@ -0,0 +1,215 @@
+import io
+import time
+import base64
+import random
+import asyncio
+import logging
+import itertools
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from .admission_control import AdmissionController
+from .ai_provider_interface import AIProviderInterface, AIProviderRateLimitError
+from ..config import settings
+from ..schemas import ClassifiedDocumentsResponse, PageSummariesResponse
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Base64 characters decoded to read an image header (a multiple of 4; ~48KB of image bytes).
+_IMAGE_HEADER_BASE64_CHARS = 65536
+
+def _image_dimensions(data_url: str) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the header of a base64 data URL without decoding the whole image."""
+    from PIL import Image
+
+    try:
+        encoded = data_url.split(",", 1)[1][:_IMAGE_HEADER_BASE64_CHARS]
+        with Image.open(io.BytesIO(base64.b64decode(encoded))) as image:
+            return image.size
+    except Exception:
+        return None
+
+def estimate_image_tokens(data_url: str) -> int:
+    """Tokens for one page image: the number of tiles it covers times the tokens per tile."""
+    dimensions = _image_dimensions(data_url)
+    if dimensions is None:
+        return settings.AI_ESTIMATED_PAGE_TOKENS
+    width, height = dimensions
+    tile = settings.AI_IMAGE_TILE_SIZE
+    tiles = -(-width // tile) * -(-height // tile)
+    return tiles * settings.AI_TOKENS_PER_IMAGE_TILE
+
+def estimate_text_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def estimate_call_tokens(input_parts: List[Dict], prompt: str) -> int:
+    """Estimated prompt plus completion tokens for a call whose input parts are all known."""
+    tokens = estimate_text_tokens(prompt) + settings.AI_ESTIMATED_OUTPUT_TOKENS
+    for part in input_parts:
+        if part["type"] == "text":
+            tokens += estimate_text_tokens(part["text"])
+        else:
+            tokens += estimate_image_tokens(part["image_url"])
+    return tokens
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The delay the upstream asked for via Retry-After / retry-after-ms, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RateLimitedAIProvider(AIProviderInterface):
+    """
+    Wraps another provider with admission control and retries.
+    Every call reserves its estimated tokens with the shared AdmissionController before it
+    is sent, and retryable failures (429, 5xx, connection errors) are retried with jittered
+    exponential backoff that honours Retry-After. A 429 also pauses all other admissions.
+    Calls whose input parts are a lazy iterator (streamed request bodies) can't be replayed
+    from here, so they are admitted with a page-count estimate and not retried; the provider
+    retries them from the body it already sent.
+    """
+
+    def __init__(self, provider: AIProviderInterface, controller: AdmissionController):
+        self.provider = provider
+        self.controller = controller
+
+    def _prepare_parts(self, image_parts: Iterable[Dict], prompt: str) -> Tuple[Iterable[Dict], int, bool]:
+        """Return the parts to send, their estimated tokens, and whether the call can be replayed."""
+        if isinstance(image_parts, list):
+            return image_parts, estimate_call_tokens(image_parts, prompt), True
+
+        # Streamed parts: the manifest comes first and tells us how many pages follow.
+        parts_iter = iter(image_parts)
+        manifest_part = next(parts_iter, None)
+        if manifest_part is None:
+            return [], estimate_text_tokens(prompt), True
+        manifest_text = manifest_part.get("text", "")
+        page_count = manifest_text.count('"document_page_image_filename"')
+        tokens = (
+            estimate_text_tokens(prompt) + estimate_text_tokens(manifest_text)
+            + page_count * settings.AI_ESTIMATED_PAGE_TOKENS + settings.AI_ESTIMATED_OUTPUT_TOKENS
+        )
+        return itertools.chain([manifest_part], parts_iter), tokens, False
+
+    def _used_tokens(self, response: Union[ClassifiedDocumentsResponse, PageSummariesResponse]) -> Optional[int]:
+        token_usage = (response.processing_metadata or {}).get("token_usage") or {}
+        return token_usage.get("total_tokens")
+
+    def _retry_delay(self, error: Exception, attempt: int, replayable: bool, request_id: str) -> Optional[float]:
+        """Seconds to wait before retrying the failed call, or None if it must not be retried."""
+        status_code = getattr(error, "status_code", None)
+        retry_after = retry_after_seconds(error)
+        if status_code == 429:
+            self.controller.pause(retry_after if retry_after is not None else settings.AI_RETRY_BASE_DELAY_SECONDS)
+
+        # Only reached once a call has failed, by which time the provider has loaded the SDK.
+        import openai
+
+        retryable = status_code in RETRYABLE_STATUS_CODES or isinstance(error, openai.APIConnectionError)
+        if not retryable or not replayable or attempt >= settings.AI_MAX_RETRIES:
+            return None
+
+        backoff = min(settings.AI_RETRY_MAX_DELAY_SECONDS, settings.AI_RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+        delay = backoff * random.uniform(0.5, 1.0)
+        if retry_after is not None:
+            delay = max(delay, retry_after + random.uniform(0, settings.AI_RETRY_BASE_DELAY_SECONDS))
+        logger.warning(
+            f"AI call failed ({status_code or type(error).__name__}); retrying in {delay:.1f}s (attempt {attempt + 1} of {settings.AI_MAX_RETRIES}).",
+            extra={"request_id": request_id}
+        )
+        return delay
+
+    def _final_error(self, error: Exception) -> Exception:
+        if getattr(error, "status_code", None) == 429:
+            return AIProviderRateLimitError("The model endpoint is rate limiting requests.", retry_after=retry_after_seconds(error))
+        return error
+
+    def _record_admission(self, response, wait_ms: float, retries: int, estimated_tokens: int, request_id: str, call_type: str):
+        admission = {"wait_ms": wait_ms, "retries": retries, "estimated_tokens": estimated_tokens}
+        response.processing_metadata = {**(response.processing_metadata or {}), "admission": admission}
+        stats = self.controller.stats()
+        logger.info("AI admission metric", extra={
+            "request_id": request_id,
+            "metric_type": "ai_admission",
+            "call_type": call_type,
+            **admission,
+            "used_tokens": self._used_tokens(response),
+            "queue_depth": stats["queue_depth"],
+            "in_flight": stats["in_flight"]
+        })
+        return response
+
+    def _release(self, estimated_tokens: int, response) -> None:
+        """Free the call's admission slot; called from a `finally` so cancelled and interrupted calls free it too."""
+        self.controller.release(estimated_tokens, self._used_tokens(response) if response is not None else None)
+
+    def _call(self, call_type: str, call: Callable, image_parts: Iterable[Dict], prompt: str, request_id: str):
+        parts, estimated_tokens, replayable = self._prepare_parts(image_parts, prompt)
+        attempt = 0
+        while True:
+            wait_ms = self.controller.acquire(estimated_tokens)
+            response, error = None, None
+            try:
+                response = call(parts, prompt, request_id)
+            except Exception as e:
+                error = e
+            finally:
+                self._release(estimated_tokens, response)
+            if error is None:
+                return self._record_admission(response, wait_ms, attempt, estimated_tokens, request_id, call_type)
+
+            delay = self._retry_delay(error, attempt, replayable, request_id)
+            if delay is None:
+                raise self._final_error(error) from error
+            time.sleep(delay)
+            attempt += 1
+
+    async def _acall(self, call_type: str, call: Callable, image_parts: Iterable[Dict], prompt: str, request_id: str):
+        parts, estimated_tokens, replayable = self._prepare_parts(image_parts, prompt)
+        attempt = 0
+        while True:
+            wait_ms = await self.controller.aacquire(estimated_tokens)
+            response, error = None, None
+            try:
+                response = await call(parts, prompt, request_id)
+            except Exception as e:
+                error = e
+            finally:
+                self._release(estimated_tokens, response)
+            if error is None:
+                return self._record_admission(response, wait_ms, attempt, estimated_tokens, request_id, call_type)
+
+            delay = self._retry_delay(error, attempt, replayable, request_id)
+            if delay is None:
+                raise self._final_error(error) from error
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def cluster_classify_and_sequence(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> ClassifiedDocumentsResponse:
+        return self._call("cluster_classify_and_sequence", self.provider.cluster_classify_and_sequence, image_parts, prompt, request_id)
+
+    async def acluster_classify_and_sequence(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> ClassifiedDocumentsResponse:
+        return await self._acall("cluster_classify_and_sequence", self.provider.acluster_classify_and_sequence, image_parts, prompt, request_id)
+
+    def summarize_pages(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> PageSummariesResponse:
+        return self._call("page_summaries", self.provider.summarize_pages, image_parts, prompt, request_id)
+
+    async def asummarize_pages(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> PageSummariesResponse:
+        return await self._acall("page_summaries", self.provider.asummarize_pages, image_parts, prompt, request_id)
+
+    async def aclose(self) -> None:
+        await self.provider.aclose()
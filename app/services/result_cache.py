@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import Dict, List, Optional
+
+from ..config import settings
+from ..schemas import ClassifiedDocumentsResponse
+from . import page_cache
+
+logger = logging.getLogger(__name__)
+
+# Model parameters that influence the classification result; all of them are part of every cache key.
+CACHE_KEY_SETTINGS = (
+    "MODEL_NAME",
+    "TEMPERATURE",
+    "TOP_P",
+    "REASONING_EFFORT",
+    "MAX_COMPLETION_TOKENS",
+)
+
+def compute_result_cache_key(input_parts: List[Dict], prompt: str) -> str:
+    """
+    Digest of everything the model sees: the prompt, the model parameters, and every
+    input part (manifest text and image data URLs), hashed incrementally.
+    """
+    digest = hashlib.sha256()
+    model_params = {name: getattr(settings, name) for name in CACHE_KEY_SETTINGS}
+    digest.update(json.dumps(model_params, sort_keys=True).encode("utf-8"))
+    digest.update(prompt.encode("utf-8"))
+    for part in input_parts:
+        digest.update(part["type"].encode("utf-8"))
+        content = part.get("text") if part["type"] == "text" else part.get("image_url")
+        digest.update(str(content).encode("utf-8"))
+    return digest.hexdigest()
+
+def compute_source_result_cache_key(
+    page_filenames: List[str],
+    source_digests: List[str],
+    prompt: str,
+    preprocessing_variant: str = ""
+) -> str:
+    """
+    Key for streamed requests, where page bytes only exist while the request is being sent.
+    Preprocessing is deterministic, so the source file digests plus the preprocessing
+    settings and variant identify the page bytes just as well as the bytes themselves.
+    """
+    digest = hashlib.sha256()
+    model_params = {name: getattr(settings, name) for name in CACHE_KEY_SETTINGS}
+    preprocessing_params = {name: getattr(settings, name) for name in page_cache.CACHE_KEY_SETTINGS}
+    digest.update(json.dumps(
+        [model_params, preprocessing_params, page_cache.PAGE_CACHE_VERSION, preprocessing_variant, page_filenames, source_digests],
+        sort_keys=True
+    ).encode("utf-8"))
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+class ResultCacheInterface(ABC):
+    """
+    Abstract base class for classification result caches.
+    Stores the provider's ClassifiedDocumentsResponse, before filename mapping, keyed by input digest.
+    """
+    @abstractmethod
+    def get(self, key: str) -> Optional[ClassifiedDocumentsResponse]:
+        """Return the cached response, or None when it is missing or expired."""
+        pass
+
+    @abstractmethod
+    def put(self, key: str, response: ClassifiedDocumentsResponse) -> None:
+        """Store a response under the given key."""
+        pass
+
+    @abstractmethod
+    def invalidate(self, key: str) -> bool:
+        """Remove a single entry. Returns True if an entry was removed."""
+        pass
+
+    @abstractmethod
+    def clear(self) -> int:
+        """Remove every entry. Returns the number of entries removed."""
+        pass
+
+class SQLiteResultCache(ResultCacheInterface):
+    """
+    Local result cache backed by a SQLite file.
+    A short-lived connection is opened per operation, so a single instance can be
+    shared across threads, and WAL mode lets several worker processes use the same file.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: Optional[int] = None):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS classification_results ("
+                " cache_key TEXT PRIMARY KEY,"
+                " response_json TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, key: str) -> Optional[ClassifiedDocumentsResponse]:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT response_json, expires_at FROM classification_results WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        response_json, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            self.invalidate(key)
+            return None
+        return ClassifiedDocumentsResponse.model_validate_json(response_json)
+
+    def put(self, key: str, response: ClassifiedDocumentsResponse) -> None:
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO classification_results (cache_key, response_json, created_at, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, response.model_dump_json(), now, expires_at)
+            )
+            # Opportunistically drop expired entries so the file doesn't grow without bound.
+            conn.execute("DELETE FROM classification_results WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def invalidate(self, key: str) -> bool:
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute("DELETE FROM classification_results WHERE cache_key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def clear(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute("DELETE FROM classification_results")
+        return cursor.rowcount
+
+_result_cache: Optional[ResultCacheInterface] = None
+
+def get_result_cache() -> Optional[ResultCacheInterface]:
+    """Return the process-wide result cache, or None when result caching is disabled."""
+    global _result_cache
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    if _result_cache is None:
+        _result_cache = SQLiteResultCache(settings.RESULT_CACHE_PATH, settings.RESULT_CACHE_TTL_SECONDS)
+    return _result_cache
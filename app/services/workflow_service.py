@@ -1,66 +1,589 @@
+import asyncio
+import json
 import logging
-import os
-from typing import Dict, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from .ai_provider_interface import AIProviderInterface
-from .document_processor import DocumentProcessor
-from ..utils.file_utils import create_random_to_original_filename_lookup, read_mapping_file
-from ..schemas import ClassifiedDocumentsResponse, ProcessFolderRequest
-from .. import prompts
+from .file_ingestion import file_digest
+from .page_dedup import PageDeduplicator
+from .result_cache import compute_result_cache_key, compute_source_result_cache_key, get_result_cache
+from ..config import settings
+from ..utils.file_utils import get_filename_index
+from ..schemas import ClassifiedDocumentsResponse, DocumentPageSummary, PageSummariesResponse, ProcessFolderRequest
+from .. import metrics, prompts
 
 logger = logging.getLogger(__name__)
 
 class WorkflowService:
-    def __init__(self, ai_provider: AIProviderInterface):
+    def __init__(
+        self,
+        ai_provider: AIProviderInterface,
+        progress_callback: Optional[Callable[[Dict], None]] = None,
+        ai_call_limiter: Optional[asyncio.Semaphore] = None,
+        preprocessing_execution_mode: Optional[str] = None
+    ):
         self.ai_provider = ai_provider
-        self.doc_processor = DocumentProcessor()
+        # Imported here rather than at module load: it pulls in PyMuPDF, OpenCV and NumPy.
+        from .document_processor import DocumentProcessor
+
+        self.doc_processor = DocumentProcessor(execution_mode=preprocessing_execution_mode)
+        self.result_cache = get_result_cache()
+        # Shared with other workflows (e.g. the folders of a batch) to cap concurrent async AI calls.
+        self.ai_call_limiter = ai_call_limiter
+        # Receives a snapshot of `progress` on every change; called from worker threads too.
+        self.progress_callback = progress_callback
+        self.progress: Dict = {}
+        self._progress_lock = threading.Lock()
 
     def process_folder(self, request: ProcessFolderRequest, request_id: str) -> ClassifiedDocumentsResponse:
         log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
-        
+
         logger.info("Starting document preprocessing.", extra=log_extra)
-        preprocessed_output = self.doc_processor.preprocess_folder(request.folder_path)
-        
-        if not preprocessed_output:
+        self._configure_preprocessing(request)
+        self._set_progress(stage="planning")
+        planned_files = self.doc_processor.plan_folder(request.folder_path)
+        self._start_progress(planned_files)
+
+        if self._use_map_reduce(planned_files):
+            ai_response = self._classify_map_reduce(request, request_id, planned_files)
+        else:
+            ai_response = self._classify_single_call(request, request_id, planned_files)
+
+        if ai_response is None:
             logger.warning("No processable files found in the folder.", extra=log_extra)
-            return ClassifiedDocumentsResponse(request_id=request_id, documents=[], processing_metadata={"notes": "No files were found to process."})
-
-        logger.info(f"Preprocessing complete. Found {len(preprocessed_output)} pages.", extra=log_extra)
-        
-        # Prepare parts for the model prompt
-        manifest = [{"document_page_image_filename": item["filename"]} for item in preprocessed_output]
-        manifest_part = [{"type": "text", "text": f'<image_manifest>{json.dumps(manifest)}</image_manifest>'}]
-        
-        image_parts = [{"type": "image_url", "image_url": f'data:{item["mime_type"]};base64,{item["base64_data"]}'} for item in preprocessed_output]
-        
-        input_parts = manifest_part + image_parts
-
-        logger.info("Invoking AI provider for clustering, classification, and sequencing.", extra=log_extra)
-        prompt_to_use = prompts.document_clustering_sequencing_classification_si_prompt_multi_pages_3
-        
-        ai_response = self.ai_provider.cluster_classify_and_sequence(
-            image_parts=input_parts,
-            prompt=prompt_to_use,
-            request_id=request_id
-        )
+            return self._empty_response(request_id)
+
+        logger.info(f"AI provider returned {len(ai_response.documents)} documents.", extra=log_extra)
+        self._attach_preprocessing_metadata(ai_response)
+
+        if request.mapping_file_path:
+            logger.info("Mapping filenames to originals.", extra=log_extra)
+            self._map_filenames(ai_response, request.mapping_file_path)
+
+        return ai_response
+
+    async def aprocess_folder(self, request: ProcessFolderRequest, request_id: str) -> ClassifiedDocumentsResponse:
+        """
+        Async variant of `process_folder` for use on the event loop.
+        Preprocessing and file I/O run in the default executor and the AI call
+        goes through the provider's async client, so the loop is never blocked.
+        Concurrent requests preprocess on separate threads; their MuPDF calls are
+        serialized by the document processor.
+        """
+        log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
+        loop = asyncio.get_running_loop()
+
+        logger.info("Starting document preprocessing.", extra=log_extra)
+        self._configure_preprocessing(request)
+        self._set_progress(stage="planning")
+        planned_files = await loop.run_in_executor(None, self.doc_processor.plan_folder, request.folder_path)
+        self._start_progress(planned_files)
+
+        if self._use_map_reduce(planned_files):
+            ai_response = await self._aclassify_map_reduce(request, request_id, planned_files)
+        else:
+            ai_response = await self._aclassify_single_call(request, request_id, planned_files)
+
+        if ai_response is None:
+            logger.warning("No processable files found in the folder.", extra=log_extra)
+            return self._empty_response(request_id)
+
         logger.info(f"AI provider returned {len(ai_response.documents)} documents.", extra=log_extra)
+        self._attach_preprocessing_metadata(ai_response)
 
         if request.mapping_file_path:
             logger.info("Mapping filenames to originals.", extra=log_extra)
-            mapping_data = read_mapping_file(request.mapping_file_path)
-            lookup = create_random_to_original_filename_lookup(mapping_data)
-            
-            for document in ai_response.documents:
-                original_pages = []
-                for page_id in document.pages:
-                    original_filename = "NOT_FOUND"
-                    # Match base filename (e.g., "5elPNY" in "5elPNY.pdf") against page_id
-                    for random_key, original_value in lookup.items():
-                        base_random_key = os.path.splitext(random_key)[0]
-                        if base_random_key in page_id:
-                            original_filename = original_value
-                            break
-                    original_pages.append(original_filename)
-                document.pages = original_pages
-        
-        return ai_response
\ No newline at end of file
+            await loop.run_in_executor(None, self._map_filenames, ai_response, request.mapping_file_path)
+
+        return ai_response
+
+    # --- Progress reporting ---
+
+    def _publish_progress(self, update: Callable[[Dict], None]) -> None:
+        if self.progress_callback is None:
+            return
+        with self._progress_lock:
+            update(self.progress)
+            snapshot = dict(self.progress)
+        self.progress_callback(snapshot)
+
+    def _set_progress(self, **values) -> None:
+        self._publish_progress(lambda progress: progress.update(values))
+
+    def _add_progress(self, **deltas) -> None:
+        def update(progress: Dict) -> None:
+            for name, delta in deltas.items():
+                progress[name] = progress.get(name, 0) + delta
+        self._publish_progress(update)
+
+    def _start_progress(self, planned_files: List[Tuple[str, str, str, int]]) -> None:
+        self._set_progress(
+            stage="preprocessing",
+            files_total=len(planned_files),
+            pages_total=sum(page_count for _, _, _, page_count in planned_files),
+            pages_preprocessed=0,
+            ai_calls_in_flight=0,
+            ai_calls_completed=0
+        )
+
+    def _iter_pages(self, planned_files: List[Tuple[str, str, str, int]], strict: bool = False) -> Iterator[Dict]:
+        """Preprocess the planned files, counting pages into the progress as they are produced."""
+        for page in self.doc_processor.iter_preprocess_folder(planned_files, strict=strict):
+            self._add_progress(pages_preprocessed=1)
+            yield page
+
+    def _call_ai(self, stage: str, call: Callable, *args, **kwargs):
+        """Invoke a provider method, tracking it as an in-flight AI call of the given stage."""
+        self._set_progress(stage=stage)
+        self._add_progress(ai_calls_in_flight=1)
+        try:
+            return call(*args, **kwargs)
+        finally:
+            self._add_progress(ai_calls_in_flight=-1, ai_calls_completed=1)
+
+    async def _acall_ai(self, stage: str, call: Callable, *args, **kwargs):
+        """Async variant of `_call_ai` for the provider's coroutine methods, honouring the AI call limiter."""
+        if self.ai_call_limiter is None:
+            return await self._acall_ai_unlimited(stage, call, *args, **kwargs)
+        async with self.ai_call_limiter:
+            return await self._acall_ai_unlimited(stage, call, *args, **kwargs)
+
+    async def _acall_ai_unlimited(self, stage: str, call: Callable, *args, **kwargs):
+        self._set_progress(stage=stage)
+        self._add_progress(ai_calls_in_flight=1)
+        try:
+            return await call(*args, **kwargs)
+        finally:
+            self._add_progress(ai_calls_in_flight=-1, ai_calls_completed=1)
+
+    # --- Request options ---
+
+    def _configure_preprocessing(self, request: ProcessFolderRequest) -> None:
+        """Apply the request's preprocessing options, falling back to the settings."""
+        self.doc_processor.digital_page_mode = request.digital_page_mode or settings.DIGITAL_PAGE_MODE
+        self.doc_processor.enhancement_profile = request.enhancement_profile or settings.ENHANCEMENT_PROFILE
+
+    def _page_input_prompt(self, prompt: str) -> str:
+        """Extend a prompt that receives page images with the page text note when digital pages may be sent as text."""
+        if self.doc_processor.digital_page_mode == "text":
+            return prompt + prompts.digital_page_text_input_note
+        return prompt
+
+    def _use_map_reduce(self, planned_files: List[Tuple[str, str, str, int]]) -> bool:
+        """Whether the folder should be classified with per-batch page summaries plus a reduce call."""
+        mode = settings.CLASSIFICATION_MODE.lower()
+        if mode == "map_reduce":
+            return True
+        page_count = sum(page_count for _, _, _, page_count in planned_files)
+        return mode == "auto" and page_count > settings.MAP_REDUCE_PAGE_THRESHOLD
+
+    # --- Single-call classification: every page goes to the model in one request ---
+
+    def _classify_single_call(
+        self,
+        request: ProcessFolderRequest,
+        request_id: str,
+        planned_files: List[Tuple[str, str, str, int]]
+    ) -> Optional[ClassifiedDocumentsResponse]:
+        log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
+        prompt_to_use = self._page_input_prompt(prompts.document_clustering_sequencing_classification_si_prompt_multi_pages_3)
+        # Streamed pages are sent as they are produced, after a manifest that already lists every page.
+        page_dedup = None if settings.STREAM_REQUEST_BODY else self._page_deduplicator()
+
+        input_parts, cache_key = self._prepare_inputs(request, request_id, prompt_to_use, planned_files, page_dedup)
+        if not input_parts:
+            return None
+
+        ai_response = self._get_cached_result(cache_key, request_id)
+        if ai_response is None:
+            logger.info("Invoking AI provider for clustering, classification, and sequencing.", extra=log_extra)
+            ai_response = self._call_ai(
+                "classifying",
+                self.ai_provider.cluster_classify_and_sequence,
+                image_parts=input_parts,
+                prompt=prompt_to_use,
+                request_id=request_id
+            )
+            self._expand_duplicates(ai_response, page_dedup)
+            self._store_result(cache_key, ai_response)
+        return ai_response
+
+    async def _aclassify_single_call(
+        self,
+        request: ProcessFolderRequest,
+        request_id: str,
+        planned_files: List[Tuple[str, str, str, int]]
+    ) -> Optional[ClassifiedDocumentsResponse]:
+        log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
+        loop = asyncio.get_running_loop()
+        prompt_to_use = self._page_input_prompt(prompts.document_clustering_sequencing_classification_si_prompt_multi_pages_3)
+        page_dedup = None if settings.STREAM_REQUEST_BODY else self._page_deduplicator()
+
+        input_parts, cache_key = await loop.run_in_executor(None, self._prepare_inputs, request, request_id, prompt_to_use, planned_files, page_dedup)
+        if not input_parts:
+            return None
+
+        ai_response = await loop.run_in_executor(None, self._get_cached_result, cache_key, request_id)
+        if ai_response is None:
+            logger.info("Invoking AI provider for clustering, classification, and sequencing.", extra=log_extra)
+            ai_response = await self._acall_ai(
+                "classifying",
+                self.ai_provider.acluster_classify_and_sequence,
+                image_parts=input_parts,
+                prompt=prompt_to_use,
+                request_id=request_id
+            )
+            self._expand_duplicates(ai_response, page_dedup)
+            await loop.run_in_executor(None, self._store_result, cache_key, ai_response)
+        return ai_response
+
+    def _prepare_inputs(
+        self,
+        request: ProcessFolderRequest,
+        request_id: str,
+        prompt: str,
+        planned_files: List[Tuple[str, str, str, int]],
+        page_dedup: Optional[PageDeduplicator] = None
+    ) -> Tuple[Iterable[Dict], Optional[str]]:
+        """
+        Build the model input parts plus the result cache key for the planned files.
+        With STREAM_REQUEST_BODY the parts are a lazy iterator and pages are only
+        preprocessed while the provider sends them; otherwise the folder is preprocessed
+        here, leaving out pages that `page_dedup` finds to be duplicates.
+        """
+        log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
+        if not planned_files:
+            return [], None
+
+        if settings.STREAM_REQUEST_BODY:
+            page_filenames = self.doc_processor.planned_page_filenames(planned_files)
+            pages = self._iter_pages(planned_files, strict=True)
+            logger.info(f"Streaming {len(page_filenames)} pages into the AI request.", extra=log_extra)
+            cache_key = self._source_result_cache_key(request, page_filenames, planned_files, prompt)
+            return self._iter_input_parts(page_filenames, pages), cache_key
+
+        input_parts = self._build_input_parts(self._iter_unique_pages(self._iter_pages(planned_files), page_dedup))
+        if input_parts:
+            logger.info(f"Preprocessing complete. Found {len(input_parts) - 1} pages.", extra=log_extra)
+        key_prompt = prompt + (page_dedup.cache_key_note() if page_dedup is not None else "")
+        return input_parts, self._result_cache_key(request, input_parts, key_prompt)
+
+    # --- Map-reduce classification: per-batch page summaries, then a text-only clustering call ---
+
+    def _map_reduce_prompts(self) -> Tuple[str, str]:
+        return (
+            self._page_input_prompt(prompts.document_understanding_and_extraction_si_prompt_multi_pages),
+            prompts.document_clustering_sequencing_classification_si_prompt_from_page_summaries
+        )
+
+    def _map_reduce_cache_key(self, request: ProcessFolderRequest, planned_files: List[Tuple[str, str, str, int]]) -> Optional[str]:
+        map_prompt, reduce_prompt = self._map_reduce_prompts()
+        page_filenames = self.doc_processor.planned_page_filenames(planned_files)
+        # The batch size changes what each map call sees, so it is part of the key.
+        key_prompt = f"{map_prompt}{reduce_prompt}<map_batch_size>{settings.MAP_BATCH_SIZE}</map_batch_size>"
+        if settings.PAGE_DEDUP_ENABLED:
+            # Duplicates are a function of the source files and these settings.
+            key_prompt += f"<page_dedup>{settings.PAGE_DEDUP_HASH_SIZE},{settings.PAGE_DEDUP_MAX_DISTANCE},{settings.PAGE_DEDUP_MATCH}</page_dedup>"
+        return self._source_result_cache_key(request, page_filenames, planned_files, key_prompt)
+
+    def _iter_page_batches(self, pages: Iterator[Dict]) -> Iterator[Tuple[List[str], List[Dict]]]:
+        """Group preprocessed pages into (filenames, input parts) batches of MAP_BATCH_SIZE pages."""
+        batch = []
+        for page in pages:
+            batch.append(page)
+            if len(batch) == settings.MAP_BATCH_SIZE:
+                yield [item["filename"] for item in batch], self._build_input_parts(batch)
+                batch = []
+        if batch:
+            yield [item["filename"] for item in batch], self._build_input_parts(batch)
+
+    def _align_page_summaries(self, batch_filenames: List[str], response: PageSummariesResponse) -> List[DocumentPageSummary]:
+        """Return exactly one summary per page of the batch, in page order, so no page drops out of the reduce step."""
+        summaries_by_filename = {summary.filename: summary for summary in response.page_summaries}
+        aligned_summaries = []
+        for filename in batch_filenames:
+            summary = summaries_by_filename.get(filename)
+            if summary is None:
+                logger.warning(f"No page summary returned for {filename}; sending the filename alone to the reduce step.", extra={'request_id': response.request_id})
+                summary = DocumentPageSummary(filename=filename, page_notes="No page summary is available for this page.")
+            aligned_summaries.append(summary)
+        return aligned_summaries
+
+    def _build_reduce_parts(self, page_summaries: List[DocumentPageSummary]) -> List[Dict]:
+        """Text-only input for the reduce call: the page manifest plus the page summaries."""
+        manifest = [{"document_page_image_filename": summary.filename} for summary in page_summaries]
+        summaries_json = json.dumps([summary.model_dump(exclude_none=True) for summary in page_summaries])
+        return [
+            {"type": "text", "text": f'<page_manifest>{json.dumps(manifest)}</page_manifest>'},
+            {"type": "text", "text": f'<page_summaries>{summaries_json}</page_summaries>'}
+        ]
+
+    def _map_reduce_metadata(self, batch_responses: List[PageSummariesResponse], map_latency_ms: float) -> Dict:
+        token_usage = {}
+        for response in batch_responses:
+            for key, value in ((response.processing_metadata or {}).get("token_usage") or {}).items():
+                if isinstance(value, (int, float)):
+                    token_usage[key] = token_usage.get(key, 0) + value
+        return {
+            "batches": len(batch_responses),
+            "batch_size": settings.MAP_BATCH_SIZE,
+            "concurrency": settings.MAP_CONCURRENCY,
+            "map_latency_ms": round(map_latency_ms, 2),
+            "map_token_usage": token_usage
+        }
+
+    def _reduce_page_summaries(
+        self,
+        request_id: str,
+        batches: List[Tuple[List[str], PageSummariesResponse]],
+        map_latency_ms: float
+    ) -> Tuple[List[Dict], Dict]:
+        page_summaries = []
+        for batch_filenames, response in batches:
+            page_summaries.extend(self._align_page_summaries(batch_filenames, response))
+        metadata = self._map_reduce_metadata([response for _, response in batches], map_latency_ms)
+        logger.info(f"Map step produced {len(page_summaries)} page summaries in {len(batches)} batches.", extra={'request_id': request_id, **metadata})
+        return self._build_reduce_parts(page_summaries), metadata
+
+    def _classify_map_reduce(
+        self,
+        request: ProcessFolderRequest,
+        request_id: str,
+        planned_files: List[Tuple[str, str, str, int]]
+    ) -> Optional[ClassifiedDocumentsResponse]:
+        log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
+        if not planned_files:
+            return None
+        map_prompt, reduce_prompt = self._map_reduce_prompts()
+
+        cache_key = self._map_reduce_cache_key(request, planned_files)
+        cached_response = self._get_cached_result(cache_key, request_id)
+        if cached_response is not None:
+            return cached_response
+
+        logger.info(f"Invoking AI provider for page summaries in batches of {settings.MAP_BATCH_SIZE}.", extra=log_extra)
+        start_time = time.perf_counter()
+        page_dedup = self._page_deduplicator()
+        pages = self._iter_unique_pages(self._iter_pages(planned_files), page_dedup)
+        # Map calls start as soon as a batch is preprocessed; the semaphore bounds both
+        # the number of concurrent calls and the number of batches held in memory.
+        in_flight = threading.BoundedSemaphore(settings.MAP_CONCURRENCY)
+        batch_futures = []
+        with ThreadPoolExecutor(max_workers=settings.MAP_CONCURRENCY) as executor:
+            for batch_filenames, batch_parts in self._iter_page_batches(pages):
+                in_flight.acquire()
+                future = executor.submit(self._call_ai, "summarizing", self.ai_provider.summarize_pages, batch_parts, map_prompt, request_id)
+                future.add_done_callback(lambda _: in_flight.release())
+                batch_futures.append((batch_filenames, future))
+            batches = [(batch_filenames, future.result()) for batch_filenames, future in batch_futures]
+        map_latency_ms = (time.perf_counter() - start_time) * 1000
+
+        if not batches:
+            return None
+        reduce_parts, metadata = self._reduce_page_summaries(request_id, batches, map_latency_ms)
+
+        logger.info("Invoking AI provider for clustering, classification, and sequencing of page summaries.", extra=log_extra)
+        ai_response = self._call_ai(
+            "classifying",
+            self.ai_provider.cluster_classify_and_sequence,
+            image_parts=reduce_parts,
+            prompt=reduce_prompt,
+            request_id=request_id
+        )
+        ai_response.processing_metadata = {**(ai_response.processing_metadata or {}), "map_reduce": metadata}
+        self._expand_duplicates(ai_response, page_dedup)
+        self._store_result(cache_key, ai_response)
+        return ai_response
+
+    async def _aclassify_map_reduce(
+        self,
+        request: ProcessFolderRequest,
+        request_id: str,
+        planned_files: List[Tuple[str, str, str, int]]
+    ) -> Optional[ClassifiedDocumentsResponse]:
+        log_extra = {'request_id': request_id, 'folder_path': request.folder_path}
+        if not planned_files:
+            return None
+        loop = asyncio.get_running_loop()
+        map_prompt, reduce_prompt = self._map_reduce_prompts()
+
+        cache_key = await loop.run_in_executor(None, self._map_reduce_cache_key, request, planned_files)
+        cached_response = await loop.run_in_executor(None, self._get_cached_result, cache_key, request_id)
+        if cached_response is not None:
+            return cached_response
+
+        logger.info(f"Invoking AI provider for page summaries in batches of {settings.MAP_BATCH_SIZE}.", extra=log_extra)
+        start_time = time.perf_counter()
+        page_dedup = self._page_deduplicator()
+        batch_iter = self._iter_page_batches(self._iter_unique_pages(self._iter_pages(planned_files), page_dedup))
+        in_flight = asyncio.Semaphore(settings.MAP_CONCURRENCY)
+
+        async def summarize_batch(batch_parts: List[Dict]) -> PageSummariesResponse:
+            try:
+                return await self._acall_ai("summarizing", self.ai_provider.asummarize_pages, batch_parts, map_prompt, request_id)
+            finally:
+                in_flight.release()
+
+        batch_tasks = []
+        try:
+            while True:
+                await in_flight.acquire()
+                # Building a batch preprocesses its pages, so it runs off the event loop.
+                batch = await loop.run_in_executor(None, next, batch_iter, None)
+                if batch is None:
+                    in_flight.release()
+                    break
+                batch_filenames, batch_parts = batch
+                batch_tasks.append((batch_filenames, asyncio.create_task(summarize_batch(batch_parts))))
+            batch_responses = await asyncio.gather(*(task for _, task in batch_tasks))
+        except BaseException:
+            for _, task in batch_tasks:
+                task.cancel()
+            raise
+        batches = [(batch_filenames, response) for (batch_filenames, _), response in zip(batch_tasks, batch_responses)]
+        map_latency_ms = (time.perf_counter() - start_time) * 1000
+
+        if not batches:
+            return None
+        reduce_parts, metadata = self._reduce_page_summaries(request_id, batches, map_latency_ms)
+
+        logger.info("Invoking AI provider for clustering, classification, and sequencing of page summaries.", extra=log_extra)
+        ai_response = await self._acall_ai(
+            "classifying",
+            self.ai_provider.acluster_classify_and_sequence,
+            image_parts=reduce_parts,
+            prompt=reduce_prompt,
+            request_id=request_id
+        )
+        ai_response.processing_metadata = {**(ai_response.processing_metadata or {}), "map_reduce": metadata}
+        self._expand_duplicates(ai_response, page_dedup)
+        await loop.run_in_executor(None, self._store_result, cache_key, ai_response)
+        return ai_response
+
+    # --- Shared helpers ---
+
+    def _page_deduplicator(self) -> Optional[PageDeduplicator]:
+        return PageDeduplicator() if settings.PAGE_DEDUP_ENABLED else None
+
+    def _iter_unique_pages(self, pages: Iterator[Dict], page_dedup: Optional[PageDeduplicator]) -> Iterator[Dict]:
+        """Pass pages through, holding back near-duplicates of earlier pages."""
+        for page in pages:
+            if page_dedup is None or not page_dedup.is_duplicate(page):
+                yield page
+
+    def _expand_duplicates(self, ai_response: ClassifiedDocumentsResponse, page_dedup: Optional[PageDeduplicator]) -> None:
+        """List held-back duplicate pages next to their representatives and report the savings."""
+        if page_dedup is None:
+            return
+        page_dedup.expand(ai_response)
+        dedup_metadata = page_dedup.metadata()
+        ai_response.processing_metadata = {**(ai_response.processing_metadata or {}), "page_dedup": dedup_metadata}
+        if dedup_metadata["duplicate_pages"]:
+            logger.info(
+                f"Sent one page for each of {dedup_metadata['groups']} duplicate groups, holding back {dedup_metadata['duplicate_pages']} pages.",
+                extra={'request_id': ai_response.request_id, 'estimated_tokens_saved': dedup_metadata["estimated_tokens_saved"]}
+            )
+
+    def _empty_response(self, request_id: str) -> ClassifiedDocumentsResponse:
+        return ClassifiedDocumentsResponse(request_id=request_id, documents=[], processing_metadata={"notes": "No files were found to process."})
+
+    def _result_cache_key(self, request: ProcessFolderRequest, input_parts: List[Dict], prompt: str) -> Optional[str]:
+        """Digest of the model inputs, or None when the result cache is disabled or bypassed."""
+        if self.result_cache is None or not request.use_result_cache:
+            return None
+        return compute_result_cache_key(input_parts, prompt)
+
+    def _source_result_cache_key(
+        self,
+        request: ProcessFolderRequest,
+        page_filenames: List[str],
+        planned_files: List[Tuple[str, str, str, int]],
+        prompt: str
+    ) -> Optional[str]:
+        """Result cache key for streamed requests, derived from the source files instead of the page bytes."""
+        if self.result_cache is None or not request.use_result_cache:
+            return None
+        source_digests = [file_digest(filepath) for _, filepath, _, _ in planned_files]
+        return compute_source_result_cache_key(page_filenames, source_digests, prompt, self.doc_processor.page_cache_variant())
+
+    def _get_cached_result(self, cache_key: Optional[str], request_id: str) -> Optional[ClassifiedDocumentsResponse]:
+        """Return a previously stored classification for identical inputs, re-stamped with this request's id."""
+        if cache_key is None:
+            return None
+        try:
+            cached_response = self.result_cache.get(cache_key)
+        except Exception:
+            logger.warning("Result cache lookup failed; calling the AI provider.", extra={'request_id': request_id}, exc_info=True)
+            return None
+        if cached_response is None:
+            return None
+
+        logger.info("Serving classification from the result cache.", extra={'request_id': request_id, 'result_cache_key': cache_key})
+        cached_response.request_id = request_id
+        cached_response.processing_metadata = {"result_cache": {"status": "hit", "key": cache_key}}
+        return cached_response
+
+    def _store_result(self, cache_key: Optional[str], ai_response: ClassifiedDocumentsResponse) -> None:
+        """Store a fresh provider response (before filename mapping) in the result cache."""
+        if cache_key is None:
+            return
+        try:
+            self.result_cache.put(cache_key, ai_response)
+        except Exception:
+            logger.warning("Failed to store result in the result cache.", extra={'request_id': ai_response.request_id}, exc_info=True)
+        ai_response.processing_metadata = {
+            **(ai_response.processing_metadata or {}),
+            "result_cache": {"status": "miss", "key": cache_key}
+        }
+
+    def _attach_preprocessing_metadata(self, ai_response: ClassifiedDocumentsResponse) -> None:
+        """Add the preprocessing stats (timings, page cache hits, ...) to the response metadata."""
+        ai_response.processing_metadata = {
+            **(ai_response.processing_metadata or {}),
+            "preprocessing": self.doc_processor.preprocessing_metadata
+        }
+
+    def _manifest_part(self, page_filenames: List[str]) -> Dict:
+        manifest = [{"document_page_image_filename": filename} for filename in page_filenames]
+        return {"type": "text", "text": f'<image_manifest>{json.dumps(manifest)}</image_manifest>'}
+
+    def _page_part(self, item: Dict) -> Dict:
+        """Content part for one page: its extracted text for text-first digital pages, otherwise its image."""
+        if "text" in item:
+            return {"type": "text", "text": f'<page_text document_page_image_filename="{item["filename"]}">{item["text"]}</page_text>'}
+        return {"type": "image_url", "image_url": f'data:{item["mime_type"]};base64,{item["base64_data"]}'}
+
+    def _build_input_parts(self, pages: Iterable[Dict]) -> List[Dict]:
+        """
+        Prepare the manifest and page parts for the model prompt.
+        Pages are consumed one at a time, so each page's base64 data is released
+        as soon as its data URL has been built. Returns [] when there are no pages.
+        """
+        page_filenames = []
+        page_parts = []
+        for item in pages:
+            page_filenames.append(item["filename"])
+            page_parts.append(self._page_part(item))
+
+        if not page_parts:
+            return []
+        return [self._manifest_part(page_filenames)] + page_parts
+
+    def _iter_input_parts(self, page_filenames: List[str], pages: Iterator[Dict]) -> Iterator[Dict]:
+        """Lazily yield the manifest and then one part per page, as pages are preprocessed."""
+        yield self._manifest_part(page_filenames)
+        for item in pages:
+            yield self._page_part(item)
+
+    def _map_filenames(self, ai_response: ClassifiedDocumentsResponse, mapping_file_path: str) -> None:
+        """Replace page identifiers in the response with the original filenames from the mapping file."""
+        start_time = time.perf_counter()
+        # Built once per mapping file and cached until the file changes
+        filename_index = get_filename_index(mapping_file_path)
+
+        for document in ai_response.documents:
+            document.pages = [filename_index.original_filename(page_id) for page_id in document.pages]
+        metrics.observe_stage("filename_mapping", time.perf_counter() - start_time)
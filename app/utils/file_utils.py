@@ -1,6 +1,9 @@
+import os
 import json
 import logging
-from typing import List, Dict
+from collections import deque
+from functools import lru_cache
+from typing import List, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -40,4 +43,100 @@ def create_random_to_original_filename_lookup(mapping_data: List[Dict]) -> Dict:
         original_name = item.get("original_filename")
         if random_name and original_name:
             lookup[random_name] = original_name
-    return lookup
\ No newline at end of file
+    return lookup
+
+
+class _AhoCorasickMatcher:
+    """
+    Aho-Corasick automaton over a set of patterns, each with a priority.
+    `first_match` returns the lowest priority of any pattern occurring in a text
+    in a single pass over the text, however many patterns there are.
+    """
+
+    def __init__(self, patterns: Dict[str, int]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._best: List[Optional[int]] = [None]
+
+        for pattern, priority in patterns.items():
+            node = 0
+            for char in pattern:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            if self._best[node] is None or priority < self._best[node]:
+                self._best[node] = priority
+
+        # Breadth-first, so each node's failure target is finished before the node itself.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                inherited = self._best[self._fail[child]]
+                if inherited is not None and (self._best[child] is None or inherited < self._best[child]):
+                    self._best[child] = inherited
+
+    def first_match(self, text: str) -> Optional[int]:
+        node, best = 0, None
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            match = self._best[node]
+            if match is not None and (best is None or match < best):
+                best = match
+        return best
+
+class FilenameIndex:
+    """
+    Maps page identifiers back to original filenames.
+    Page identifiers follow the `<random filename>_page_<n>` convention, so most lookups are a
+    single dict hit on the random filename's base name. An exact base name match takes
+    precedence over substring matches, so `file_10.pdf_page_1` maps to `file_10` even when
+    `file_1` comes first in the mapping. Identifiers the model didn't reproduce exactly fall
+    back to a substring search for any base name, where the earliest mapping entry wins, as
+    in a linear scan of the mapping.
+    """
+
+    def __init__(self, lookup: Dict[str, str]):
+        self._originals = list(lookup.values())
+        self._by_base_name: Dict[str, str] = {}
+        patterns: Dict[str, int] = {}
+        for order, (random_name, original_name) in enumerate(lookup.items()):
+            base_name = os.path.splitext(random_name)[0]
+            if not base_name:
+                continue
+            self._by_base_name.setdefault(base_name, original_name)
+            patterns.setdefault(base_name, order)
+        self._matcher = _AhoCorasickMatcher(patterns)
+
+    def __len__(self) -> int:
+        return len(self._originals)
+
+    def original_filename(self, page_id: str, default: str = "NOT_FOUND") -> str:
+        source_name = page_id.rsplit("_page_", 1)[0]
+        original_name = self._by_base_name.get(os.path.splitext(source_name)[0]) or self._by_base_name.get(source_name)
+        if original_name is not None:
+            return original_name
+        order = self._matcher.first_match(page_id)
+        return self._originals[order] if order is not None else default
+
+@lru_cache(maxsize=32)
+def _load_filename_index(file_path: str, mtime_ns: int, size: int) -> FilenameIndex:
+    return FilenameIndex(create_random_to_original_filename_lookup(read_mapping_file(file_path)))
+
+def get_filename_index(file_path: str) -> FilenameIndex:
+    """
+    Returns the FilenameIndex of a mapping file, built once and reused across requests
+    until the file's modification time or size changes.
+    """
+    stat = os.stat(file_path)
+    return _load_filename_index(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
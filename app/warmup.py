@@ -0,0 +1,71 @@
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+class WarmupState:
+    """Progress of the startup warm-up, as reported by the readiness endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.status = "pending"
+        self.steps_ms: Dict[str, float] = {}
+        self.error: Optional[str] = None
+
+    def start(self) -> None:
+        with self._lock:
+            self.status = "running"
+
+    def record(self, step: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self.steps_ms[step] = round(elapsed_ms, 2)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.status = "failed" if error else "ready"
+            self.error = error
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            snapshot = {"status": self.status, "steps_ms": dict(self.steps_ms), "total_ms": round(sum(self.steps_ms.values()), 2)}
+            if self.error:
+                snapshot["error"] = self.error
+            return snapshot
+
+def warm_up(state: WarmupState) -> None:
+    """
+    Do the one-time work the first request would otherwise pay for: import the
+    preprocessing libraries (PyMuPDF, OpenCV, NumPy, PIL, libmagic), preprocess a sample
+    page, and start the process pool when preprocessing runs in one. Blocking; run it
+    in a background thread.
+    """
+    state.start()
+    try:
+        start_time = time.perf_counter()
+        from .services.document_processor import DocumentProcessor, warm_up_process_pool
+        state.record("imports", (time.perf_counter() - start_time) * 1000)
+
+        # Image mode, so rasterization and enhancement are warmed even if requests may choose text pages.
+        processor = DocumentProcessor(use_page_cache=False, digital_page_mode="image", execution_mode="sequential")
+        for step, elapsed_ms in processor.warm_up().items():
+            state.record(step, elapsed_ms)
+
+        if settings.PREPROCESSING_EXECUTION_MODE.lower() == "process_pool":
+            start_time = time.perf_counter()
+            workers = warm_up_process_pool()
+            state.record("process_pool", (time.perf_counter() - start_time) * 1000)
+            logger.info(f"Preprocessing process pool warmed up with {workers} workers.")
+    except Exception as e:
+        logger.error("Startup warm-up failed.", exc_info=True)
+        state.finish(error=f"{type(e).__name__}: {e}")
+        return
+    state.finish()
+    logger.info("Startup warm-up complete.", extra={"warmup": state.snapshot()})
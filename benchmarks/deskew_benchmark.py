@@ -0,0 +1,112 @@
+"""
+Compare the deskew angle estimators on rotated sample pages.
+
+Each sample page is rotated by a set of known angles, and both estimators are asked
+for the correcting rotation. Reports the mean/max absolute error and the mean time
+per estimate, including binarization (and downscaling for the projection estimator).
+
+Usage:
+    python -m benchmarks.deskew_benchmark [--pdf FILE ...] [--angles -10 -5 -2 0 2 5 10] [--scan-artifacts]
+
+Without --pdf, a synthetic text page is generated. Requires the service's settings to
+be loadable (OPENAI_API_KEY / OPENAI_BASE_URL set, or a .env file).
+"""
+import argparse
+import statistics
+import time
+from typing import Dict, List, Tuple
+
+import cv2
+import numpy
+import pymupdf
+
+from app.config import settings
+from app.services.document_processor import DocumentProcessor
+
+ESTIMATORS = ("min_area_rect", "projection")
+
+def synthetic_page(width: int = 1654, height: int = 2339) -> numpy.ndarray:
+    """A white A4 page at 200 DPI with a header and paragraphs of text lines."""
+    page = numpy.full((height, width), 255, dtype=numpy.uint8)
+    cv2.putText(page, "COMMERCIAL INVOICE", (150, 220), cv2.FONT_HERSHEY_SIMPLEX, 2.2, 0, 5)
+    rng = numpy.random.default_rng(7)
+    y = 360
+    while y < height - 200:
+        words = rng.integers(6, 12)
+        line = " ".join("".join(chr(c) for c in rng.integers(97, 123, rng.integers(2, 9))) for _ in range(words))
+        cv2.putText(page, line, (150, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        y += 55 if rng.random() > 0.15 else 120
+    return page
+
+def pdf_pages(path: str) -> List[numpy.ndarray]:
+    scaling_factor = settings.TARGET_DPI / settings.DEFAULT_DPI
+    pages = []
+    with pymupdf.open(path) as doc:
+        for page in doc:
+            pix = page.get_pixmap(matrix=pymupdf.Matrix(scaling_factor, scaling_factor), colorspace=pymupdf.csGRAY)
+            pages.append(numpy.frombuffer(pix.samples, dtype=numpy.uint8).reshape(pix.height, pix.width).copy())
+    return pages
+
+def rotate(page: numpy.ndarray, angle: float) -> numpy.ndarray:
+    (h, w) = page.shape
+    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    return cv2.warpAffine(page, M, (w, h), flags=cv2.INTER_CUBIC, borderValue=255)
+
+def add_scan_artifacts(page: numpy.ndarray, rng: numpy.random.Generator) -> numpy.ndarray:
+    """Scanner noise plus a dark shadow along the left edge, in the scanner's (unrotated) frame."""
+    noisy = page.astype(numpy.float32) + rng.normal(0, 12, page.shape)
+    noisy[:, :40] = rng.normal(40, 10, (page.shape[0], 40))
+    return numpy.clip(noisy, 0, 255).astype(numpy.uint8)
+
+def run(pages: List[numpy.ndarray], angles: List[float], repeats: int, scan_artifacts: bool) -> Dict[str, Dict]:
+    processor = DocumentProcessor(use_page_cache=False)
+    rng = numpy.random.default_rng(0)
+    samples = []
+    for page in pages:
+        for angle in angles:
+            sample = rotate(page, angle)
+            samples.append((angle, add_scan_artifacts(sample, rng) if scan_artifacts else sample))
+
+    results = {}
+    for estimator in ESTIMATORS:
+        settings.SKEW_ESTIMATOR = estimator
+        errors, timings_ms = [], []
+        for angle, sample in samples:
+            estimate = None
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                estimate = processor._estimate_skew(sample)
+                timings_ms.append((time.perf_counter() - start_time) * 1000)
+            # Undoing a rotation by `angle` takes a rotation by `-angle`.
+            errors.append(abs((estimate if estimate is not None else 0.0) + angle))
+        results[estimator] = {
+            "samples": len(errors),
+            "mean_abs_error_deg": round(statistics.mean(errors), 3),
+            "max_abs_error_deg": round(max(errors), 3),
+            "within_threshold": sum(error <= settings.SMALL_ANGLE_THRESHOLD for error in errors),
+            "mean_ms": round(statistics.mean(timings_ms), 2),
+        }
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDF files whose pages are used as samples.")
+    parser.add_argument("--angles", nargs="*", type=float, default=[-12, -8, -5, -3, -1, 0, 1, 3, 5, 8, 12])
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per sample.")
+    parser.add_argument("--scan-artifacts", action="store_true", help="Add scanner noise and an edge shadow to every sample.")
+    args = parser.parse_args()
+
+    pages = [page for path in args.pdf for page in pdf_pages(path)] or [synthetic_page()]
+    results = run(pages, args.angles, args.repeats, args.scan_artifacts)
+
+    artifacts = ", with scan artifacts" if args.scan_artifacts else ""
+    print(f"{len(pages)} page(s) x {len(args.angles)} angle(s), {args.repeats} timed run(s) each{artifacts}")
+    print(f"{'estimator':<15}{'mean err (deg)':>16}{'max err (deg)':>15}{'within thr':>12}{'mean ms':>10}")
+    for estimator, result in results.items():
+        print(
+            f"{estimator:<15}{result['mean_abs_error_deg']:>16}{result['max_abs_error_deg']:>15}"
+            f"{result['within_threshold']:>8}/{result['samples']:<3}{result['mean_ms']:>10}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Report where import time goes for the service's entry points, and check it against a budget.
+
+Each module is imported in a fresh interpreter with `python -X importtime`. The report
+lists its total import time, the heaviest top-level packages (by self time summed over
+their submodules), and whether any of the heavy dependencies that are meant to be
+deferred to first use or the startup warm-up got imported anyway.
+
+Usage:
+    python -m benchmarks.import_budget [--module app.main --budget-ms 800] [--repeats 3] [--output report.json]
+
+Exits with status 1 if a module's median import time exceeds its budget or a deferred
+dependency is imported eagerly, so it can run in CI.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional
+
+# Module imported -> (budget in ms, dependencies that must not be imported with it).
+DEFAULT_BUDGETS = {
+    # What a web worker imports before it can listen; heavy libraries load in the warm-up.
+    "app.main": (800.0, ("openai", "pymupdf", "cv2", "numpy", "PIL", "magic")),
+    # What each process-pool worker imports before it can take a page.
+    "app.services.document_processor": (1000.0, ("openai", "fastapi")),
+}
+
+def import_times(module: str) -> List[Dict]:
+    """Parse the `-X importtime` report of importing `module` in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_column, cumulative_column, name = line.split("|")
+        entries.append({"name": name.strip(), "self_us": int(self_column.split(":")[1]), "cumulative_us": int(cumulative_column)})
+    return entries
+
+def measure(module: str, budget_ms: float, deferred: tuple, repeats: int, top: int) -> Dict:
+    runs = [import_times(module) for _ in range(repeats)]
+    totals_ms = [next(entry["cumulative_us"] for entry in entries if entry["name"] == module) / 1000 for entries in runs]
+    median_ms = statistics.median(totals_ms)
+
+    # Self time per top-level package, from the run closest to the median.
+    entries = runs[min(range(repeats), key=lambda index: abs(totals_ms[index] - median_ms))]
+    packages: Dict[str, int] = {}
+    for entry in entries:
+        package = entry["name"].split(".")[0]
+        packages[package] = packages.get(package, 0) + entry["self_us"]
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    imported = {entry["name"].split(".")[0] for entry in entries}
+    eager = sorted(dependency for dependency in deferred if dependency in imported)
+
+    return {
+        "module": module,
+        "median_ms": round(median_ms, 1),
+        "runs_ms": [round(total, 1) for total in totals_ms],
+        "budget_ms": budget_ms,
+        "within_budget": median_ms <= budget_ms,
+        "eagerly_imported": eager,
+        "heaviest_packages_ms": {package: round(self_us / 1000, 1) for package, self_us in heaviest}
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="module to check (default: the service entry points)")
+    parser.add_argument("--budget-ms", type=float, help="budget for the modules given with --module")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="heaviest packages to list")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    budgets = DEFAULT_BUDGETS
+    if args.module:
+        budgets = {module: DEFAULT_BUDGETS.get(module, (float("inf"), ())) for module in args.module}
+    if args.budget_ms is not None:
+        budgets = {module: (args.budget_ms, deferred) for module, (_, deferred) in budgets.items()}
+
+    report = [measure(module, budget_ms, deferred, args.repeats, args.top) for module, (budget_ms, deferred) in budgets.items()]
+    for result in report:
+        verdict = "ok" if result["within_budget"] and not result["eagerly_imported"] else "OVER BUDGET" if not result["within_budget"] else "EAGER IMPORTS"
+        print(f"{result['module']}: {result['median_ms']} ms (budget {result['budget_ms']} ms) {verdict}")
+        if result["eagerly_imported"]:
+            print(f"  imported eagerly: {', '.join(result['eagerly_imported'])}")
+        for package, self_ms in result["heaviest_packages_ms"].items():
+            print(f"  {package:<24}{self_ms:>9.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if all(result["within_budget"] and not result["eagerly_imported"] for result in report) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Compare the legacy file ingestion with the single-pass ingestion layer.
+
+Builds a folder of image-heavy PDFs and PNG scans, then ingests it the way preprocessing
+does (type detection, page count, optional content digests, opening every page) with:
+
+- legacy: magic.from_file, a full read into `bytes` + pymupdf.open(stream=...), and a
+          chunked digest per cache (page cache and result cache);
+- path:   header-buffer type detection, PDFs opened by path and memoized digests;
+- mmap:   the same with INGESTION_MMAP_ENABLED (PDFs and digests through memory maps).
+
+Rasterization and enhancement are left out, so the numbers isolate ingestion. Each run
+happens in a fresh process and reports wall time, read syscalls and bytes read (from
+/proc/self/io), page faults (memory-mapped reads show up here instead), the Python heap
+peak (tracemalloc) and the peak RSS growth (VmHWM).
+
+Usage:
+    python -m benchmarks.ingestion_benchmark [--files 10] [--pages 4] [--images 4] [--digests] [--repeats 3]
+
+Requires Linux (/proc) and the service's settings to be loadable (OPENAI_API_KEY /
+OPENAI_BASE_URL set, or a .env file).
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+import cv2
+import magic
+import numpy
+import pymupdf
+from PIL import Image
+
+from app.config import settings
+from app.services.file_ingestion import detect_mime_type, file_digest, open_pdf
+
+VARIANTS = ("legacy", "path", "mmap")
+
+def build_folder(folder: str, files: int, pages: int, images: int) -> int:
+    """Write `files` PDFs of `pages` scanned-looking pages plus `images` PNG scans. Returns total bytes."""
+    rng = numpy.random.default_rng(11)
+    for file_index in range(files):
+        with pymupdf.open() as doc:
+            for _ in range(pages):
+                scan = rng.normal(200, 30, (1400, 1000)).clip(0, 255).astype(numpy.uint8)
+                ok, png = cv2.imencode(".png", scan)
+                page = doc.new_page(width=595, height=842)
+                page.insert_image(page.rect, stream=png.tobytes())
+            doc.save(os.path.join(folder, f"doc_{file_index:03d}.pdf"))
+    for image_index in range(images):
+        scan = rng.normal(200, 30, (1400, 1000)).clip(0, 255).astype(numpy.uint8)
+        cv2.imwrite(os.path.join(folder, f"scan_{image_index:03d}.png"), scan)
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+
+def legacy_digest(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def ingest_legacy(folder: str, digests: bool) -> int:
+    pages = 0
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        mime_type = magic.from_file(path, mime=True)
+        if mime_type == "application/pdf":
+            with pymupdf.open(path) as doc:
+                page_count = doc.page_count
+        if digests:
+            legacy_digest(path)
+            legacy_digest(path)
+        if mime_type == "application/pdf":
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+                for page_index in range(page_count):
+                    doc.load_page(page_index).get_images()
+                    pages += 1
+        else:
+            Image.open(path).convert("RGB")
+            pages += 1
+    return pages
+
+def ingest_current(folder: str, digests: bool) -> int:
+    pages = 0
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        mime_type = detect_mime_type(path)
+        if mime_type == "application/pdf":
+            with open_pdf(path) as doc:
+                page_count = doc.page_count
+        if digests:
+            file_digest(path)
+            file_digest(path)
+        if mime_type == "application/pdf":
+            with open_pdf(path) as doc:
+                for page_index in range(page_count):
+                    doc.load_page(page_index).get_images()
+                    pages += 1
+        else:
+            Image.open(path).convert("RGB")
+            pages += 1
+    return pages
+
+def _proc_io() -> Dict[str, int]:
+    with open("/proc/self/io") as f:
+        return {key: int(value) for key, value in (line.split(": ") for line in f)}
+
+def _page_faults() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_minflt + usage.ru_majflt
+
+def _peak_rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+def measure(variant: str, folder: str, digests: bool) -> Dict:
+    """Run one variant; meant to be called in a fresh process."""
+    ingest = ingest_legacy if variant == "legacy" else ingest_current
+    settings.INGESTION_MMAP_ENABLED = variant == "mmap"
+    rss_before = _peak_rss_kb()
+    faults_before = _page_faults()
+    io_before = _proc_io()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    pages = ingest(folder, digests)
+    elapsed = time.perf_counter() - start_time
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    io_after = _proc_io()
+    return {
+        "pages": pages,
+        "ms": elapsed * 1000,
+        "read_syscalls": io_after["syscr"] - io_before["syscr"],
+        "read_mb": (io_after["rchar"] - io_before["rchar"]) / 1e6,
+        "page_faults": _page_faults() - faults_before,
+        "heap_peak_mb": heap_peak / 1e6,
+        "rss_growth_mb": (_peak_rss_kb() - rss_before) / 1e3
+    }
+
+def run(folder: str, digests: bool, repeats: int) -> Dict[str, Dict]:
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        for variant in VARIANTS:
+            runs = [pool.apply(measure, (variant, folder, digests)) for _ in range(repeats)]
+            results[variant] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    return results
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10, help="PDFs to generate")
+    parser.add_argument("--pages", type=int, default=4, help="pages per PDF")
+    parser.add_argument("--images", type=int, default=4, help="PNG scans to generate")
+    parser.add_argument("--digests", action="store_true", help="also compute content digests, as when the page and result caches are enabled")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as folder:
+        total_bytes = build_folder(folder, args.files, args.pages, args.images)
+        print(f"{args.files} PDFs x {args.pages} pages + {args.images} PNGs, {total_bytes / 1e6:.1f} MB, digests={'on' if args.digests else 'off'}")
+        results = run(folder, args.digests, args.repeats)
+
+    print(f"{'variant':<8} {'pages':>6} {'ms':>9} {'read syscalls':>14} {'MB read':>9} {'page faults':>12} {'heap peak MB':>13} {'RSS growth MB':>14}")
+    for variant, stats in results.items():
+        print(
+            f"{variant:<8} {stats['pages']:>6.0f} {stats['ms']:>9.1f} {stats['read_syscalls']:>14.0f} "
+            f"{stats['read_mb']:>9.1f} {stats['page_faults']:>12.0f} {stats['heap_peak_mb']:>13.1f} {stats['rss_growth_mb']:>14.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Benchmark the preprocessing and workflow hot paths on a synthetic corpus.
+
+Generates digital PDFs (text layer), scanned PDFs (noisy, slightly rotated page images)
+and PNG/JPEG scans, then runs two scenarios, each in a fresh process:
+
+- stages:   `_get_file_mime_type` per file, and rasterize / enhance / encode / base64 (plus
+            text extraction and hashing) per page, from the page timings preprocessing
+            records;
+- workflow: `WorkflowService.process_folder` end to end against a stub AI provider that
+            answers after a simulated latency.
+
+Reports per-stage latency (mean, p50, p95, max) and throughput, and the peak RSS of each
+scenario. Results, with the corpus, settings and library versions they were measured
+with, are written as JSON so runs can be compared:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --set TARGET_DPI=150 --output after.json --compare before.json
+
+--set overrides service settings (as environment variables) in the benchmark processes.
+Requires Linux (/proc) and the service's settings to be loadable (OPENAI_API_KEY /
+OPENAI_BASE_URL set, or a .env file).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Dict, Iterable, List, Optional
+
+import cv2
+import numpy
+import pymupdf
+
+from app.schemas import ClassifiedDocument, ClassifiedDocumentsResponse, DocumentPageSummary, PageSummariesResponse, ProcessFolderRequest
+from app.services.ai_provider_interface import AIProviderInterface
+from benchmarks.deskew_benchmark import add_scan_artifacts, rotate, synthetic_page
+
+SCENARIOS = ("stages", "workflow")
+
+# Settings recorded with every run, as they change what the hot paths do.
+RECORDED_SETTINGS = (
+    "TARGET_DPI", "DEFAULT_IMAGE_FORMAT", "ENHANCEMENT_PROFILE", "DIGITAL_PAGE_MODE", "RASTERIZE_GRAYSCALE",
+    "PREPROCESSING_EXECUTION_MODE", "CLASSIFICATION_MODE", "MAP_BATCH_SIZE", "STREAM_REQUEST_BODY",
+    "PAGE_CACHE_ENABLED", "PAGE_DEDUP_ENABLED"
+)
+
+# --- Corpus ---
+
+def _digital_pdf(path: str, pages: int, rng: numpy.random.Generator) -> None:
+    with pymupdf.open() as doc:
+        for page_index in range(pages):
+            page = doc.new_page(width=595, height=842)
+            page.insert_text((60, 70), f"COMMERCIAL INVOICE {rng.integers(10000, 99999)}", fontsize=16)
+            y = 110
+            while y < 780:
+                words = rng.integers(6, 12)
+                line = " ".join("".join(chr(c) for c in rng.integers(97, 123, rng.integers(2, 9))) for _ in range(words))
+                page.insert_text((60, y), line, fontsize=10)
+                y += 16 if rng.random() > 0.15 else 34
+            page.insert_text((60, 810), f"Page {page_index + 1} of {pages}", fontsize=8)
+        doc.save(path)
+
+def _scanned_page(rng: numpy.random.Generator) -> numpy.ndarray:
+    return add_scan_artifacts(rotate(synthetic_page(), float(rng.uniform(-3, 3))), rng)
+
+def _scanned_pdf(path: str, pages: int, rng: numpy.random.Generator) -> None:
+    with pymupdf.open() as doc:
+        for _ in range(pages):
+            ok, jpeg = cv2.imencode(".jpg", _scanned_page(rng), [cv2.IMWRITE_JPEG_QUALITY, 80])
+            page = doc.new_page(width=595, height=842)
+            page.insert_image(page.rect, stream=jpeg.tobytes())
+        doc.save(path)
+
+def build_corpus(folder: str, digital_pdfs: int, scanned_pdfs: int, images: int, pages: int) -> Dict:
+    """Write the synthetic corpus (the same for the same arguments) and describe it."""
+    rng = numpy.random.default_rng(23)
+    for file_index in range(digital_pdfs):
+        _digital_pdf(os.path.join(folder, f"digital_{file_index:03d}.pdf"), pages, rng)
+    for file_index in range(scanned_pdfs):
+        _scanned_pdf(os.path.join(folder, f"scanned_{file_index:03d}.pdf"), pages, rng)
+    for image_index in range(images):
+        extension = "png" if image_index % 2 == 0 else "jpg"
+        cv2.imwrite(os.path.join(folder, f"scan_{image_index:03d}.{extension}"), _scanned_page(rng))
+    return {
+        "digital_pdfs": digital_pdfs,
+        "scanned_pdfs": scanned_pdfs,
+        "images": images,
+        "pages_per_pdf": pages,
+        "pages": (digital_pdfs + scanned_pdfs) * pages + images,
+        "bytes": sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+    }
+
+# --- Stub provider ---
+
+class StubAIProvider(AIProviderInterface):
+    """
+    Answers like the model would, after `latency_s` plus `per_page_latency_s` per page:
+    every source file becomes one document with its pages in order. The request parts
+    are consumed first, as a real provider consumes them to build the request body.
+    """
+
+    def __init__(self, latency_s: float = 0.0, per_page_latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.per_page_latency_s = per_page_latency_s
+
+    def _consume(self, image_parts: Iterable[Dict]) -> List[str]:
+        filenames = []
+        for part in image_parts:
+            text = part.get("text", "")
+            for tag in ("image_manifest", "page_manifest"):
+                if text.startswith(f"<{tag}>"):
+                    manifest = json.loads(text[len(tag) + 2:-(len(tag) + 3)])
+                    filenames = [entry["document_page_image_filename"] for entry in manifest]
+        time.sleep(self.latency_s + self.per_page_latency_s * len(filenames))
+        return filenames
+
+    def cluster_classify_and_sequence(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> ClassifiedDocumentsResponse:
+        documents: Dict[str, List[str]] = {}
+        for filename in self._consume(image_parts):
+            documents.setdefault(filename.rsplit("_page_", 1)[0], []).append(filename)
+        return ClassifiedDocumentsResponse(
+            request_id=request_id,
+            documents=[
+                ClassifiedDocument(document_id=str(index), document_type="INVOICE", pages=pages)
+                for index, pages in enumerate(documents.values())
+            ]
+        )
+
+    def summarize_pages(self, image_parts: Iterable[Dict], prompt: str, request_id: str) -> PageSummariesResponse:
+        return PageSummariesResponse(
+            request_id=request_id,
+            page_summaries=[DocumentPageSummary(filename=filename) for filename in self._consume(image_parts)]
+        )
+
+# --- Measurements (run in fresh processes) ---
+
+def _peak_rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+def latency_stats(samples_ms: List[float]) -> Dict:
+    """Mean, p50, p95 and max of latency samples, and the throughput they amount to."""
+    ordered = sorted(samples_ms)
+    p95 = statistics.quantiles(ordered, n=20, method="inclusive")[18] if len(ordered) > 1 else ordered[0]
+    mean_ms = statistics.mean(ordered)
+    return {
+        "samples": len(ordered),
+        "mean_ms": round(mean_ms, 3),
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(p95, 3),
+        "max_ms": round(ordered[-1], 3),
+        "per_s": round(1000 / mean_ms, 2) if mean_ms else None
+    }
+
+def measure_stages(folder: str, repeats: int) -> Dict:
+    from app.services.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor(execution_mode="sequential", use_page_cache=False)
+    filenames = sorted(os.listdir(folder))
+    rss_before = _peak_rss_kb()
+
+    mime_ms = []
+    for _ in range(repeats):
+        for filename in filenames:
+            start_time = time.perf_counter()
+            processor._get_file_mime_type(os.path.join(folder, filename))
+            mime_ms.append((time.perf_counter() - start_time) * 1000)
+
+    stage_ms: Dict[str, List[float]] = {}
+    total_ms: Dict[str, List[float]] = {}
+    folder_ms = []
+    pages = 0
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        preprocessed = processor.preprocess_folder(folder)
+        folder_ms.append((time.perf_counter() - start_time) * 1000)
+        pages = len(preprocessed)
+        for page in preprocessed:
+            for stage, value in page["timings_ms"].items():
+                if stage == "total":
+                    total_ms.setdefault(page["classification"], []).append(value)
+                else:
+                    stage_ms.setdefault(stage, []).append(value)
+
+    return {
+        "pages": pages,
+        "mime_type": latency_stats(mime_ms),
+        "page_stages": {stage: latency_stats(samples) for stage, samples in stage_ms.items()},
+        "page_total_by_classification": {classification: latency_stats(samples) for classification, samples in total_ms.items()},
+        "folder": latency_stats(folder_ms),
+        "pages_per_s": round(pages * len(folder_ms) / (sum(folder_ms) / 1000), 2),
+        "peak_rss_mb": round(_peak_rss_kb() / 1e3, 1),
+        "rss_growth_mb": round((_peak_rss_kb() - rss_before) / 1e3, 1)
+    }
+
+def measure_workflow(folder: str, repeats: int, latency_s: float, per_page_latency_s: float) -> Dict:
+    from app.services.workflow_service import WorkflowService
+
+    provider = StubAIProvider(latency_s, per_page_latency_s)
+    rss_before = _peak_rss_kb()
+    folder_ms = []
+    pages = 0
+    payload_bytes = None
+    for run_index in range(repeats):
+        workflow = WorkflowService(provider)
+        start_time = time.perf_counter()
+        response = workflow.process_folder(ProcessFolderRequest(folder_path=folder, use_result_cache=False), f"benchmark-{run_index}")
+        folder_ms.append((time.perf_counter() - start_time) * 1000)
+        pages = sum(len(document.pages) for document in response.documents)
+        payload_bytes = response.processing_metadata.get("preprocessing", {}).get("payload_bytes")
+
+    return {
+        "pages": pages,
+        "payload_bytes": payload_bytes,
+        "folder": latency_stats(folder_ms),
+        "pages_per_s": round(pages * len(folder_ms) / (sum(folder_ms) / 1000), 2),
+        "peak_rss_mb": round(_peak_rss_kb() / 1e3, 1),
+        "rss_growth_mb": round((_peak_rss_kb() - rss_before) / 1e3, 1)
+    }
+
+def measure(scenario: str, folder: str, repeats: int, latency_s: float, per_page_latency_s: float) -> Dict:
+    """Run one scenario; meant to be called in a fresh process."""
+    from app.config import settings
+
+    if scenario == "stages":
+        result = measure_stages(folder, repeats)
+    else:
+        result = measure_workflow(folder, repeats, latency_s, per_page_latency_s)
+    result["settings"] = {name: getattr(settings, name) for name in RECORDED_SETTINGS if hasattr(settings, name)}
+    return result
+
+# --- Reporting ---
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pymupdf": pymupdf.VersionBind,
+        "opencv": cv2.__version__,
+        "numpy": numpy.__version__,
+        "git_commit": commit
+    }
+
+def _flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a results tree keyed by their dotted path, for comparisons."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+def compare(baseline: Dict, current: Dict) -> List[Dict]:
+    """Relative change of the mean and p95 latencies, page throughput and memory figures present in both runs."""
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    changes = []
+    for path in sorted(old.keys() & new.keys()):
+        if path.endswith(("mean_ms", "p95_ms", "pages_per_s", "_mb")) and old[path]:
+            changes.append({"metric": path, "baseline": old[path], "current": new[path], "change_pct": round((new[path] - old[path]) / old[path] * 100, 1)})
+    return changes
+
+def print_summary(report: Dict) -> None:
+    corpus = report["corpus"]
+    print(
+        f"{corpus['pages']} pages ({corpus['digital_pdfs']} digital + {corpus['scanned_pdfs']} scanned PDFs x "
+        f"{corpus['pages_per_pdf']} pages, {corpus['images']} images), {corpus['bytes'] / 1e6:.1f} MB"
+    )
+    print(f"{'metric':<34}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'per s':>10}")
+    for scenario, result in report["results"].items():
+        rows = {}
+        if scenario == "stages":
+            rows["mime_type"] = result["mime_type"]
+            rows.update({f"page.{stage}": stats for stage, stats in result["page_stages"].items()})
+            rows.update({f"page.total.{classification}": stats for classification, stats in result["page_total_by_classification"].items()})
+        rows["folder"] = result["folder"]
+        for name, stats in rows.items():
+            print(
+                f"{scenario + '.' + name:<34}{stats['mean_ms']:>10.2f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                f"{stats['max_ms']:>10.2f}{stats['per_s'] or 0:>10.2f}"
+            )
+        print(f"{scenario}: {result['pages_per_s']} pages/s, peak RSS {result['peak_rss_mb']} MB (+{result['rss_growth_mb']} MB)")
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--digital-pdfs", type=int, default=2)
+    parser.add_argument("--scanned-pdfs", type=int, default=2)
+    parser.add_argument("--images", type=int, default=2)
+    parser.add_argument("--pages", type=int, default=2, help="pages per PDF")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs of each scenario")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds per stub AI call")
+    parser.add_argument("--per-page-latency", type=float, default=0.0, help="simulated extra seconds per page in a stub AI call")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="KEY=VALUE", help="override a service setting")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE_JSON", help="print the relative change against an earlier results file")
+    args = parser.parse_args(argv)
+
+    overrides = dict(override.split("=", 1) for override in args.overrides)
+    # Settings are read from the environment when the benchmark processes import the app.
+    os.environ.update(overrides)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "overrides": overrides,
+        "parameters": {"repeats": args.repeats, "latency_s": args.latency, "per_page_latency_s": args.per_page_latency},
+        "results": {}
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        report["corpus"] = build_corpus(folder, args.digital_pdfs, args.scanned_pdfs, args.images, args.pages)
+        for scenario in args.scenarios:
+            # A fresh process per scenario, so peak RSS belongs to that scenario alone.
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn"), max_tasks_per_child=1) as executor:
+                report["results"][scenario] = executor.submit(measure, scenario, folder, args.repeats, args.latency, args.per_page_latency).result()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"{'metric':<60}{'baseline':>12}{'current':>12}{'change %':>10}")
+        for change in compare(baseline, report):
+            print(f"{change['metric']:<60}{change['baseline']:>12}{change['current']:>12}{change['change_pct']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from app.services.admission_control import AdmissionController
+from app.services.ai_provider_interface import AIProviderOverloadedError
+
+def test_cancelled_waiter_leaves_the_queue():
+    controller = AdmissionController(max_concurrency=1)
+
+    async def run():
+        await controller.aacquire(10)
+        waiter = asyncio.create_task(controller.aacquire(10))
+        await asyncio.sleep(0.05)
+        assert controller.stats()["queue_depth"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
+    stats = controller.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["in_flight"] == 1
+    assert stats["admitted"] == 1
+
+def test_rejected_and_admitted_waiters_leave_the_queue():
+    controller = AdmissionController(max_concurrency=1, max_wait_seconds=0.1)
+    controller.acquire(10)
+    with pytest.raises(AIProviderOverloadedError):
+        controller.acquire(10)
+    controller.release(10)
+    controller.acquire(10)
+
+    stats = controller.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["rejected"] == 1
+    assert stats["admitted"] == 2
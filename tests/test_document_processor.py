@@ -0,0 +1,75 @@
+import os
+
+import pymupdf
+import pytest
+
+from app.services.document_processor import DocumentProcessor
+
+def write_pdf(path: str, pages: int) -> None:
+    with pymupdf.open() as doc:
+        for page_index in range(pages):
+            page = doc.new_page(width=200, height=280)
+            page.insert_text((20, 40), f"{os.path.basename(path)} page {page_index + 1}", fontsize=10)
+        doc.save(path)
+
+@pytest.fixture
+def folder(tmp_path):
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        write_pdf(str(tmp_path / name), 3)
+    return str(tmp_path)
+
+@pytest.fixture
+def failing_page(monkeypatch):
+    """Make page 2 of b.pdf fail to render."""
+    render = DocumentProcessor._render_pdf_page
+
+    def render_or_fail(self, page):
+        if page.parent.name.endswith("b.pdf") and page.number == 1:
+            raise RuntimeError("corrupt page")
+        return render(self, page)
+
+    monkeypatch.setattr(DocumentProcessor, "_render_pdf_page", render_or_fail)
+
+@pytest.mark.parametrize("execution_mode", ["sequential", "pipeline"])
+def test_file_with_a_failing_page_is_skipped_as_a_whole(folder, failing_page, execution_mode):
+    processor = DocumentProcessor(use_page_cache=False, enhancement_profile="none", execution_mode=execution_mode)
+
+    pages = processor.preprocess_folder(folder)
+
+    assert [page["filename"] for page in pages] == [
+        "a.pdf_page_1", "a.pdf_page_2", "a.pdf_page_3",
+        "c.pdf_page_1", "c.pdf_page_2", "c.pdf_page_3"
+    ]
+
+@pytest.mark.parametrize("execution_mode", ["sequential", "pipeline"])
+def test_strict_preprocessing_raises_on_the_failing_page(folder, failing_page, execution_mode):
+    processor = DocumentProcessor(use_page_cache=False, enhancement_profile="none", execution_mode=execution_mode)
+    produced = []
+
+    with pytest.raises(RuntimeError, match="corrupt page"):
+        for page in processor.iter_preprocess_folder(processor.plan_folder(folder), strict=True):
+            produced.append(page["filename"])
+
+    # Strict (streaming) preprocessing hands pages over as they are produced.
+    assert produced == ["a.pdf_page_1", "a.pdf_page_2", "a.pdf_page_3", "b.pdf_page_1"]
+
+@pytest.mark.parametrize("execution_mode", ["sequential", "pipeline"])
+def test_pixmaps_are_released_before_pages_are_finished(tmp_path, monkeypatch, execution_mode):
+    with pymupdf.open() as doc:
+        for _ in range(2):
+            doc.new_page(width=200, height=280).draw_rect(pymupdf.Rect(20, 20, 120, 120), fill=(0, 0, 0))
+        doc.save(str(tmp_path / "scan.pdf"))
+    finish = DocumentProcessor._finish_page
+    finished = []
+
+    def record_finish(self, rendered):
+        finished.append(rendered.get("pix"))
+        return finish(self, rendered)
+
+    monkeypatch.setattr(DocumentProcessor, "_finish_page", record_finish)
+    processor = DocumentProcessor(use_page_cache=False, enhancement_profile="none", execution_mode=execution_mode)
+
+    pages = processor.preprocess_folder(str(tmp_path))
+
+    assert len(pages) == 2
+    assert finished == [None, None]
@@ -0,0 +1,20 @@
+from app.utils.file_utils import FilenameIndex
+
+LOOKUP = {
+    "file_1.pdf": "first.pdf",
+    "file_10.pdf": "tenth.pdf",
+    "scan_7.png": "photo.png"
+}
+
+def test_exact_base_name_takes_precedence_over_earlier_substring_match():
+    index = FilenameIndex(LOOKUP)
+    assert index.original_filename("file_10.pdf_page_2") == "tenth.pdf"
+    assert index.original_filename("file_10_page_2") == "tenth.pdf"
+    assert index.original_filename("file_1.pdf_page_3") == "first.pdf"
+
+def test_inexact_identifiers_fall_back_to_earliest_substring_match():
+    index = FilenameIndex(LOOKUP)
+    # Both file_1 and file_10 occur in the identifier; the earlier mapping entry wins.
+    assert index.original_filename("page 2 of file_10.pdf") == "first.pdf"
+    assert index.original_filename("scan_7.png (page 1)") == "photo.png"
+    assert index.original_filename("unknown.pdf_page_1") == "NOT_FOUND"
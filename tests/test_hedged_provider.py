@@ -0,0 +1,46 @@
+import asyncio
+from collections import deque
+
+from app.config import settings
+from app.services.admission_control import AdmissionController
+from app.services.hedged_provider import HedgedAIProvider
+from app.services.mock_provider import MockAIProvider, MockModel
+from app.services.rate_limited_provider import RateLimitedAIProvider
+
+class FixedLatencyModel(MockModel):
+    def __init__(self, seconds: float):
+        super().__init__(seed=0)
+        self.seconds = seconds
+
+    def latency(self, pages: int) -> float:
+        return self.seconds
+
+def test_cancelled_hedge_loser_releases_its_admission_slot(monkeypatch):
+    monkeypatch.setattr(settings, "MOCK_AI_ERROR_RATE", 0.0)
+    monkeypatch.setattr(settings, "MOCK_AI_RATE_LIMIT_RATE", 0.0)
+    monkeypatch.setattr(settings, "HEDGE_MIN_SAMPLES", 1)
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "HEDGE_PERCENTILE", 0.0)
+    monkeypatch.setattr(settings, "HEDGE_MAX_EXTRA_TOKEN_RATIO", 1000.0)
+
+    controller = AdmissionController(max_concurrency=4)
+    provider = HedgedAIProvider(
+        RateLimitedAIProvider(MockAIProvider(model=FixedLatencyModel(0.5)), controller),
+        RateLimitedAIProvider(MockAIProvider(model=FixedLatencyModel(0.0)), controller)
+    )
+    # Seed the latency window so later calls are hedged after HEDGE_MIN_DELAY_SECONDS.
+    provider._latencies["page_summaries"] = deque([0.0])
+    parts = [{"type": "text", "text": "page text"}]
+
+    async def run():
+        winners = []
+        for index in range(8):
+            response = await provider.asummarize_pages(parts, "prompt", f"request-{index}")
+            winners.append(response.processing_metadata["hedge"]["winner"])
+        return winners
+
+    try:
+        assert asyncio.run(run()) == ["hedge"] * 8
+        assert controller.stats()["in_flight"] == 0
+    finally:
+        asyncio.run(provider.aclose())
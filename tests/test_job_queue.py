@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+import time
+
+from app.config import settings
+from app.schemas import ClassifiedDocumentsResponse, ProcessFolderRequest
+from app.services import job_queue as job_queue_module
+from app.services.job_queue import JobQueue
+from app.services.job_store import SQLiteJobStore
+
+class BlockingWorkflow:
+    """Stands in for WorkflowService: never finishes, like a job interrupted by a redeploy."""
+
+    def __init__(self, ai_provider, progress_callback=None):
+        pass
+
+    async def aprocess_folder(self, request, request_id):
+        await asyncio.Event().wait()
+
+class InstantWorkflow:
+    def __init__(self, ai_provider, progress_callback=None):
+        pass
+
+    async def aprocess_folder(self, request, request_id):
+        return ClassifiedDocumentsResponse(request_id=request_id, documents=[])
+
+async def wait_for_status(store: SQLiteJobStore, job_id: str, status: str, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while store.get(job_id).status != status:
+        assert time.monotonic() < deadline, f"job stayed {store.get(job_id).status}"
+        await asyncio.sleep(0.01)
+
+def test_jobs_interrupted_by_a_quick_restart_run_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_STALE_AFTER_SECONDS", 300.0)
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+    async def first_run():
+        monkeypatch.setattr(job_queue_module, "WorkflowService", BlockingWorkflow)
+        queue = JobQueue(store, ai_provider=None)
+        await queue.start()
+        job = await queue.submit(ProcessFolderRequest(folder_path=str(tmp_path)))
+        await wait_for_status(store, job.job_id, "running")
+        await queue.stop()
+        return job.job_id
+
+    async def second_run(job_id: str):
+        # Restarted well within JOB_STALE_AFTER_SECONDS.
+        monkeypatch.setattr(job_queue_module, "WorkflowService", InstantWorkflow)
+        queue = JobQueue(store, ai_provider=None)
+        await queue.start()
+        try:
+            await wait_for_status(store, job_id, "succeeded")
+        finally:
+            await queue.stop()
+
+    job_id = asyncio.run(first_run())
+    assert store.get(job_id).status == "queued"
+    asyncio.run(second_run(job_id))
+    assert store.get_result(job_id).request_id == job_id
+
+def test_sweep_fails_jobs_whose_process_died(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_STALE_AFTER_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "JOB_STALE_SWEEP_INTERVAL_SECONDS", 0.01)
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    crashed = store.create("crashed", ProcessFolderRequest(folder_path=str(tmp_path))).job_id
+    alive = store.create("alive", ProcessFolderRequest(folder_path=str(tmp_path))).job_id
+    store.claim(crashed)
+    store.claim(alive)
+
+    async def run():
+        queue = JobQueue(store, ai_provider=None)
+        await queue.start()
+        # Goes stale after startup recovery, so only the periodic sweep can catch it.
+        with sqlite3.connect(store.db_path) as conn:
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE job_id = ?", (time.time() - 120, crashed))
+        try:
+            await wait_for_status(store, crashed, "failed")
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+    assert store.get(alive).status == "running"
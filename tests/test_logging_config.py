@@ -0,0 +1,42 @@
+import logging
+import queue
+
+import pytest
+
+from app.logging_config import BoundedQueueHandler
+
+class RecordingQueue(queue.Queue):
+    """Full queue that records blocking puts instead of waiting on them."""
+
+    def __init__(self):
+        super().__init__(maxsize=1)
+        self.put_nowait("filler")
+        self.waited = []
+
+    def put(self, item, block=True, timeout=None):
+        if block:
+            self.waited.append(item.levelno)
+            return
+        super().put(item, block=False)
+
+def record(level: int) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, "message", None, None)
+
+LEVELS = [logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR]
+
+@pytest.mark.parametrize("policy, waited", [
+    ("drop_debug", [logging.INFO, logging.WARNING, logging.ERROR]),
+    ("drop_info", [logging.WARNING, logging.ERROR]),
+    ("block", LEVELS)
+])
+def test_full_queue_drops_only_the_policy_levels(policy, waited):
+    handler = BoundedQueueHandler(RecordingQueue(), policy)
+    for level in LEVELS:
+        handler.enqueue(record(level))
+
+    assert handler.queue.waited == waited
+    assert handler.dropped_records == len(LEVELS) - len(waited)
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        BoundedQueueHandler(queue.Queue(maxsize=1), "drop_everything")
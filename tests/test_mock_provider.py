@@ -0,0 +1,43 @@
+import asyncio
+import json
+import time
+
+from app.config import settings
+from app.services.mock_provider import MockAIProvider, MockModel
+
+def slow_parts(filenames, seconds_per_page: float):
+    """Lazy input parts, like a streamed request body that preprocesses each page on demand."""
+    manifest = [{"document_page_image_filename": filename} for filename in filenames]
+    yield {"type": "text", "text": f"<image_manifest>{json.dumps(manifest)}</image_manifest>"}
+    for _ in filenames:
+        time.sleep(seconds_per_page)
+        yield {"type": "text", "text": "page text"}
+
+def test_lazy_parts_are_consumed_off_the_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "MOCK_AI_ERROR_RATE", 0.0)
+    monkeypatch.setattr(settings, "MOCK_AI_RATE_LIMIT_RATE", 0.0)
+    monkeypatch.setattr(settings, "MOCK_AI_LATENCY_DISTRIBUTION", "constant")
+    monkeypatch.setattr(settings, "MOCK_AI_LATENCY_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "MOCK_AI_LATENCY_PER_PAGE_SECONDS", 0.0)
+    provider = MockAIProvider(model=MockModel(seed=0))
+    filenames = [f"invoice.pdf_page_{page}" for page in range(1, 6)]
+
+    async def run():
+        stalls = []
+
+        async def tick():
+            while True:
+                started_at = time.perf_counter()
+                await asyncio.sleep(0.01)
+                stalls.append(time.perf_counter() - started_at)
+
+        ticker = asyncio.create_task(tick())
+        response = await provider.asummarize_pages(slow_parts(filenames, 0.05), "prompt", "request-1")
+        ticker.cancel()
+        return response, max(stalls)
+
+    response, longest_stall = asyncio.run(run())
+
+    assert [summary.filename for summary in response.page_summaries] == filenames
+    # Consuming the parts takes 250 ms; on the loop it would stall the ticker for all of it.
+    assert longest_stall < 0.15
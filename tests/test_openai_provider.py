@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import httpx
+import openai
+import pytest
+
+from app.schemas import NonExtractedDocuments
+from app.services import openai_provider
+from app.services.openai_provider import OpenAIProvider, json_schema_response_format
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "test-model",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}]
+}
+
+def lazy_parts(count: int):
+    for page in range(count):
+        yield {"type": "text", "text": f"page {page}"}
+
+def failing_then_ok(statuses, bodies):
+    """A transport that answers with each status in turn, then a completion, recording the bodies it received."""
+    remaining = list(statuses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(request.read())
+        if remaining:
+            return httpx.Response(remaining.pop(0), json={"error": {"message": "upstream failed"}})
+        return httpx.Response(200, json=COMPLETION)
+
+    return handler
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setattr(openai_provider.time, "sleep", lambda seconds: None)
+    provider = OpenAIProvider(max_retries=2, base_url="http://model.test/v1", api_key="test-key")
+    yield provider
+    provider.http_client.close()
+
+def test_response_format_is_a_strict_schema():
+    json_schema = json_schema_response_format(NonExtractedDocuments)["json_schema"]
+    assert json_schema["name"] == "NonExtractedDocuments" and json_schema["strict"] is True
+
+    def check(schema):
+        if isinstance(schema, dict):
+            assert schema.get("default", "unset") is not None
+            if schema.get("type") == "object" and "properties" in schema:
+                assert schema["additionalProperties"] is False
+                assert schema["required"] == list(schema["properties"])
+            for value in schema.values():
+                check(value)
+        elif isinstance(schema, list):
+            for item in schema:
+                check(item)
+
+    check(json_schema["schema"])
+
+def test_streamed_request_is_resent_whole_after_a_retryable_error(provider):
+    bodies = []
+    provider.http_client = httpx.Client(transport=httpx.MockTransport(failing_then_ok([503, 429], bodies)))
+
+    response = provider._post_streaming_body(lazy_parts(3), "prompt")
+
+    assert response.id == "chatcmpl-1"
+    assert len(bodies) == 3
+    assert bodies[0] == bodies[1] == bodies[2]
+    assert [part["text"] for part in json.loads(bodies[0])["messages"][0]["content"]] == ["prompt", "page 0", "page 1", "page 2"]
+
+def test_streamed_request_gives_up_after_max_retries(provider):
+    bodies = []
+    provider.http_client = httpx.Client(transport=httpx.MockTransport(failing_then_ok([500, 500, 500], bodies)))
+
+    with pytest.raises(openai.APIStatusError):
+        provider._post_streaming_body(lazy_parts(2), "prompt")
+    assert len(bodies) == 3
+
+def test_streamed_request_is_not_retried_on_a_client_error(provider):
+    bodies = []
+    provider.http_client = httpx.Client(transport=httpx.MockTransport(failing_then_ok([400], bodies)))
+
+    with pytest.raises(openai.APIStatusError):
+        provider._post_streaming_body(lazy_parts(2), "prompt")
+    assert len(bodies) == 1
+
+def test_async_streamed_request_is_resent_whole_after_a_retryable_error(provider, monkeypatch):
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(openai_provider.asyncio, "sleep", no_sleep)
+    bodies = []
+
+    async def run():
+        async_bodies = []
+        handler = failing_then_ok([502], async_bodies)
+
+        async def async_handler(request: httpx.Request) -> httpx.Response:
+            await request.aread()
+            return handler(request)
+
+        provider.async_http_client = httpx.AsyncClient(transport=httpx.MockTransport(async_handler))
+        try:
+            response = await provider._apost_streaming_body(lazy_parts(3), "prompt")
+        finally:
+            await provider.async_http_client.aclose()
+        bodies.extend(async_bodies)
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.id == "chatcmpl-1"
+    assert len(bodies) == 2 and bodies[0] == bodies[1]
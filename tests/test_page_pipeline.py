@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+
+from app.services.page_pipeline import StagedPipeline
+
+def run_with_timeout(target, timeout: float = 10.0):
+    """Run `target` on a thread and fail if it doesn't finish in time (a deadlocked pipeline)."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = target()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "pipeline did not finish"
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result")
+
+def pipeline_threads(pipeline: StagedPipeline):
+    return [thread for thread in pipeline._threads if thread.is_alive()]
+
+class CountingSource:
+    """Source iterator recording how many items were pulled and whether it was closed."""
+
+    def __init__(self, count: int):
+        self.pulled = 0
+        self.closed = False
+        self._items = self._generate(count)
+
+    def _generate(self, count: int):
+        try:
+            for item in range(count):
+                self.pulled += 1
+                yield item
+        finally:
+            self.closed = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+    def close(self):
+        self._items.close()
+
+def jittered(func):
+    rng = random.Random(7)
+    lock = threading.Lock()
+
+    def stage(item):
+        with lock:
+            delay = rng.uniform(0, 0.005)
+        time.sleep(delay)
+        return func(item)
+    return stage
+
+def test_results_keep_source_order_with_several_workers_per_stage():
+    pipeline = StagedPipeline(
+        iter(range(200)),
+        [("double", jittered(lambda item: item * 2), 4), ("increment", jittered(lambda item: item + 1), 3)],
+        queue_size=2
+    )
+
+    results = run_with_timeout(lambda: list(pipeline))
+
+    assert results == [(item * 2 + 1, None) for item in range(200)]
+    assert pipeline_threads(pipeline) == []
+    stats = pipeline.stats()
+    assert stats["double"]["items"] == stats["increment"]["items"] == stats["consumer"]["items"] == 200
+
+def test_middle_stage_error_reaches_consumer_in_order_and_stops_producers():
+    source = CountingSource(10_000)
+    failure = ValueError("page 5 is corrupt")
+
+    def middle(item):
+        if item == 5:
+            raise failure
+        return item
+
+    pipeline = StagedPipeline(source, [("first", lambda item: item, 2), ("middle", middle, 2), ("last", lambda item: item, 2)], queue_size=2)
+
+    def consume():
+        seen = []
+        try:
+            for result, error in pipeline:
+                if error is not None:
+                    return seen, result, error
+                seen.append(result)
+        finally:
+            pipeline.close()
+
+    seen, failed_item, error = run_with_timeout(consume)
+
+    assert seen == [0, 1, 2, 3, 4]
+    assert failed_item == 5
+    assert error is failure
+    assert pipeline_threads(pipeline) == []
+    assert source.closed
+    # Bounded queues: the source only ran a few items ahead of the failure before it was stopped.
+    assert source.pulled < 100
+    # The stage after the failing one passes the failure through without calling its function.
+    assert pipeline.stats()["last"]["items"] < source.pulled
+
+def test_early_consumer_exit_does_not_deadlock():
+    source = CountingSource(10_000)
+    pipeline = StagedPipeline(source, [("slow", jittered(lambda item: item), 3), ("fast", lambda item: item, 1)], queue_size=1)
+
+    def consume_one():
+        try:
+            for result, _ in pipeline:
+                return result
+        finally:
+            pipeline.close()
+
+    assert run_with_timeout(consume_one) == 0
+    assert pipeline_threads(pipeline) == []
+    assert source.closed
+    assert source.pulled < 100
+
+def test_close_before_iteration_ends_is_idempotent():
+    pipeline = StagedPipeline(iter(range(50)), [("identity", lambda item: item, 2)], queue_size=1)
+    iterator = iter(pipeline)
+    assert next(iterator) == (0, None)
+
+    run_with_timeout(pipeline.close)
+    run_with_timeout(pipeline.close)
+    run_with_timeout(iterator.close)
+
+    assert pipeline_threads(pipeline) == []